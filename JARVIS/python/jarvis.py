@@ -1,656 +1,5137 @@
-"""
-Jarvis — All-in-one assistant (single-file)
-
-Features:
-- Speech recognition (SpeechRecognition + PyAudio)
-- Text-to-speech (Windows SAPI)
-- ChatterBot fallback chat
-- Local Pakistan knowledge base (history, geography, facts)
-- Wikipedia summary fallback (online)
-- Time / Date / Day commands
-- Independence Day (Aug 14) automatic alert
-- System controls (shutdown, restart, abort, lock, sleep, logoff, taskmgr, cmd, control panel)
-- Open apps & websites (Chrome, YouTube, WhatsApp, VS Code, Settings, Calculator)
-- Write application templates to Notepad by spoken title
-- Play music from a folder
-- Reminders + background checker
-- Persistent memory (name, reminders, chat history)
-"""
-
-import os
-import json
-import subprocess
-import webbrowser
-import random
-import time
-import datetime
-import threading
-import warnings
-
-# 3rd-party libs
-import speech_recognition as sr
-import wikipedia
-import win32com.client
-
-# Optional: chatterbot (can be heavy). If not installed, code falls back safely.
-try:
-    from chatterbot import ChatBot
-    from chatterbot.trainers import ListTrainer
-    CHATBOT_AVAILABLE = True
-except Exception:
-    CHATBOT_AVAILABLE = False
-
-# ---- User configuration ----
-MUSIC_FOLDER = r"C:\Users\sdoco"            # <-- change to your music folder
-VSCODE_PATH = r"C:\Users\sdoco\AppData\Local\Programs\Microsoft VS Code\Code.exe"  # change if needed
-OPENWEATHER_API_KEY = ""   # optional: set to use weather feature
-WEATHER_CITY = "Islamabad" # optional: city for weather
-LISTEN_TIMEOUT = 5         # seconds phrase_time_limit
-MEMORY_FILE = "jarvis_memory.json"
-# ----------------------------
-
-# Suppress wikipedia parser warning (cosmetic)
-warnings.filterwarnings("ignore", category=UserWarning, module='wikipedia')
-
-# Initialize TTS
-speaker = win32com.client.Dispatch("SAPI.SpVoice")
-
-def speak(text):
-    """Speak and print."""
-    if not text:
-        return
-    print("Jarvis:", text)
-    try:
-        speaker.Speak(text)
-    except Exception:
-        # If TTS fails, just print
-        pass
-
-def listen(timeout=LISTEN_TIMEOUT):
-    """Listen from microphone and return lowercase text (or empty string)."""
-    r = sr.Recognizer()
-    with sr.Microphone() as source:
-        print("Listening...")
-        # optional energy threshold — you may tune this
-        r.energy_threshold = 300
-        try:
-            audio = r.listen(source, phrase_time_limit=timeout)
-        except Exception as e:
-            print("Microphone listening error:", e)
-            return ""
-    try:
-        query = r.recognize_google(audio)
-        print("You:", query)
-        return query.lower()
-    except sr.UnknownValueError:
-        return ""
-    except sr.RequestError:
-        # network error for Google recognizer
-        return ""
-
-# Persistent memory
-memory = {"name": None, "chat_history": [], "reminders": [], "last_independence_year": 0}
-if os.path.exists(MEMORY_FILE):
-    try:
-        with open(MEMORY_FILE, "r", encoding="utf-8") as f:
-            memory.update(json.load(f))
-    except Exception:
-        pass
-
-def save_memory():
-    try:
-        with open(MEMORY_FILE, "w", encoding="utf-8") as f:
-            json.dump(memory, f, indent=4, ensure_ascii=False)
-    except Exception as e:
-        print("Could not save memory:", e)
-
-# Initialize ChatterBot if available
-if CHATBOT_AVAILABLE:
-    bot = ChatBot('Jarvis', storage_adapter='chatterbot.storage.SQLStorageAdapter')
-    trainer = ListTrainer(bot)
-    try:
-        trainer.train([
-            "hello", "Hello! I am Jarvis, your assistant.",
-            "how are you", "I am fine, thank you!",
-            "what is your name", "My name is Jarvis.",
-            "who created you", "You did — an awesome developer."
-        ])
-    except Exception:
-        pass
-
-# ---------------- Pakistan knowledge base (more detail can be added) ---------------
-pakistan_info = {
-    "capital": "Islamabad is the capital city of Pakistan. It was built during the 1960s to replace Karachi as the capital.",
-    "largest city": "Karachi is the largest city of Pakistan and the country's main seaport and financial centre.",
-    "official language": "Urdu is the national language and lingua franca; English is an official language used in government and business. Many regional languages are spoken such as Punjabi, Sindhi, Pashto and Balochi.",
-    "currency": "Pakistani Rupee (PKR) is the currency of Pakistan.",
-    "population": "Pakistan's population is over 240 million (estimates vary by year), making it one of the world's most populous countries.",
-    "independence day": "Pakistan gained independence from British rule on 14 August 1947. Independence Day is celebrated every year on August 14.",
-    "geography": (
-        "Pakistan is in South Asia, bordered by India to the east, Afghanistan and Iran to the west, "
-        "China to the north, and the Arabian Sea to the south. It has varied geography: coastal areas, "
-        "plains, deserts, and high mountain ranges. Northern Pakistan contains some of the world's highest peaks, including K2."
-    ),
-    "history": (
-        "Modern Pakistan was created at the partition of British India in 1947 as a state for Muslims of the subcontinent. "
-        "Key milestones:\n"
-        "- Prehistory & ancient: The Indus Valley Civilization (c. 2600–1900 BCE) flourished in parts of present-day Pakistan.\n"
-        "- Persian, Greek, Mauryan, Kushan and Islamic empires influenced the region.\n"
-        "- Medieval: Arrival of Islam, Ghaznavids, Ghurids, Delhi Sultanate, Mughal Empire.\n"
-        "- British era: The region became part of British India (19th – 20th centuries).\n"
-        "- 1947: Partition led to creation of Pakistan under Muhammad Ali Jinnah (Quaid-e-Azam).\n"
-        "- 1947–1971: Pakistan comprised West and East wings; East Pakistan became Bangladesh after the 1971 Liberation War.\n"
-        "- Since independence, Pakistan has alternated between civilian rule and military governments, developed industry and agriculture, "
-        "and faces challenges like governance, security and economic development."
-    ),
-    "province list": "Pakistan's provinces include Punjab, Sindh, Khyber Pakhtunkhwa (KP), Balochistan; federal territories include Islamabad Capital Territory and regions such as Gilgit-Baltistan and Azad Jammu & Kashmir.",
-    "national animal": "The markhor is the national animal of Pakistan.",
-    "national bird": "The chukar partridge is often recognized as a national bird symbol.",
-    "national flower": "Jasmine is considered a national flower/flower emblem in Pakistan."
-}
-# -------------------------------------------------------------------------------
-
-# ---------------- Helper utilities ------------------------------------------------
-def get_pakistan_answer(query):
-    """Return an offline Pakistan fact if any key matches the query."""
-    q = query.lower()
-    for key, text in pakistan_info.items():
-        if key in q:
-            return text
-    # also check some common question forms
-    if "capital of pakistan" in q or "what is the capital of pakistan" in q:
-        return pakistan_info.get("capital")
-    if "founder" in q or "who founded" in q or "quaid" in q:
-        return "Pakistan's founder (Quaid-e-Azam) was Muhammad Ali Jinnah."
-    if "k2" in q or "highest mountain" in q or "highest peak" in q:
-        return "K2 (Mount Godwin-Austen) is the highest peak in Pakistan and the second highest in the world."
-    return None
-
-def get_time_text():
-    now = datetime.datetime.now()
-    return now.strftime("The time is %I:%M %p")
-
-def get_date_text():
-    now = datetime.datetime.now()
-    return now.strftime("Today is %A, %d %B %Y")
-
-def is_independence_day_today():
-    now = datetime.date.today()
-    return now.month == 8 and now.day == 14
-
-# Wikipedia summary (safe wrapper)
-def wiki_summary(query, sentences=2):
-    try:
-        # clean common prefixes
-        q = query.lower()
-        for prefix in ["tell me about", "who is", "what is", "what are", "define", "explain"]:
-            q = q.replace(prefix, "")
-        q = q.strip()
-        if not q:
-            return None
-        wikipedia.set_lang("en")
-        return wikipedia.summary(q, sentences=sentences, auto_suggest=True)
-    except Exception as e:
-        # print("Wikipedia error:", e)
-        return None
-
-# ---------------- System and app controls ---------------------------------------
-def open_chrome(url="https://www.google.com"):
-    try:
-        webbrowser.open(url)
-        speak(f"Opening Chrome with {url}")
-    except Exception as e:
-        speak(f"Failed to open browser: {e}")
-
-def open_youtube(query=None):
-    url = "https://www.youtube.com"
-    if query:
-        url = f"https://www.youtube.com/results?search_query={query.replace(' ', '+')}"
-    open_chrome(url)
-
-def open_whatsapp():
-    open_chrome("https://web.whatsapp.com")
-
-def open_settings():
-    try:
-        subprocess.Popen("start ms-settings:", shell=True)
-        speak("Opening Settings.")
-    except Exception as e:
-        speak("Could not open Settings: " + str(e))
-
-def open_vscode():
-    try:
-        if os.path.exists(VSCODE_PATH):
-            subprocess.Popen([VSCODE_PATH])
-            speak("Opening Visual Studio Code.")
-        else:
-            speak("VS Code not found at configured path.")
-    except Exception as e:
-        speak("Could not open VS Code: " + str(e))
-
-def open_calculator():
-    try:
-        subprocess.Popen("calc.exe")
-        speak("Opening Calculator.")
-    except Exception as e:
-        speak("Could not open Calculator: " + str(e))
-
-def open_task_manager():
-    try:
-        subprocess.Popen("taskmgr")
-        speak("Opening Task Manager.")
-    except Exception as e:
-        speak("Could not open Task Manager: " + str(e))
-
-def open_cmd():
-    try:
-        subprocess.Popen("start cmd", shell=True)
-        speak("Opening Command Prompt.")
-    except Exception as e:
-        speak("Could not open Command Prompt: " + str(e))
-
-def open_control_panel():
-    try:
-        subprocess.Popen("control")
-        speak("Opening Control Panel.")
-    except Exception as e:
-        speak("Could not open Control Panel: " + str(e))
-
-def system_shutdown(delay_seconds=60):
-    speak(f"Shutting down the system in {delay_seconds} seconds.")
-    os.system(f"shutdown /s /t {delay_seconds}")
-
-def system_restart(delay_seconds=60):
-    speak(f"Restarting the system in {delay_seconds} seconds.")
-    os.system(f"shutdown /r /t {delay_seconds}")
-
-def system_abort():
-    speak("Aborting shutdown/restart.")
-    os.system("shutdown /a")
-
-def lock_workstation():
-    try:
-        os.system("rundll32.exe user32.dll,LockWorkStation")
-        speak("Locking the workstation.")
-    except Exception as e:
-        speak("Could not lock workstation: " + str(e))
-
-def sleep_system():
-    try:
-        # may require privileges
-        os.system("rundll32.exe powrprof.dll,SetSuspendState 0,1,0")
-        speak("Putting system to sleep.")
-    except Exception as e:
-        speak("Could not put system to sleep: " + str(e))
-
-def logoff():
-    try:
-        os.system("shutdown /l")
-    except Exception as e:
-        speak("Could not log off: " + str(e))
-
-# ---------------- Notes / Applications / Music ----------------------------------
-def write_in_notepad(text, filename="jarvis_note.txt"):
-    try:
-        path = os.path.abspath(filename)
-        with open(path, "w", encoding="utf-8") as f:
-            f.write(text)
-        subprocess.Popen(["notepad.exe", path])
-        speak("Opened Notepad with requested content.")
-    except Exception as e:
-        speak("Could not write to Notepad: " + str(e))
-
-# very simple app templates
-APP_TEMPLATES = {
-    "calculator": """# Simple calculator
-def add(a,b): return a+b
-def sub(a,b): return a-b
-def mul(a,b): return a*b
-def div(a,b): return a/b if b!=0 else None
-
-if __name__ == '__main__':
-    print('Calculator - enter "exit" to quit')
-    while True:
-        expr = input('Enter expression: ')
-        if expr.strip().lower() == 'exit':
-            break
-        try:
-            print(eval(expr))
-        except Exception as e:
-            print('Error:', e)
-""",
-    "todo": """# Simple TODO app
-tasks=[]
-while True:
-    cmd=input('add/show/exit: ').strip().lower()
-    if cmd=='add':
-        t=input('Task: ')
-        tasks.append(t)
-    elif cmd=='show':
-        for i,t in enumerate(tasks,1):
-            print(i,t)
-    elif cmd=='exit':
-        break
-""",
-    "vs code": f"""# VS Code launcher
-import os
-os.system(r'{VSCODE_PATH}')
-"""
-}
-
-def create_application_from_title(title):
-    key = title.lower().strip()
-    # try to find a matching template key
-    for k in APP_TEMPLATES:
-        if k in key:
-            write_in_notepad(APP_TEMPLATES[k], filename=f"{k}_template.py")
-            return True
-    # fallback: create placeholder template
-    placeholder = f"# Application: {title}\nprint('This is a placeholder for {title}')\n"
-    write_in_notepad(placeholder, filename=f"{key.replace(' ','_')[:50]}.py")
-    return True
-
-def play_random_music():
-    try:
-        files = []
-        for root, _, filenames in os.walk(MUSIC_FOLDER):
-            for fn in filenames:
-                if fn.lower().endswith((".mp3", ".wav")):
-                    files.append(os.path.join(root, fn))
-        if not files:
-            speak("No music files found in your configured music folder.")
-            return
-        song = random.choice(files)
-        speak(f"Playing {os.path.basename(song)}")
-        os.startfile(song)
-    except Exception as e:
-        speak("Could not play music: " + str(e))
-
-# ---------------- Reminders & Independence Day ----------------------------------
-def add_reminder(text, time_str=None):
-    """time_str optional in HH:MM 24-hour format for daily check."""
-    rem = {"text": text, "time": time_str}
-    memory.setdefault("reminders", []).append(rem)
-    save_memory()
-    speak(f"Reminder added: {text} at {time_str if time_str else 'no specific time'}")
-
-def check_reminders_loop():
-    """Background thread that checks reminders every 60 seconds."""
-    while True:
-        now = datetime.datetime.now().strftime("%H:%M")
-        # independence day alert once per year
-        today = datetime.date.today()
-        if today.month == 8 and today.day == 14:
-            last_year = memory.get("last_independence_year", 0)
-            if last_year != today.year:
-                speak("Happy Independence Day! Today is 14th August — Pakistan's Independence Day.")
-                memory["last_independence_year"] = today.year
-                save_memory()
-        # time-based reminders
-        for rem in list(memory.get("reminders", [])):
-            if rem.get("time") == now:
-                speak("Reminder: " + rem.get("text", ""))
-                # remove one-time reminder (keep if you want recurring)
-                try:
-                    memory["reminders"].remove(rem)
-                    save_memory()
-                except ValueError:
-                    pass
-        time.sleep(60)
-
-# start reminder thread
-reminder_thread = threading.Thread(target=check_reminders_loop, daemon=True)
-reminder_thread.start()
-
-# ---------------- Command handling ---------------------------------------------
-def handle_query(query):
-    """Central command parser. Returns a text response (may be None if action already speaks)."""
-    q = query.lower()
-
-    # quick exits
-    if any(x in q for x in ["exit", "quit", "bye", "goodbye"]):
-        return "exit"
-
-    # Time / date / day (handle early)
-    if "time" in q and "what" in q or q.strip() in ("time", "what time is it", "tell me the time"):
-        return get_time_text()
-    if "date" in q or "day" in q or "what day" in q or "what is the date" in q:
-        return get_date_text()
-
-    # Independence day check request
-    if "independence day" in q or "14 august" in q or "august 14" in q:
-        return "Pakistan's Independence Day is on 14 August. Pakistan became independent on 14 August 1947."
-
-    # Pakistan knowledge offline
-    if "pakistan" in q or any(k in q for k in ["capital of pakistan", "history of pakistan", "pakistan geography", "founder of pakistan", "k2", "karachi", "islamabad"]):
-        ans = get_pakistan_answer(q)
-        if ans:
-            return ans
-        # fallback to general Pakistan summary
-        return pakistan_info.get("history")  # or more general text
-
-    # Weather (optional using OpenWeather)
-    if "weather" in q:
-        if OPENWEATHER_API_KEY:
-            try:
-                import requests
-                url = f"http://api.openweathermap.org/data/2.5/weather?q={WEATHER_CITY}&appid={OPENWEATHER_API_KEY}&units=metric"
-                r = requests.get(url, timeout=8)
-                data = r.json()
-                if data.get("cod") == 200:
-                    desc = data["weather"][0]["description"]
-                    temp = data["main"]["temp"]
-                    hum = data["main"]["humidity"]
-                    return f"The weather in {WEATHER_CITY} is {desc}, temperature {temp}°C, humidity {hum}%."
-                else:
-                    return "Sorry, I couldn't fetch weather now."
-            except Exception:
-                return "Weather check failed (network or API error)."
-        else:
-            return "Weather is not configured. Please add your OpenWeatherMap API key in the script to enable weather."
-
-    # Open apps and websites
-    if "open chrome" in q or (q.strip() == "chrome"):
-        open_chrome()
-        return "Opened Chrome."
-    if "open youtube" in q:
-        # optionally: "open youtube for cats"
-        if "for" in q:
-            parts = q.split("for", 1)
-            open_youtube(parts[1].strip())
-        else:
-            open_youtube()
-        return "Opened YouTube."
-    if "open whatsapp" in q or "whatsapp" in q:
-        open_whatsapp()
-        return "Opened WhatsApp Web."
-    if "open settings" in q or "settings" in q:
-        open_settings()
-        return "Opened Settings."
-    if "open vscode" in q or "open visual studio code" in q or "vs code" in q:
-        open_vscode()
-        return "Opening VS Code."
-    if "open calculator" in q or "calculator" in q:
-        open_calculator()
-        return "Calculator opened."
-    if "task manager" in q:
-        open_task_manager()
-        return "Task Manager opened."
-    if "command prompt" in q or q.strip() == "cmd":
-        open_cmd()
-        return "Command Prompt opened."
-    if "control panel" in q:
-        open_control_panel()
-        return "Control Panel opened."
-
-    # System controls
-    if "shutdown" in q and "abort" not in q and "cancel" not in q:
-        system_shutdown(60)
-        return "Shutdown scheduled in 60 seconds."
-    if "restart" in q:
-        system_restart(60)
-        return "Restart scheduled in 60 seconds."
-    if "abort shutdown" in q or "cancel shutdown" in q or "abort restart" in q:
-        system_abort()
-        return "Shutdown/restart aborted."
-    if "lock" in q and "workstation" not in q:
-        lock_workstation()
-        return "Workstation locked."
-    if "sleep" in q:
-        sleep_system()
-        return "System sleep attempted."
-    if "log off" in q or "logoff" in q:
-        logoff()
-        return "Logoff initiated."
-
-    # Music
-    if "play music" in q or q.strip() == "music":
-        play_random_music()
-        return "Playing music."
-
-    # Write app/document/note
-    if "write application" in q or "create application" in q or ("write" in q and "application" in q):
-        # prompt for title externally (handled in main loop)
-        return "prompt_application_title"
-    if any(x in q for x in ["write note", "write a note", "write essay", "write letter"]):
-        return "prompt_write_text"
-
-    # Reminders
-    if "remind me to" in q:
-        # e.g. 'remind me to call david at 18:00'
-        try:
-            after = q.split("remind me to", 1)[1].strip()
-            # naive: if 'at HH:MM' present
-            if " at " in after:
-                text, tstr = after.rsplit(" at ", 1)
-                # validate HH:MM
-                try:
-                    datetime.datetime.strptime(tstr.strip(), "%H:%M")
-                    add_reminder(text.strip(), tstr.strip())
-                    return f"Reminder set for {tstr.strip()}: {text.strip()}"
-                except Exception:
-                    add_reminder(after.strip(), None)
-                    return "Reminder added without specific time (time format invalid)."
-            else:
-                add_reminder(after.strip(), None)
-                return "Reminder added without time."
-        except Exception:
-            return "Sorry, I couldn't parse the reminder."
-
-    # Get stored name
-    if "what is my name" in q or "what's my name" in q:
-        if memory.get("name"):
-            return f"Your name is {memory['name']}."
-        return "I don't know your name yet. Tell me 'my name is ...' to save it."
-
-    if q.startswith("my name is "):
-        name = q.replace("my name is", "").strip()
-        if name:
-            memory["name"] = name
-            save_memory()
-            return f"Nice to meet you, {name}. I will remember your name."
-        else:
-            return "I did not catch your name."
-
-    # Wikipedia Q/A (only after we've considered other conditions)
-    if any(word in q for word in ["who", "what", "when", "where", "why", "how", "tell me about", "define", "explain"]):
-        w = wiki_summary(q, sentences=2)
-        if w:
-            return w
-        # else fallback to chatbot below
-
-    # Fallback to ChatterBot if available
-    if CHATBOT_AVAILABLE:
-        try:
-            reply = bot.get_response(q)
-            return str(reply)
-        except Exception:
-            pass
-
-    # Ultimate fallback
-    return "Sorry, I don't understand that yet. Try asking another way."
-
-# ---------------- Main loop -----------------------------------------------------
-def main_loop():
-    speak("Jarvis starting up.")
-    # greet
-    if memory.get("name"):
-        speak(f"Welcome back, {memory['name']}!")
-    else:
-        speak("Hello! What's your name?")
-        nm = listen(timeout=6)
-        if nm:
-            memory["name"] = nm
-            save_memory()
-            speak(f"Nice to meet you, {nm}!")
-
-    # Independence Day immediate check
-    if is_independence_day_today():
-        today = datetime.date.today()
-        last = memory.get("last_independence_year", 0)
-        if last != today.year:
-            speak("Happy Independence Day! Today is 14th August, Pakistan's Independence Day.")
-            memory["last_independence_year"] = today.year
-            save_memory()
-
-    speak("How can I assist you today?")
-
-    while True:
-        speak("Please say your command.")
-        q = listen(timeout=8)
-        if not q:
-            speak("I didn't catch that. Say please type your command.")
-            # allow typed fallback
-            try:
-                typed = input("Type command (or press Enter to skip): ").strip()
-            except Exception:
-                typed = ""
-            if not typed:
-                continue
-            q = typed.lower()
-
-        result = handle_query(q)
-
-        if result == "exit":
-            speak("Goodbye! Have a great day.")
-            break
-
-        # special prompts from handle_query
-        if result == "prompt_application_title":
-            speak("Please tell me the application title.")
-            title = listen(timeout=8)
-            if not title:
-                speak("I did not catch the title. Please type the application title:")
-                title = input("Application title: ").strip()
-            if title:
-                create_application_from_title(title)
-                speak(f"Created application template for {title} in Notepad.")
-            else:
-                speak("No title provided. Cancelled.")
-            continue
-
-        if result == "prompt_write_text":
-            speak("What should I write?")
-            body = listen(timeout=12)
-            if not body:
-                speak("I did not catch the text. Please type the text to write:")
-                body = input("Text: ").strip()
-            if body:
-                write_in_notepad(body)
-                speak("Written to Notepad.")
-            else:
-                speak("No text provided. Cancelled.")
-            continue
-
-        # Normal textual response
-        if result:
-            speak(result)
-        time.sleep(0.5)
-
-if __name__ == "__main__":
-    try:
-        main_loop()
-    except KeyboardInterrupt:
-        print("Exiting Jarvis.")
-    except Exception as e:
+"""
+Jarvis — All-in-one assistant (single-file)
+
+Features:
+- Speech recognition (Google online, or offline streaming Vosk / PocketSphinx with early routing)
+- Text-to-speech (Windows SAPI) on a background queue, sentence by sentence, with barge-in
+- ChatterBot fallback chat (or a fast built-in TF-IDF retrieval responder)
+- Local knowledge base (JSON files, BM25 index); ships with Pakistan history, geography, facts
+- Wikipedia summary fallback (online, cached on disk)
+- Time / Date / Day commands
+- Independence Day (Aug 14) automatic alert
+- System controls (shutdown, restart, abort, lock, sleep, logoff, taskmgr, cmd, control panel)
+- Open apps & websites (Chrome, YouTube, WhatsApp, VS Code, Settings, Calculator)
+- Write application templates to Notepad by spoken title
+- Play music from a folder (indexed; "play music by X" / "from X")
+- Reminders (one-shot, daily, weekly) on an exact-wakeup scheduler
+- Persistent memory (name, reminders, chat history)
+- Lazy / background backend loading with a startup timing report
+- Headless batch mode: replay a transcript with actions recorded (--batch)
+- Per-turn latency tracing with rolling p50/p95/p99 per stage and intent (JSON / Prometheus)
+"""
+
+import os
+import struct
+import gzip
+import io
+import mmap
+import hashlib
+import hmac
+import ipaddress
+import secrets
+import math
+import wave
+import array
+import collections
+import atexit
+import re
+import json
+import sqlite3
+import subprocess
+import webbrowser
+import random
+import time
+import datetime
+import heapq
+import bisect
+import uuid
+import threading
+import warnings
+import shutil
+import tempfile
+import asyncio
+import contextvars
+import functools
+import itertools
+import http.client
+import urllib.parse
+from contextlib import closing, contextmanager
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait as wait_futures
+
+_PROCESS_START = time.perf_counter()
+
+# ---- User configuration ----
+MUSIC_FOLDER = r"C:\Users\sdoco"            # <-- change to your music folder
+MUSIC_INDEX_FILE = "jarvis_music_index.json.gz"
+VSCODE_PATH = r"C:\Users\sdoco\AppData\Local\Programs\Microsoft VS Code\Code.exe"  # change if needed
+OPENWEATHER_API_KEY = ""   # optional: set to use weather feature
+WEATHER_CITY = "Islamabad" # optional: city for weather
+WEATHER_BASE_URL = "https://api.openweathermap.org/data/2.5"  # or a local stand-in server, for tests
+WEATHER_TTL = 600          # seconds an observation counts as current
+WEATHER_REFRESH_AHEAD = 60 # refresh cities in the background this long before they expire
+WEATHER_TIMEOUT = 4        # seconds for one HTTP request
+ACTION_PLATFORM = "auto"   # how commands run: "windows", "linux", "recording" (log only, for tests)
+ACTION_TIMEOUT = 15        # seconds a system command (shutdown, lock...) may take before it is killed
+ACTION_DEDUPE_SECONDS = 2.0  # the same command again within this is ignored
+LISTEN_TIMEOUT = 5         # seconds phrase_time_limit
+AUDIO_SOURCE = "microphone"  # or a path to a WAV file to replay instead of the microphone
+CALIBRATION_SECONDS = 1.0  # ambient noise measured once when the microphone opens
+PRE_ROLL_SECONDS = 0.5     # audio kept from just before speech starts
+PAUSE_SECONDS = 0.8        # silence that ends a phrase
+BARGE_IN_RATIO = 3.0       # while Jarvis talks, speech must be this much louder to interrupt
+VAD_ENABLED = True         # voice-activity gate: skip clicks / hiss, trim silence before recognition
+# "google" (online), "vosk" / "pocketsphinx" (offline, streaming), "script" (reads the
+# transcript next to a WAV AUDIO_SOURCE, for tests) or "auto": Vosk if its model is there
+RECOGNIZER = "auto"
+VOSK_MODEL_PATH = "vosk-model-small-en-us-0.15"
+EARLY_ROUTING = True       # streaming: answer as soon as a partial clearly names a simple command
+FUZZY_CORRECTION = True    # misheard commands ("open calculate her") go to the closest known phrase
+FUZZY_MIN_CONFIDENCE = 0.8 # for utterances no intent matched
+FUZZY_WIKI_CONFIDENCE = 0.9  # to take over an utterance that only matched "who / what / how ..."
+TTS_BACKEND = "sapi"       # "sapi", "null" (print only) or "wav" (write WAV files, for tests)
+TTS_WAV_FOLDER = "jarvis_tts"
+PHRASE_CACHE_FOLDER = "jarvis_phrases"  # pre-rendered audio for fixed phrases ("" to disable)
+MEMORY_FILE = "jarvis_memory.json"
+CHAT_ARCHIVE_DIR = "jarvis_history"      # chat history segments and their search index
+CHAT_SEGMENT_BYTES = 256 * 1024          # a segment is compressed once it reaches this size
+CHAT_ARCHIVE_MAX_BYTES = 64 * 1024 ** 2  # oldest compressed segments are dropped past this
+CHAT_RECENT_TURNS = 20                   # turns kept in memory for context
+KNOWLEDGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "knowledge")  # *.json knowledge files
+KNOWLEDGE_INDEX_FILE = "jarvis_knowledge.idx"
+CHATBOT_DATABASE = "db.sqlite3"   # ChatterBot's SQLite database
+CHATBOT_CORPUS_DIR = ""           # optional folder of extra conversations (.json/.txt/.yml)
+CHATBOT_TRAIN_BATCH = 5000        # statements per database transaction when training
+CHAT_SLOW_MS = 500                # log ChatBot replies slower than this (0 = never)
+# "chatterbot", "retrieval" (built-in TF-IDF responder), or "auto": ChatterBot if installed
+CHAT_RESPONDER = "auto"
+RETRIEVAL_THRESHOLD = 0.3         # weaker matches get "Sorry, I don't understand"
+FALLBACK_DEADLINE = 3.0           # seconds a question may take before Jarvis answers with what it has
+WIKI_CACHE_FILE = "jarvis_wiki_cache.db"  # set to "" to disable the Wikipedia cache
+WIKI_CACHE_MAX_ENTRIES = 2000
+WIKI_CACHE_TTL = 7 * 24 * 3600            # seconds a cached summary stays fresh
+WIKI_CACHE_NEGATIVE_TTL = 6 * 3600        # seconds a "no such page" answer is remembered
+WIKI_OFFLINE_INDEX = "jarvis_wiki_offline"  # built with --build-wiki-index DUMP; answers first when present
+WIKI_ONLINE = True                        # False: never call the Wikipedia API
+# "eager": load every backend at import (old behaviour)
+# "lazy": load each backend on first use
+# "background": load speech output now, warm up the rest while the greeting plays
+STARTUP_MODE = "background"
+STARTUP_REPORT = True                 # print per-import/per-init timings at the first prompt
+STARTUP_LOG_FILE = "jarvis_startup.jsonl"  # one line per launch, for tracking time-to-first-prompt
+METRICS_PORT = 0                      # serve latency metrics on 127.0.0.1:<port> (0 = off)
+TRACE_SLOW_MS = 3000                  # log the span tree of turns slower than this (0 = never)
+TRACE_SLOW_LOG = "jarvis_slow_turns.jsonl"
+DAEMON_WORKERS = 8                    # threads answering daemon clients (lookups block)
+DAEMON_MAX_SESSIONS = 1000            # least recently seen client namespaces are closed past this
+DAEMON_CLIENTS_DIR = "jarvis_clients"  # one memory file per daemon client ("" = keep clients in RAM only)
+DAEMON_TOKEN_FILE = "jarvis_daemon.token"  # HTTP clients must send this file's contents; created on first --serve
+DAEMON_ALLOW_REMOTE = False           # serve HTTP on addresses other than localhost (also --allow-remote)
+DAEMON_MAX_REQUEST = 64 * 1024        # bytes: longer HTTP bodies and socket lines are refused
+# ----------------------------
+
+# ---------------- Startup timing & lazy backends --------------------------------
+STARTUP_TIMINGS = []   # (label, milliseconds) in the order they happened
+
+@contextmanager
+def timed(label):
+    """Record how long the block takes in STARTUP_TIMINGS."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        STARTUP_TIMINGS.append((label, (time.perf_counter() - t0) * 1000.0))
+
+def _load_sr():
+    with timed("import speech_recognition"):
+        import speech_recognition
+    return speech_recognition
+
+def _load_recognizer():
+    with timed("init recognizer"):
+        return make_recognizer(RECOGNIZER)
+
+def _load_wikipedia():
+    with timed("import wikipedia"):
+        import wikipedia
+    # Suppress wikipedia parser warning (cosmetic)
+    warnings.filterwarnings("ignore", category=UserWarning, module='wikipedia')
+    return wikipedia
+
+def _load_speaker():
+    with timed("init speech output"):
+        output = SpeechOutput(make_tts_backend(TTS_BACKEND), PHRASE_CACHE_FOLDER)
+    output.prerender(canned_sentences())
+    return output
+
+def _load_weather():
+    with timed("init weather service"):
+        service = WeatherService(OPENWEATHER_API_KEY, WEATHER_BASE_URL, ttl=WEATHER_TTL,
+                                 refresh_ahead=WEATHER_REFRESH_AHEAD, timeout=WEATHER_TIMEOUT)
+    if WEATHER_CITY:
+        service.prefetch(WEATHER_CITY)
+    return service
+
+def _load_chatbot():
+    """Build and train ChatterBot, or return None when it is not installed."""
+    global CHATBOT_AVAILABLE
+    # Optional: chatterbot (can be heavy). If not installed, code falls back safely.
+    try:
+        with timed("import chatterbot"):
+            from chatterbot import ChatBot
+            from chatterbot.trainers import ListTrainer
+    except Exception:
+        CHATBOT_AVAILABLE = False
+        return None
+    with timed("init ChatBot"):
+        chatbot = ChatBot('Jarvis', storage_adapter='chatterbot.storage.SQLStorageAdapter',
+                          database_uri=f"sqlite:///{CHATBOT_DATABASE}")
+        trainer = ListTrainer(chatbot)
+    with timed("train ChatBot"):
+        try:
+            train_chatbot(chatbot, trainer)
+        except Exception as e:
+            print("ChatBot training failed:", e)
+    CHATBOT_AVAILABLE = True
+    return chatbot
+
+CHATBOT_AVAILABLE = None   # unknown until the chatbot backend has been loaded
+
+_BACKEND_LOADERS = {
+    "sr": _load_sr,
+    "recognizer": _load_recognizer,
+    "wikipedia": _load_wikipedia,
+    "speaker": _load_speaker,
+    "chatbot": _load_chatbot,
+    "weather": _load_weather,
+    "knowledge": lambda: _load_knowledge(),
+    "retrieval": lambda: _load_retrieval(),
+    "history": lambda: _load_history(),
+    "wiki_offline": lambda: _load_wiki_offline(),
+    "corrector": lambda: _load_corrector(),
+}
+_backends = {}
+_backend_locks = {name: threading.Lock() for name in _BACKEND_LOADERS}
+
+def get_backend(name):
+    """Return a loaded backend, importing/initialising it on first use.
+
+    Each backend has its own lock, so a chatbot warming up in the background
+    never holds up speech output or the recognizer.
+    """
+    try:
+        return _backends[name]
+    except KeyError:
+        pass
+    with _backend_locks[name]:
+        if name not in _backends:
+            _backends[name] = _BACKEND_LOADERS[name]()
+        return _backends[name]
+
+def warm_up(names):
+    """Load backends on a daemon thread so they are ready by the first command."""
+    def run():
+        for name in names:
+            try:
+                get_backend(name)
+            except Exception as e:
+                print(f"Could not load {name}:", e)
+    t = threading.Thread(target=run, name="jarvis-warmup", daemon=True)
+    t.start()
+    return t
+
+_first_prompt_reported = False
+
+def startup_report():
+    """Return the startup timings as text (one line per import/init step)."""
+    lines = ["Startup timings (ms):"]
+    for label, ms in STARTUP_TIMINGS:
+        lines.append(f"  {label:<28}{ms:9.1f}")
+    return "\n".join(lines)
+
+def mark_first_prompt():
+    """Record time-to-first-prompt once per launch, print and log the report."""
+    global _first_prompt_reported
+    if _first_prompt_reported:
+        return
+    _first_prompt_reported = True
+    STARTUP_TIMINGS.append(("time to first prompt", (time.perf_counter() - _PROCESS_START) * 1000.0))
+    if STARTUP_REPORT:
+        print(startup_report())
+    if STARTUP_LOG_FILE:
+        try:
+            with open(STARTUP_LOG_FILE, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"ts": datetime.datetime.now().isoformat(timespec="seconds"),
+                                    "mode": STARTUP_MODE,
+                                    "timings_ms": {k: round(v, 2) for k, v in STARTUP_TIMINGS}}) + "\n")
+        except Exception as e:
+            print("Could not write startup log:", e)
+
+# ---------------- Turn tracing & latency histograms ------------------------------
+# Every stage of a turn (mic open, capture, recognition, routing, lookups, speech)
+# is timed with span(). Durations feed rolling per-stage and per-intent
+# histograms; inside a turn_trace() the spans also form a tree that is written to
+# TRACE_SLOW_LOG when the whole turn was slow.
+LATENCY_BOUNDS_MS = [0.05 * 1.25 ** n for n in range(64)]   # 0.05 ms .. ~64 s, 25% apart
+
+class LatencyHistogram:
+    """Log-bucketed latency histogram over a rolling time window.
+
+    Counts are kept per time slot; slots older than ``window`` seconds are
+    dropped, so percentiles describe recent turns while ``count`` and
+    ``total_ms`` are lifetime totals (as Prometheus expects).
+    """
+
+    def __init__(self, window=600.0, slots=10, clock=time.monotonic):
+        self.slot_seconds = window / slots
+        self.clock = clock
+        self.count = 0
+        self.total_ms = 0.0
+        self._slots = collections.deque(maxlen=slots)   # [slot number, bucket counts, max ms]
+        self._lock = threading.Lock()
+
+    def observe(self, ms):
+        i = bisect.bisect_left(LATENCY_BOUNDS_MS, ms)
+        slot = int(self.clock() // self.slot_seconds)
+        with self._lock:
+            if not self._slots or self._slots[-1][0] != slot:
+                self._slots.append([slot, [0] * (len(LATENCY_BOUNDS_MS) + 1), 0.0])
+            current = self._slots[-1]
+            current[1][i] += 1
+            current[2] = max(current[2], ms)
+            self.count += 1
+            self.total_ms += ms
+
+    def percentiles(self, qs=(0.5, 0.95, 0.99)):
+        """{q: milliseconds} over the window (linear within a bucket); None when empty."""
+        oldest = int(self.clock() // self.slot_seconds) - self._slots.maxlen + 1
+        merged = [0] * (len(LATENCY_BOUNDS_MS) + 1)
+        top = 0.0
+        with self._lock:
+            for slot, counts, slot_max in self._slots:
+                if slot >= oldest:
+                    top = max(top, slot_max)
+                    for i, c in enumerate(counts):
+                        merged[i] += c
+        n = sum(merged)
+        out = {}
+        for q in qs:
+            if not n:
+                out[q] = None
+                continue
+            rank, seen = q * n, 0
+            for i, c in enumerate(merged):
+                if c and seen + c >= rank:
+                    lo = LATENCY_BOUNDS_MS[i - 1] if i else 0.0
+                    hi = LATENCY_BOUNDS_MS[i] if i < len(LATENCY_BOUNDS_MS) else lo * 1.25
+                    out[q] = min(top, lo + (hi - lo) * (rank - seen) / c)
+                    break
+                seen += c
+        return out
+
+class LatencyStats:
+    """Histograms keyed by (kind, name): kind "stage" or "intent"."""
+
+    QUANTILES = (0.5, 0.95, 0.99)
+
+    def __init__(self):
+        self._hists = {}
+        self._lock = threading.Lock()
+
+    def observe(self, kind, name, ms):
+        hist = self._hists.get((kind, name))
+        if hist is None:
+            with self._lock:
+                hist = self._hists.setdefault((kind, name), LatencyHistogram())
+        hist.observe(ms)
+
+    def snapshot(self):
+        """{"stage": {name: {count, mean_ms, p50_ms, p95_ms, p99_ms}}, "intent": {...}}"""
+        out = {"stage": {}, "intent": {}}
+        for (kind, name), hist in sorted(self._hists.items()):
+            pct = hist.percentiles(self.QUANTILES)
+            row = {"count": hist.count, "mean_ms": round(hist.total_ms / hist.count, 3) if hist.count else None}
+            for q in self.QUANTILES:
+                row[f"p{round(q * 100)}_ms"] = None if pct[q] is None else round(pct[q], 3)
+            out.setdefault(kind, {})[name] = row
+        return out
+
+    def prometheus(self):
+        """Prometheus text format: one summary per kind, labelled by stage / intent."""
+        lines = []
+        for kind in ("stage", "intent"):
+            metric = f"jarvis_{kind}_latency_seconds"
+            lines.append(f"# HELP {metric} Jarvis {kind} latency (quantiles over the last 10 minutes)")
+            lines.append(f"# TYPE {metric} summary")
+            for (k, name), hist in sorted(self._hists.items()):
+                if k != kind:
+                    continue
+                label = f'{kind}="{name}"'
+                for q, ms in hist.percentiles(self.QUANTILES).items():
+                    value = "NaN" if ms is None else f"{ms / 1000.0:.6f}"
+                    lines.append(f'{metric}{{{label},quantile="{q}"}} {value}')
+                lines.append(f"{metric}_sum{{{label}}} {hist.total_ms / 1000.0:.6f}")
+                lines.append(f"{metric}_count{{{label}}} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+LATENCY = LatencyStats()
+
+class Span:
+    __slots__ = ("name", "attrs", "start_ns", "end_ns", "children")
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.start_ns = time.perf_counter_ns()
+        self.end_ns = None
+        self.children = []
+
+    @property
+    def ms(self):
+        return ((self.end_ns or time.perf_counter_ns()) - self.start_ns) / 1e6
+
+    def to_dict(self, origin_ns=None):
+        origin_ns = self.start_ns if origin_ns is None else origin_ns
+        out = {"name": self.name, "at_ms": round((self.start_ns - origin_ns) / 1e6, 3), "ms": round(self.ms, 3)}
+        if self.attrs:
+            out["attrs"] = self.attrs
+        if self.children:
+            out["children"] = [c.to_dict(origin_ns) for c in self.children]
+        return out
+
+_trace = threading.local()   # .span: innermost open span, .turn: root of the current turn
+
+@contextmanager
+def span(name, **attrs):
+    """Time a pipeline stage (stage histogram + the current turn's span tree)."""
+    parent = getattr(_trace, "span", None)
+    s = Span(name, attrs)
+    if parent is not None:
+        parent.children.append(s)
+    _trace.span = s
+    try:
+        yield s
+    finally:
+        s.end_ns = time.perf_counter_ns()
+        _trace.span = parent
+        LATENCY.observe("stage", name, s.ms)
+
+def trace_turn_attrs(**attrs):
+    """Attach attributes (intent, query...) to the turn being traced, if any."""
+    turn = getattr(_trace, "turn", None)
+    if turn is not None:
+        turn.attrs.update(attrs)
+
+@contextmanager
+def turn_trace():
+    """One listen -> answer -> speak cycle; slow turns go to TRACE_SLOW_LOG with their spans."""
+    root = Span("turn", {})
+    _trace.turn = _trace.span = root
+    try:
+        yield root
+    finally:
+        root.end_ns = time.perf_counter_ns()
+        _trace.turn = _trace.span = None
+        ms = root.ms
+        LATENCY.observe("stage", "turn", ms)
+        LATENCY.observe("intent", root.attrs.get("intent", "none"), ms)
+        if TRACE_SLOW_MS and ms >= TRACE_SLOW_MS and TRACE_SLOW_LOG:
+            try:
+                with open(TRACE_SLOW_LOG, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(dict(root.to_dict(), ts=datetime.datetime.now().isoformat(
+                        timespec="seconds")), ensure_ascii=False) + "\n")
+            except Exception as e:
+                print("Could not write slow-turn log:", e)
+
+def start_metrics_server(port, host="127.0.0.1"):
+    """Serve /metrics (Prometheus text) and /metrics.json on a daemon thread."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.startswith("/metrics.json"):
+                body, ctype = json.dumps(LATENCY.snapshot()).encode("utf-8"), "application/json"
+            elif self.path.startswith("/metrics"):
+                body, ctype = LATENCY.prometheus().encode("utf-8"), "text/plain; version=0.0.4"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="jarvis-metrics", daemon=True).start()
+    return server
+
+# ---------------- Speech output ---------------------------------------------------
+# A TTS backend speaks one sentence at a time from the speech thread:
+#   open()                        called once on the speech thread
+#   say(text, should_stop)        blocks until done, or until should_stop() is true
+# Backends that can pre-render audio (for the phrase cache) also have:
+#   voice_key()                   text identifying the current voice settings
+#   render(text) -> WAV bytes
+#   play(clip, should_stop)       play a PhraseCache clip
+def wav_bytes(pcm, rate, width=2, channels=1):
+    """Wrap raw PCM in a WAV header."""
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(channels)
+        w.setsampwidth(width)
+        w.setframerate(rate)
+        w.writeframes(pcm)
+    return buf.getvalue()
+
+class SapiBackend:
+    """Windows SAPI voice. Speaks asynchronously so a sentence can be cut off."""
+
+    SVSF_ASYNC = 1
+    SVSF_PURGE = 2
+    SAFT_22KHZ_16BIT_MONO = 22
+
+    def open(self):
+        with timed("import win32com.client"):
+            import win32com.client
+        try:
+            # COM objects belong to the thread that creates them
+            import pythoncom
+            pythoncom.CoInitialize()
+        except ImportError:
+            pass
+        self._client = win32com.client
+        with timed("init SAPI voice"):
+            self.voice = win32com.client.Dispatch("SAPI.SpVoice")
+
+    def say(self, text, should_stop):
+        self.voice.Speak(text, self.SVSF_ASYNC)
+        while not self.voice.WaitUntilDone(50):
+            if should_stop():
+                self.voice.Speak("", self.SVSF_ASYNC | self.SVSF_PURGE)
+                return
+
+    def voice_key(self):
+        return f"sapi|{self.voice.Voice.Id}|{self.voice.Rate}|{self.voice.Volume}"
+
+    def render(self, text):
+        stream = self._client.Dispatch("SAPI.SpMemoryStream")
+        stream.Format.Type = self.SAFT_22KHZ_16BIT_MONO
+        previous = self.voice.AudioOutputStream
+        self.voice.AudioOutputStream = stream
+        try:
+            self.voice.Speak(text)
+        finally:
+            self.voice.AudioOutputStream = previous
+        return wav_bytes(bytes(stream.GetData()), 22050)
+
+    def play(self, clip, should_stop):
+        import winsound
+        winsound.PlaySound(clip.path, winsound.SND_FILENAME | winsound.SND_ASYNC | winsound.SND_NODEFAULT)
+        end = time.monotonic() + clip.seconds
+        while time.monotonic() < end:
+            if should_stop():
+                winsound.PlaySound(None, winsound.SND_PURGE)
+                return
+            time.sleep(0.02)
+
+class NullBackend:
+    """Prints only. ``chars_per_second`` > 0 simulates speaking time."""
+
+    def __init__(self, chars_per_second=0):
+        self.chars_per_second = chars_per_second
+
+    def open(self):
+        pass
+
+    def say(self, text, should_stop):
+        if self.chars_per_second:
+            end = time.monotonic() + len(text) / self.chars_per_second
+            while time.monotonic() < end and not should_stop():
+                time.sleep(0.01)
+
+class WavBackend:
+    """Writes each sentence as a numbered WAV file of silence sized like speech (tests)."""
+
+    def __init__(self, folder, rate=16000, chars_per_second=15):
+        self.folder = folder
+        self.rate = rate
+        self.chars_per_second = chars_per_second
+        self.count = 0
+        self.rendered = 0
+
+    def open(self):
+        os.makedirs(self.folder, exist_ok=True)
+
+    def _write(self, data):
+        self.count += 1
+        with open(os.path.join(self.folder, f"{self.count:05d}.wav"), "wb") as f:
+            f.write(data)
+
+    def say(self, text, should_stop):
+        self._write(self.render(text))
+
+    def voice_key(self):
+        return f"wav|{self.rate}|{self.chars_per_second}"
+
+    def render(self, text):
+        self.rendered += 1
+        return wav_bytes(b"\0\0" * int(self.rate * len(text) / self.chars_per_second), self.rate)
+
+    def play(self, clip, should_stop):
+        self._write(clip.data)
+
+def make_tts_backend(name):
+    if name == "sapi":
+        return SapiBackend()
+    if name == "wav":
+        return WavBackend(TTS_WAV_FOLDER)
+    return NullBackend()
+
+# Fixed sentences Jarvis says often. They are rendered once and replayed from the
+# phrase cache; _action() adds every fixed command reply to this list.
+CANNED_PHRASES = [
+    "Please say your command.",
+    "I didn't catch that. Say please type your command.",
+    "How can I assist you today?",
+    "Jarvis starting up.",
+    "Hello! What's your name?",
+    "Goodbye! Have a great day.",
+    "Please tell me the application title.",
+    "What should I write?",
+    "Sorry, I don't understand that yet. Try asking another way.",
+    "Playing music.",
+]
+
+PhraseClip = collections.namedtuple("PhraseClip", "path data seconds")
+
+class PhraseCache:
+    """Pre-rendered audio for fixed phrases, keyed by text + voice settings.
+
+    Clips are WAV files in ``folder``, memory-mapped when first used. The voice
+    settings are part of the key, so changing voice or rate simply misses and the
+    phrase is rendered again (lazily) with the new settings.
+    """
+
+    def __init__(self, folder, backend):
+        self.folder = folder
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._clips = {}   # key -> PhraseClip
+        os.makedirs(folder, exist_ok=True)
+
+    def _key(self, text):
+        return hashlib.sha1(f"{self.backend.voice_key()}\n{text}".encode("utf-8")).hexdigest()
+
+    def _load(self, key, path):
+        with open(path, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        with wave.open(io.BytesIO(data[:64]), "rb") as w:
+            # the header is all we need; nframes comes from it
+            seconds = w.getnframes() / float(w.getframerate())
+        clip = self._clips[key] = PhraseClip(path, data, seconds)
+        return clip
+
+    def get(self, text):
+        """Cached clip for ``text`` with the current voice, or None."""
+        key = self._key(text)
+        clip = self._clips.get(key)
+        if clip is None:
+            path = os.path.join(self.folder, key + ".wav")
+            if os.path.exists(path):
+                try:
+                    clip = self._load(key, path)
+                except Exception:
+                    clip = None
+        if clip is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return clip
+
+    def render(self, text):
+        """Render ``text`` with the current voice and store it."""
+        key = self._key(text)
+        path = os.path.join(self.folder, key + ".wav")
+        if key in self._clips or os.path.exists(path):
+            return
+        data = self.backend.render(text)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+def canned_sentences():
+    """Every sentence of CANNED_PHRASES, once."""
+    return list(dict.fromkeys(s for text in CANNED_PHRASES for s in split_sentences(text)))
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+
+def split_sentences(text):
+    """Split a response into sentences so the first one can start right away."""
+    return [part.strip() for part in _SENTENCE_RE.split(text) if part.strip()]
+
+class SpeechOutput:
+    """Queue in front of a TTS backend, drained by one speech thread.
+
+    speak() returns immediately. Long answers are split into sentences so the
+    first starts playing at once, and cancel() (barge-in: the user started
+    talking) drops everything still queued and cuts off the current sentence.
+    """
+
+    def __init__(self, backend, phrase_folder=None):
+        self.backend = backend
+        self.phrase_folder = phrase_folder
+        self.phrases = None                # PhraseCache, created on the speech thread
+        self._prerender = []               # sentences waiting to be rendered
+        self._canned = set()
+        self.first_audio_ms = collections.deque(maxlen=200)  # say() -> first sentence starts
+        self.utterance_ms = collections.deque(maxlen=200)    # say() -> last sentence done
+        self._queue = collections.deque()   # (generation, utterance start, sentence, is_first, is_last)
+        self._cond = threading.Condition()
+        self._generation = 0
+        self._busy = False
+        ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(ready,), name="jarvis-speech", daemon=True)
+        self._thread.start()
+        ready.wait()
+
+    def say(self, text):
+        sentences = split_sentences(text)
+        t0 = time.perf_counter()
+        with self._cond:
+            gen = self._generation
+            for i, sentence in enumerate(sentences):
+                self._queue.append((gen, t0, sentence, i == 0, i == len(sentences) - 1))
+            self._cond.notify_all()
+
+    def cancel(self):
+        """Drop queued sentences and stop the one being spoken."""
+        with self._cond:
+            self._generation += 1
+            self._queue.clear()
+            self._cond.notify_all()
+
+    def is_speaking(self):
+        with self._cond:
+            return self._busy or bool(self._queue)
+
+    def wait(self, timeout=None):
+        """Block until everything queued has been spoken."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._busy and not self._queue, timeout)
+
+    def prerender(self, sentences):
+        """Render sentences into the phrase cache whenever the speech thread is idle."""
+        with self._cond:
+            self._canned.update(sentences)
+            self._prerender.extend(sentences)
+            self._cond.notify_all()
+
+    def _render_one(self):
+        with self._cond:
+            if not self._prerender:
+                return
+            sentence = self._prerender.pop(0)
+        try:
+            self.phrases.render(sentence)
+        except Exception as e:
+            print("Could not pre-render phrase:", e)
+            with self._cond:
+                self._prerender = []
+
+    def _run(self, ready):
+        try:
+            self.backend.open()
+            if self.phrase_folder and hasattr(self.backend, "render"):
+                self.phrases = PhraseCache(self.phrase_folder, self.backend)
+        except Exception as e:
+            print("Could not start text-to-speech:", e)
+            self.backend = NullBackend()
+        ready.set()
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._queue or (self._prerender and self.phrases))
+                job = self._queue.popleft() if self._queue else None
+                self._busy = job is not None
+            if job is None:
+                self._render_one()
+                continue
+            gen, t0, sentence, first, last = job
+            if first:
+                self.first_audio_ms.append((time.perf_counter() - t0) * 1000.0)
+                LATENCY.observe("stage", "tts_first_audio", self.first_audio_ms[-1])
+            should_stop = lambda: self._generation != gen
+            t_sentence = time.perf_counter()
+            try:
+                clip = self.phrases.get(sentence) if self.phrases else None
+                if clip is not None:
+                    self.backend.play(clip, should_stop)
+                else:
+                    self.backend.say(sentence, should_stop)
+                    if self.phrases and sentence in self._canned:
+                        # voice settings changed since it was rendered
+                        self.prerender([sentence])
+            except Exception:
+                # If TTS fails, just print
+                pass
+            LATENCY.observe("stage", "tts_sentence", (time.perf_counter() - t_sentence) * 1000.0)
+            if last and self._generation == gen:
+                self.utterance_ms.append((time.perf_counter() - t0) * 1000.0)
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+
+def speak(text):
+    """Print and queue text for speaking (returns immediately)."""
+    if not text:
+        return
+    if actions.dry_run:
+        actions.record("say", text)
+        return
+    session = _session.get()
+    if session is not None:
+        # daemon client: delivered with its next reply
+        session.outbox.append(text)
+        return
+    print("Jarvis:", text)
+    try:
+        with span("speak"):
+            get_backend("speaker").say(text)
+    except Exception:
+        # If TTS fails, just print
+        pass
+
+def speech_wait(timeout=None):
+    """Wait until Jarvis has finished talking."""
+    try:
+        get_backend("speaker").wait(timeout)
+    except Exception:
+        pass
+
+def barge_in():
+    """The user started talking: stop Jarvis mid-answer."""
+    speaker = _backends.get("speaker")
+    if speaker is not None and speaker.is_speaking():
+        speaker.cancel()
+
+def _output_active():
+    speaker = _backends.get("speaker")
+    return speaker is not None and speaker.is_speaking()
+
+# ---------------- Audio capture ---------------------------------------------------
+# Sources deliver raw 16-bit mono PCM. Anything with SAMPLE_RATE, SAMPLE_WIDTH,
+# CHUNK, read(n_frames) -> bytes (b"" at end of input) and close() will do.
+class MicrophoneSource:
+    """The default microphone, opened once and kept open."""
+
+    def __init__(self, device_index=None):
+        self._mic = get_backend("sr").Microphone(device_index=device_index)
+        self._mic.__enter__()
+        self.SAMPLE_RATE = self._mic.SAMPLE_RATE
+        self.SAMPLE_WIDTH = self._mic.SAMPLE_WIDTH
+        self.CHUNK = self._mic.CHUNK
+
+    def read(self, frames):
+        return self._mic.stream.read(frames)
+
+    def close(self):
+        self._mic.__exit__(None, None, None)
+
+class WavFileSource:
+    """Stream a WAV file as if it were a microphone (for tests and replays)."""
+
+    def __init__(self, path, chunk=1024, realtime=False):
+        self._wav = wave.open(path, "rb")
+        self.SAMPLE_RATE = self._wav.getframerate()
+        self.SAMPLE_WIDTH = self._wav.getsampwidth()
+        self.CHUNK = chunk
+        self.realtime = realtime
+
+    def read(self, frames):
+        data = self._wav.readframes(frames)
+        if self.realtime and data:
+            time.sleep(frames / self.SAMPLE_RATE)
+        return data
+
+    def close(self):
+        self._wav.close()
+
+class SyntheticSource:
+    """Audio from an iterable of PCM chunks (e.g. generated silence and tones)."""
+
+    def __init__(self, chunks, sample_rate=16000, sample_width=2, chunk=1024):
+        self._chunks = iter(chunks)
+        self.SAMPLE_RATE = sample_rate
+        self.SAMPLE_WIDTH = sample_width
+        self.CHUNK = chunk
+
+    def read(self, frames):
+        return next(self._chunks, b"")
+
+    def close(self):
+        pass
+
+def pcm_rms(chunk, width=2):
+    """Root-mean-square energy of a chunk of 16-bit PCM."""
+    if width != 2 or len(chunk) < 2:
+        return 0.0
+    samples = array.array("h")
+    samples.frombytes(chunk[:len(chunk) // 2 * 2])
+    return math.sqrt(sum(x * x for x in samples) / len(samples))
+
+class VoiceActivityDetector:
+    """Decides per chunk whether it holds speech, from frame energy and zero crossings.
+
+    The chunk is cut into ``frame_ms`` frames. A frame is voiced when it is
+    louder than the capture threshold and crosses zero less often than
+    ``max_zcr`` (hiss, fans and clicks cross far more often than voiced
+    speech); the chunk is voiced when at least ``min_fraction`` of its frames
+    are, so a click shorter than a frame or two never counts. Uses NumPy when
+    installed, plain arrays otherwise.
+    """
+
+    def __init__(self, rate, frame_ms=20, max_zcr=0.3, min_fraction=0.5):
+        self.frame = max(2, int(rate * frame_ms / 1000))
+        self.max_zcr = max_zcr
+        self.min_fraction = min_fraction
+        try:
+            import numpy
+            self._np = numpy
+        except ImportError:
+            self._np = None
+
+    def analyse(self, chunk, threshold):
+        """(RMS of the whole chunk, True if it holds speech)"""
+        n = len(chunk) // 2
+        if n < self.frame:
+            return pcm_rms(chunk), False
+        frames = n // self.frame
+        if self._np is not None:
+            np = self._np
+            x = np.frombuffer(chunk, dtype=np.int16, count=n).astype(np.float32)
+            f = x[:frames * self.frame].reshape(frames, self.frame)
+            power = (f * f).mean(axis=1)
+            zcr = (np.signbit(f[:, 1:]) != np.signbit(f[:, :-1])).mean(axis=1)
+            voiced = int(((power > threshold * threshold) & (zcr < self.max_zcr)).sum())
+            return float(np.sqrt((x * x).mean())), voiced >= self.min_fraction * frames
+        samples = array.array("h")
+        samples.frombytes(chunk[:n * 2])
+        total, voiced, limit = 0, 0, threshold * threshold * self.frame
+        for i in range(frames):
+            f = samples[i * self.frame:(i + 1) * self.frame]
+            power = sum(v * v for v in f)
+            total += power
+            if power > limit:
+                crossings = sum(1 for a, b in zip(f, f[1:]) if (a < 0) != (b < 0))
+                voiced += crossings < self.max_zcr * (self.frame - 1)
+        return math.sqrt(total / (frames * self.frame)), voiced >= self.min_fraction * frames
+
+class CaptureSession:
+    """Long-lived audio capture with one-time calibration and a pre-roll ring buffer.
+
+    A reader thread pulls chunks from the source for the whole session. It
+    measures the ambient noise once at start, then keeps adapting the energy
+    threshold during silence. Recent chunks sit in a ring buffer, so when speech
+    starts the phrase includes the audio just before it, and a phrase spoken
+    while Jarvis was still talking is queued for the next listen() instead of
+    being lost.
+
+    With a ``vad`` (VoiceActivityDetector) a phrase only starts after ``onset``
+    seconds of voiced audio, phrases with less than ``min_voiced`` seconds of
+    speech are dropped, and silence beyond ``trim_pad`` is cut from both ends
+    before the phrase goes to the recognizer. Without one, every chunk above
+    the energy threshold counts as speech (the old behaviour).
+    """
+
+    def __init__(self, source, calibration=1.0, pre_roll=0.5, pause=0.8,
+                 energy_ratio=1.5, min_threshold=150.0, max_phrase=15.0, keep_for=5.0,
+                 barge_in_ratio=3.0, vad=None, onset=0.1, min_voiced=0.25, trim_pad=0.25):
+        self.source = source
+        self.rate = source.SAMPLE_RATE
+        self.width = source.SAMPLE_WIDTH
+        self.chunk = source.CHUNK
+        self.chunk_seconds = self.chunk / float(self.rate)
+        self.calibration = calibration
+        self.pre_roll = collections.deque(maxlen=max(1, int(pre_roll / self.chunk_seconds)))
+        self.pause = pause
+        self.energy_ratio = energy_ratio
+        self.min_threshold = min_threshold
+        self.max_phrase = max_phrase
+        self.keep_for = keep_for          # seconds a finished phrase waits for listen()
+        self.noise_level = None
+        self.energy_threshold = None
+        self.on_speech_start = []         # callbacks, e.g. barge-in for speech output
+        self.output_active = lambda: False  # true while Jarvis itself is talking
+        # optional consumer of phrase audio as it is captured (e.g. StreamingDecoder):
+        # phrase_start(pcm), phrase_audio(pcm), phrase_end(discard=False), input_end()
+        self.phrase_sink = None
+        self.barge_in_ratio = barge_in_ratio
+        self.phrase_limit = None          # seconds; set by listen()
+        self.vad = vad
+        self.onset_chunks = max(1, int(round(onset / self.chunk_seconds))) if vad else 1
+        self.min_voiced = min_voiced if vad else 0.0
+        self.trim_chunks = max(1, int(math.ceil(trim_pad / self.chunk_seconds))) if vad else None
+        self.chunks_read = 0
+        self.phrases_emitted = 0          # handed on for recognition
+        self.phrases_rejected = 0         # too little speech (clicks, bumps, coughs)
+        self._phrases = collections.deque()   # (end time, pcm bytes)
+        self._cond = threading.Condition()
+        self._eof = False
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="jarvis-capture", daemon=True)
+        self._thread.start()
+
+    def _read(self):
+        data = self.source.read(self.chunk)
+        self.chunks_read += 1
+        return data
+
+    def _calibrate(self):
+        levels = []
+        for _ in range(max(1, int(self.calibration / self.chunk_seconds))):
+            data = self._read()
+            if not data:
+                break
+            levels.append(pcm_rms(data, self.width))
+            self.pre_roll.append(data)
+        self.noise_level = sum(levels) / len(levels) if levels else 0.0
+        self._update_threshold()
+
+    def _update_threshold(self):
+        self.energy_threshold = max(self.min_threshold, self.noise_level * self.energy_ratio)
+
+    def _analyse(self, data, threshold):
+        if self.vad is not None:
+            return self.vad.analyse(data, threshold)
+        energy = pcm_rms(data, self.width)
+        return energy, energy > threshold
+
+    def _run(self):
+        try:
+            self._calibrate()
+            phrase = None       # chunks of the current phrase
+            voiced_at = []      # indexes of its voiced chunks
+            run = 0             # voiced chunks in a row before a phrase starts
+            silent = 0.0
+            while not self._stopped:
+                data = self._read()
+                if not data:
+                    break
+                talking = self.output_active()
+                # our own voice leaks into the microphone; only loud speech barges in
+                threshold = self.energy_threshold * (self.barge_in_ratio if talking and phrase is None else 1.0)
+                energy, voiced = self._analyse(data, threshold)
+                if phrase is None:
+                    self.pre_roll.append(data)
+                    run = run + 1 if voiced else 0
+                    if run >= self.onset_chunks:
+                        phrase = list(self.pre_roll)
+                        if self.trim_chunks is not None:
+                            phrase = phrase[-(run + self.trim_chunks):]
+                        voiced_at = list(range(len(phrase) - run, len(phrase)))
+                        silent, run = 0.0, 0
+                        if self.phrase_sink is not None:
+                            self.phrase_sink.phrase_start(b"".join(phrase))
+                        for callback in self.on_speech_start:
+                            callback()
+                    elif not voiced and not talking:
+                        # keep following the room while nobody is talking
+                        self.noise_level = 0.95 * self.noise_level + 0.05 * energy
+                        self._update_threshold()
+                    continue
+                phrase.append(data)
+                if voiced:
+                    voiced_at.append(len(phrase) - 1)
+                if self.phrase_sink is not None:
+                    self.phrase_sink.phrase_audio(data)
+                silent = 0.0 if voiced else silent + self.chunk_seconds
+                limit = self.phrase_limit or self.max_phrase
+                if silent >= self.pause or len(phrase) * self.chunk_seconds >= limit:
+                    self._finish(phrase, voiced_at)
+                    phrase = None
+                    self.pre_roll.clear()
+            if phrase:
+                self._finish(phrase, voiced_at)
+        except Exception as e:
+            print("Microphone listening error:", e)
+        finally:
+            with self._cond:
+                self._eof = True
+                self._cond.notify_all()
+            if self.phrase_sink is not None:
+                self.phrase_sink.input_end()
+
+    def _finish(self, chunks, voiced_at):
+        keep = len(voiced_at) * self.chunk_seconds >= self.min_voiced
+        if keep:
+            self.phrases_emitted += 1
+        else:
+            self.phrases_rejected += 1
+        if self.phrase_sink is not None:
+            # the sink turns the phrase into text; no need to keep the audio
+            self.phrase_sink.phrase_end(discard=not keep)
+            return
+        if not keep:
+            return
+        if self.trim_chunks is not None:
+            chunks = chunks[:voiced_at[-1] + 1 + self.trim_chunks]
+        with self._cond:
+            self._phrases.append((time.monotonic(), b"".join(chunks)))
+            self._cond.notify_all()
+
+    def next_phrase(self, timeout=None):
+        """Return the next phrase as PCM bytes, or None on timeout/end of input."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                while self._phrases:
+                    ended, pcm = self._phrases.popleft()
+                    if time.monotonic() - ended <= self.keep_for:
+                        return pcm
+                if self._eof:
+                    return None
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def close(self):
+        self._stopped = True
+        self._thread.join(timeout=2.0)
+        try:
+            self.source.close()
+        except Exception:
+            pass
+
+# ---------------- Speech recognition backends --------------------------------------
+# A recognizer turns one phrase of 16-bit mono PCM into text:
+#   recognize(pcm, rate, width) -> text ("" when nothing was understood)
+# Streaming recognizers (streaming = True) also decode while the user talks:
+#   stream(rate) -> object with feed(pcm) -> partial text, finish() -> final text
+class GoogleRecognizer:
+    """SpeechRecognition's free Google Web Speech API (needs the network)."""
+
+    streaming = False
+
+    def recognize(self, pcm, rate, width):
+        sr = get_backend("sr")
+        try:
+            return sr.Recognizer().recognize_google(sr.AudioData(pcm, rate, width))
+        except sr.UnknownValueError:
+            return ""
+        except sr.RequestError as e:
+            print("Speech service unreachable:", e)
+            return ""
+
+class _StreamingRecognizer:
+    streaming = True
+
+    def recognize(self, pcm, rate, width):
+        stream = self.stream(rate)
+        stream.feed(pcm)
+        return stream.finish()
+
+class VoskRecognizer(_StreamingRecognizer):
+    """Offline Kaldi models via vosk (pip install vosk, plus a model folder)."""
+
+    def __init__(self, model_path):
+        import vosk
+        vosk.SetLogLevel(-1)
+        self._vosk = vosk
+        self.model = vosk.Model(model_path)
+
+    def stream(self, rate):
+        return _VoskStream(self._vosk.KaldiRecognizer(self.model, rate))
+
+class _VoskStream:
+    def __init__(self, rec):
+        self.rec = rec
+        self.segments = []     # text of segments vosk already finalised (it splits on pauses)
+
+    def _text(self, *extra):
+        return " ".join(t for t in self.segments + list(extra) if t)
+
+    def feed(self, pcm):
+        if self.rec.AcceptWaveform(pcm):
+            self.segments.append(json.loads(self.rec.Result()).get("text", ""))
+            return self._text()
+        return self._text(json.loads(self.rec.PartialResult()).get("partial", ""))
+
+    def finish(self):
+        self.segments.append(json.loads(self.rec.FinalResult()).get("text", ""))
+        return self._text()
+
+class PocketSphinxRecognizer(_StreamingRecognizer):
+    """Offline CMU PocketSphinx (pip install pocketsphinx; bundled US English model)."""
+
+    def __init__(self):
+        from pocketsphinx import Decoder
+        self._Decoder = Decoder
+        self._decoders = {}    # sample rate -> Decoder (loading the model is slow)
+
+    def stream(self, rate):
+        decoder = self._decoders.get(rate)
+        if decoder is None:
+            decoder = self._decoders[rate] = self._Decoder(samprate=rate)
+        decoder.start_utt()
+        return _SphinxStream(decoder)
+
+class _SphinxStream:
+    def __init__(self, decoder):
+        self.decoder = decoder
+
+    def _hyp(self):
+        hyp = self.decoder.hyp()
+        return hyp.hypstr if hyp is not None else ""
+
+    def feed(self, pcm):
+        self.decoder.process_raw(pcm, False, False)
+        return self._hyp()
+
+    def finish(self):
+        self.decoder.end_utt()
+        return self._hyp()
+
+class ScriptedRecognizer(_StreamingRecognizer):
+    """Test stand-in: "hears" the given transcripts in order, one per phrase.
+
+    Partial hypotheses reveal the words at ``words_per_second`` of audio, so
+    streaming and early routing behave as with a real engine.
+    """
+
+    def __init__(self, transcripts, words_per_second=3.0):
+        self._texts = iter(transcripts)
+        self.words_per_second = words_per_second
+
+    def stream(self, rate):
+        return _ScriptedStream(next(self._texts, "").split(), rate * 2, self.words_per_second)
+
+class _ScriptedStream:
+    def __init__(self, words, bytes_per_second, words_per_second):
+        self.words = words
+        self.bytes_per_second = bytes_per_second
+        self.words_per_second = words_per_second
+        self.received = 0
+
+    def feed(self, pcm):
+        self.received += len(pcm)
+        heard = int(self.received / self.bytes_per_second * self.words_per_second)
+        return " ".join(self.words[:heard])
+
+    def finish(self):
+        return " ".join(self.words)
+
+def make_recognizer(name):
+    if name == "auto":
+        name = "vosk" if os.path.isdir(VOSK_MODEL_PATH) else "google"
+    if name == "vosk":
+        return VoskRecognizer(VOSK_MODEL_PATH)
+    if name == "pocketsphinx":
+        return PocketSphinxRecognizer()
+    if name == "script":
+        with open(os.path.splitext(AUDIO_SOURCE)[0] + ".txt", "r", encoding="utf-8") as f:
+            return ScriptedRecognizer([ln.strip() for ln in f if ln.strip()])
+    return GoogleRecognizer()
+
+class StreamingDecoder:
+    """Phrase sink that decodes each phrase while it is being captured.
+
+    The capture thread only queues audio; a decoder thread feeds it to the
+    recognizer's stream. When ``early(partial)`` is true for the same partial
+    ``stable`` times in a row, that text is handed to listen() at once and the
+    rest of the phrase is ignored; otherwise the final text is handed over when
+    the phrase ends.
+    """
+
+    def __init__(self, recognizer, rate, early=None, stable=2, keep_for=5.0):
+        self.recognizer = recognizer
+        self.rate = rate
+        self.early = early
+        self.stable = stable
+        self.keep_for = keep_for
+        self.partials = 0              # partial hypotheses decoded
+        self.early_hits = 0
+        self._events = collections.deque()   # ("start" | "audio" | "end" | "drop" | "eof", pcm)
+        self._results = collections.deque()  # (time, text, early)
+        self._cond = threading.Condition()
+        self._eof = False
+        self._thread = threading.Thread(target=self._run, name="jarvis-decoder", daemon=True)
+        self._thread.start()
+
+    # -- capture thread ------------------------------------------------------------
+    def _push(self, kind, pcm=None):
+        with self._cond:
+            self._events.append((kind, pcm))
+            self._cond.notify_all()
+
+    def phrase_start(self, pcm):
+        self._push("start", pcm)
+
+    def phrase_audio(self, pcm):
+        self._push("audio", pcm)
+
+    def phrase_end(self, discard=False):
+        self._push("drop" if discard else "end")
+
+    def input_end(self):
+        self._push("eof")
+
+    # -- decoder thread ------------------------------------------------------------
+    def _publish(self, text, early):
+        with self._cond:
+            self._results.append((time.monotonic(), text, early))
+            self._cond.notify_all()
+
+    def _run(self):
+        stream, answered, last, same = None, False, None, 0
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._events)
+                kind, pcm = self._events.popleft()
+            try:
+                if kind == "start":
+                    stream, answered, last, same = self.recognizer.stream(self.rate), False, None, 0
+                if kind in ("start", "audio") and stream is not None:
+                    partial = stream.feed(pcm)
+                    self.partials += 1
+                    if not answered and partial and self.early is not None:
+                        same = same + 1 if partial == last else 1
+                        last = partial
+                        if same >= self.stable and self.early(partial):
+                            answered = True
+                            self.early_hits += 1
+                            self._publish(partial, True)
+                elif kind == "end" and stream is not None:
+                    text = stream.finish()
+                    stream = None
+                    if not answered:
+                        self._publish(text, False)
+                elif kind == "drop":
+                    stream = None
+                elif kind == "eof":
+                    with self._cond:
+                        self._eof = True
+                        self._cond.notify_all()
+                    return
+            except Exception as e:
+                print("Speech recognition error:", e)
+                stream = None
+
+    def next_text(self, timeout=None):
+        """(text, early) for the next phrase, or None on timeout / end of input."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                while self._results:
+                    ended, text, early = self._results.popleft()
+                    if time.monotonic() - ended <= self.keep_for:
+                        return text, early
+                if self._eof:
+                    return None
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+_capture = None
+_capture_lock = threading.Lock()
+
+def open_audio_source():
+    """Build the configured source: the microphone, or a WAV file path."""
+    if AUDIO_SOURCE and AUDIO_SOURCE != "microphone":
+        return WavFileSource(AUDIO_SOURCE, realtime=True)
+    return MicrophoneSource()
+
+def get_capture_session(recognizer=None):
+    """The shared capture session, opened (and calibrated) on first use.
+
+    A streaming ``recognizer`` gets a StreamingDecoder attached, so phrases are
+    decoded while they are spoken.
+    """
+    global _capture
+    with _capture_lock:
+        if _capture is None:
+            source = open_audio_source()
+            decoder = None
+            if getattr(recognizer, "streaming", False):
+                decoder = StreamingDecoder(recognizer, source.SAMPLE_RATE,
+                                           early=early_intent if EARLY_ROUTING else None)
+            print("Calibrating microphone, please stay quiet...")
+            _capture = CaptureSession(source, calibration=CALIBRATION_SECONDS,
+                                      pre_roll=PRE_ROLL_SECONDS, pause=PAUSE_SECONDS,
+                                      barge_in_ratio=BARGE_IN_RATIO,
+                                      vad=VoiceActivityDetector(source.SAMPLE_RATE) if VAD_ENABLED else None)
+            _capture.phrase_sink = decoder
+            _capture.output_active = _output_active
+            _capture.on_speech_start.append(barge_in)
+        return _capture
+
+def listen(timeout=LISTEN_TIMEOUT):
+    """Listen from microphone and return lowercase text (or empty string)."""
+    try:
+        recognizer = get_backend("recognizer")
+        with span("mic_open"):
+            session = get_capture_session(recognizer)
+    except Exception as e:
+        print("Microphone listening error:", e)
+        return ""
+    print("Listening...")
+    session.phrase_limit = timeout
+    if session.phrase_sink is not None:
+        # streaming: capture and recognition overlap
+        with span("capture", streaming=True) as s:
+            got = session.phrase_sink.next_text()
+            s.attrs["early"] = bool(got and got[1])
+        query = got[0] if got else ""
+    else:
+        with span("capture"):
+            pcm = session.next_phrase()
+        if not pcm:
+            return ""
+        with span("recognize", seconds=round(len(pcm) / (session.rate * session.width), 2)):
+            query = recognizer.recognize(pcm, session.rate, session.width)
+    if query:
+        print("You:", query)
+    return query.lower()
+
+# ---------------- Persistent memory ----------------------------------------------
+class MemoryStore:
+    """Crash-safe store for the ``memory`` dict.
+
+    Instead of rewriting the whole JSON file on every change, each mutation is
+    appended to a journal file (one JSON line). A writer thread groups bursts of
+    mutations into a single write + fsync, and every ``compact_every`` records
+    it writes a fresh snapshot atomically (temp file + os.replace) and starts an
+    empty journal. Save latency stays constant however large memory grows.
+
+    Snapshot and journal carry a generation number, so a crash between
+    replacing the snapshot and resetting the journal never replays old records
+    twice. A torn last journal line (crash mid-write) is ignored on load.
+
+    A batch counts as saved only once its fsync returns. If writing fails the
+    journal is cut back to its last good end, the batch stays queued and is
+    retried every ``retry_delay`` seconds, and flush() raises the error.
+
+    With ``path=None`` the store lives only in memory (batch runs, tests).
+    """
+
+    def __init__(self, path, defaults=None, compact_every=500, commit_delay=0.02, retry_delay=0.5):
+        self.path = path
+        self.journal_path = path + ".journal" if path else None
+        self.compact_every = compact_every
+        self.commit_delay = commit_delay
+        self.retry_delay = retry_delay
+        self.data = dict(defaults or {})
+        self._lock = threading.RLock()          # guards data and the pending list
+        self._cond = threading.Condition(self._lock)
+        self._pending = []                      # journal lines not yet written
+        self._queued = 0                        # records ever queued
+        self._durable = 0                       # records written (or in a snapshot)
+        self._journal_records = 0
+        self._journal_end = 0                   # bytes of the journal known to be good
+        self._journal_broken = False            # a write failed part way; cut back before the next
+        self._generation = 0
+        self._error = None                      # the last write failure, until a write succeeds
+        self._failures = 0
+        self._closed = False
+        self._writer = None
+        if path is None:
+            return
+        needs_compact = self._load()
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+        self._journal_end = self._journal.tell()
+        if needs_compact or self._journal_end == 0:
+            self._compact(json.dumps(self._snapshot_data(), indent=4, ensure_ascii=False))
+        self._writer = threading.Thread(target=self._writer_loop, name="jarvis-memory", daemon=True)
+        self._writer.start()
+
+    @classmethod
+    def read_only(cls, path, defaults=None):
+        """In-memory copy of the store at ``path``; changes are never written back."""
+        store = cls(None, defaults)
+        if path and os.path.exists(path):
+            store.path, store.journal_path = path, path + ".journal"
+            store._load()
+            store.path = store.journal_path = None
+        return store
+
+    # -- loading -------------------------------------------------------------------
+    def _load(self):
+        """Read snapshot + journal. Returns True if the files should be compacted."""
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    snap = json.load(f)
+                self._generation = snap.pop("_generation", 0)
+                self.data.update(snap)
+            except Exception as e:
+                print("Could not load memory:", e)
+        if not os.path.exists(self.journal_path):
+            return False
+        torn = False
+        with open(self.journal_path, "r", encoding="utf-8") as f:
+            lines = f.read().split("\n")
+        try:
+            header = json.loads(lines[0]) if lines[0] else {}
+        except ValueError:
+            header = {}
+        if header.get("generation") != self._generation:
+            # journal predates the snapshot (crash during compaction): already applied
+            return True
+        for line in lines[1:]:
+            if not line:
+                continue
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                torn = True
+                break
+            self._apply(rec["op"], rec["key"], rec.get("value"))
+            self._journal_records += 1
+        return torn
+
+    def _apply(self, op, key, value):
+        if op == "set":
+            self.data[key] = value
+        elif op == "append":
+            self.data.setdefault(key, []).append(value)
+        elif op == "remove":
+            try:
+                self.data.get(key, []).remove(value)
+            except ValueError:
+                return False
+        elif op == "delete":
+            if key not in self.data:
+                return False
+            del self.data[key]
+        return True
+
+    # -- mutations -----------------------------------------------------------------
+    def _record(self, op, key, value=None):
+        with self._lock:
+            if not self._apply(op, key, value) or self._writer is None:
+                return
+            self._pending.append(json.dumps({"op": op, "key": key, "value": value}, ensure_ascii=False))
+            self._queued += 1
+            self._cond.notify_all()
+
+    def set(self, key, value):
+        """memory[key] = value"""
+        self._record("set", key, value)
+
+    def append(self, key, item):
+        """memory[key].append(item)"""
+        self._record("append", key, item)
+
+    def remove(self, key, item):
+        """memory[key].remove(item) (no-op if the item is not there)"""
+        self._record("remove", key, item)
+
+    def delete(self, key):
+        """del memory[key] (no-op if the key is not there)"""
+        self._record("delete", key)
+
+    def flush(self, timeout=5.0):
+        """Block until every mutation made so far is on disk.
+
+        Returns False on timeout; raises the OSError if a write fails meanwhile
+        (the mutations stay queued and are retried).
+        """
+        if self._writer is None:
+            return True
+        with self._lock:
+            target, failures = self._queued, self._failures
+            self._cond.notify_all()
+            if self._cond.wait_for(lambda: self._durable >= target or self._closed
+                                   or self._failures > failures, timeout):
+                if self._durable < target and self._error is not None:
+                    raise self._error
+                return self._durable >= target
+            return False
+
+    def close(self):
+        if self._writer is None:
+            return
+        try:
+            self.flush()
+        except OSError as e:
+            print("Could not save memory:", e)
+        with self._lock:
+            self._closed = True
+            self._cond.notify_all()
+        self._writer.join(timeout=5.0)
+        try:
+            self._journal.close()
+        except OSError:
+            pass
+
+    # -- writer thread -------------------------------------------------------------
+    def _snapshot_data(self):
+        return dict(self.data, _generation=self._generation + 1)
+
+    def _compact(self, snapshot_text):
+        """Atomically replace the snapshot and start a new, empty journal."""
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(snapshot_text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self._generation += 1
+        self._journal.seek(0)
+        self._journal.truncate()
+        self._journal.write(json.dumps({"generation": self._generation}) + "\n")
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+        self._journal_records = 0
+        self._journal_end = self._journal.tell()
+
+    def _reopen_journal(self):
+        """Drop whatever a failed write left behind the last good end of the journal."""
+        try:
+            self._journal.close()
+        except OSError:
+            pass        # the unwritten buffer goes with it
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+        self._journal.truncate(self._journal_end)
+        self._journal.seek(self._journal_end)
+        self._journal_broken = False
+
+    def _commit(self, batch, snapshot):
+        if self._journal_broken:
+            self._reopen_journal()
+        self._journal_broken = True
+        if snapshot is not None:
+            self._compact(snapshot)
+        else:
+            self._journal.write("\n".join(batch) + "\n")
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+            self._journal_records += len(batch)
+            self._journal_end = self._journal.tell()
+        self._journal_broken = False
+
+    def _writer_loop(self):
+        while True:
+            with self._lock:
+                self._cond.wait_for(lambda: self._pending or self._closed)
+                if not self._pending and self._closed:
+                    return
+            # let a burst of mutations pile up so they share one commit
+            time.sleep(self.commit_delay)
+            with self._lock:
+                batch, self._pending = self._pending, []
+                done = self._queued
+                snapshot = None
+                if self._journal_records + len(batch) >= self.compact_every:
+                    # the snapshot already contains this batch, so it is not journalled
+                    snapshot = json.dumps(self._snapshot_data(), indent=4, ensure_ascii=False)
+            try:
+                self._commit(batch, snapshot)
+            except Exception as e:
+                with self._lock:
+                    if self._error is None:
+                        print("Could not save memory:", e)
+                    # not on disk: keep the batch queued ahead of newer mutations
+                    self._pending[:0] = batch
+                    self._error = e if isinstance(e, OSError) else OSError(str(e))
+                    self._failures += 1
+                    self._cond.notify_all()
+                    if self._cond.wait_for(lambda: self._closed, self.retry_delay):
+                        return
+                continue
+            with self._lock:
+                self._durable = done
+                self._error = None
+                self._cond.notify_all()
+
+def _memory_defaults():
+    return {"name": None, "reminders": [], "last_independence_year": 0}
+
+# The memory file is opened by open_memory() when Jarvis really starts (voice
+# loop, daemon). Until then, and in batch runs, the store lives only in RAM, so
+# importing this module never touches the user's files.
+memory_store = MemoryStore(None, defaults=_memory_defaults())
+memory = memory_store.data   # read freely; change it only through memory_store
+
+def open_memory(path=None):
+    """Switch ``memory_store`` to the memory file (MEMORY_FILE by default), once."""
+    global memory_store, memory
+    if memory_store.path is None:
+        memory_store = MemoryStore(path or MEMORY_FILE, defaults=_memory_defaults())
+        memory = memory_store.data
+        atexit.register(memory_store.close)
+    return memory_store
+
+def save_memory():
+    """Wait until all memory changes are safely on disk. False if they could not be saved."""
+    try:
+        return memory_store.flush()
+    except OSError as e:
+        print("Could not save memory:", e)
+        return False
+
+# In daemon mode each client gets its own namespace (a Session); handlers reach
+# the caller's memory and chat history through these instead of the globals.
+_session = contextvars.ContextVar("jarvis_session", default=None)
+
+def current_store():
+    session = _session.get()
+    return memory_store if session is None else session.store
+
+def current_history():
+    session = _session.get()
+    return get_backend("history") if session is None else session.history
+
+# ---------------- Chat history ----------------------------------------------------
+class ChatArchive:
+    """Every turn of the conversation, on disk, with only the latest few in memory.
+
+    Turns are appended as JSON lines to ``current.jsonl``, whose first line
+    names its segment number. Once it reaches ``segment_bytes`` it is gzipped
+    into ``NNNNNN.jsonl.gz`` and a new segment begins; when the compressed
+    segments exceed ``max_bytes`` the oldest are deleted. An SQLite index
+    (``index.db``) holds each turn's time, intent and question with an FTS5
+    full-text table over the questions (a LIKE scan where SQLite lacks FTS5),
+    so "what did I ask yesterday" never reads the segments. Replies live only
+    in the segments.
+
+    The index is caught up from the segments on open, so losing it (or a crash
+    between the two writes) costs a rebuild, not history. With ``path=None``
+    nothing is written to disk (batch runs, tests).
+    """
+
+    CURRENT = "current.jsonl"
+
+    def __init__(self, path, segment_bytes=256 * 1024, max_bytes=64 * 1024 ** 2, recent=20, clock=time.time):
+        self.path = path
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.recent = collections.deque(maxlen=recent)   # latest turns, oldest first
+        self._lock = threading.Lock()
+        self._segment = 1
+        self._file = None
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(path, "index.db") if path else ":memory:",
+                                   check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")   # the segments are the durable copy
+        self._db.execute("""CREATE TABLE IF NOT EXISTS turns (
+                              id INTEGER PRIMARY KEY,
+                              ts REAL NOT NULL,
+                              segment INTEGER NOT NULL,
+                              intent TEXT,
+                              query TEXT NOT NULL)""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS turns_ts ON turns(ts)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS turns_segment ON turns(segment)")
+        try:
+            self._db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS turns_fts "
+                             "USING fts5(query, content='turns', content_rowid='id')")
+            self.fts = True
+        except sqlite3.OperationalError:
+            self.fts = False
+        self._db.commit()
+        if path is not None:
+            self._open()
+
+    # -- segments ------------------------------------------------------------------
+    def _segment_path(self, n):
+        return os.path.join(self.path, f"{n:06d}.jsonl.gz")
+
+    def sealed_segments(self):
+        """Numbers of the compressed segments, oldest first."""
+        if self.path is None:
+            return []
+        return sorted(int(name[:6]) for name in os.listdir(self.path)
+                      if name.endswith(".jsonl.gz") and name[:6].isdigit())
+
+    @staticmethod
+    def _parse(lines):
+        turns = []
+        for line in lines:
+            try:
+                turns.append(json.loads(line))
+            except ValueError:
+                break       # torn last line (crash mid-write)
+        return turns
+
+    def read_segment(self, n):
+        """All turns of segment ``n`` (the current one included), oldest first."""
+        if n == self._segment:
+            with open(os.path.join(self.path, self.CURRENT), "r", encoding="utf-8") as f:
+                return self._parse(f.read().split("\n")[1:])
+        with gzip.open(self._segment_path(n), "rt", encoding="utf-8") as f:
+            return self._parse(f.read().split("\n"))
+
+    def _open(self):
+        sealed = self.sealed_segments()
+        current = os.path.join(self.path, self.CURRENT)
+        header = None
+        if os.path.exists(current):
+            with open(current, "r", encoding="utf-8") as f:
+                try:
+                    header = json.loads(f.readline() or "{}").get("segment")
+                except ValueError:
+                    header = None
+            if header is None or header in sealed:
+                # crash after sealing it (already compressed), or a damaged header
+                os.remove(current)
+                header = None
+        self._segment = header or (sealed[-1] + 1 if sealed else 1)
+        if header is None:
+            self._file = open(current, "w", encoding="utf-8")
+            self._file.write(json.dumps({"segment": self._segment}) + "\n")
+            self._file.flush()
+        else:
+            self._file = open(current, "a", encoding="utf-8")
+        # rows of segments deleted by the size cap (crash before the index was told)
+        oldest = sealed[0] if sealed else self._segment
+        self._drop_rows("segment < ?", oldest)
+        # index whatever the index is missing; only the segments written since the
+        # last clean run (plus any with no rows at all) need reading
+        tail = sealed[-1:] + [self._segment]
+        for n in sealed + [self._segment]:
+            have = self._db.execute("SELECT COUNT(*) FROM turns WHERE segment=?", (n,)).fetchone()[0]
+            if have and n not in tail:
+                continue
+            turns = self.read_segment(n)
+            self._index(n, turns[have:])
+            self.recent.extend(turns[-self.recent.maxlen:])
+        self._db.commit()
+
+    def _drop_rows(self, where, arg):
+        if self.fts:
+            self._db.execute("INSERT INTO turns_fts(turns_fts, rowid, query) "
+                             f"SELECT 'delete', id, query FROM turns WHERE {where}", (arg,))
+        self._db.execute(f"DELETE FROM turns WHERE {where}", (arg,))
+
+    def _index(self, segment, turns):
+        for t in turns:
+            cur = self._db.execute("INSERT INTO turns(ts, segment, intent, query) VALUES (?, ?, ?, ?)",
+                                   (t["ts"], segment, t.get("intent"), t["q"]))
+            if self.fts:
+                self._db.execute("INSERT INTO turns_fts(rowid, query) VALUES (?, ?)", (cur.lastrowid, t["q"]))
+
+    def _seal(self):
+        """Compress the current segment and start the next one."""
+        current = os.path.join(self.path, self.CURRENT)
+        self._file.close()
+        with open(current, "rb") as f:
+            f.readline()
+            body = f.read()
+        tmp = self._segment_path(self._segment) + ".tmp"
+        with gzip.open(tmp, "wb") as f:
+            f.write(body)
+        os.replace(tmp, self._segment_path(self._segment))
+        self._segment += 1
+        self._file = open(current, "w", encoding="utf-8")
+        self._file.write(json.dumps({"segment": self._segment}) + "\n")
+        self._file.flush()
+        self._enforce_cap()
+
+    def _enforce_cap(self):
+        sealed = self.sealed_segments()
+        sizes = {n: os.path.getsize(self._segment_path(n)) for n in sealed}
+        total = sum(sizes.values())
+        for n in sealed:
+            if total <= self.max_bytes:
+                break
+            self._drop_rows("segment = ?", n)
+            os.remove(self._segment_path(n))
+            total -= sizes[n]
+        self._db.commit()
+
+    # -- recording -----------------------------------------------------------------
+    def add(self, query, response, intent=None, ts=None):
+        """Record one turn."""
+        turn = {"ts": self.clock() if ts is None else ts, "q": query, "a": response, "intent": intent}
+        with self._lock:
+            self.recent.append(turn)
+            if self._file is not None:
+                self._file.write(json.dumps(turn, ensure_ascii=False) + "\n")
+                self._file.flush()
+            self._index(self._segment, [turn])
+            self._db.commit()
+            if self._file is not None and self._file.tell() >= self.segment_bytes:
+                self._seal()
+
+    def import_turns(self, turns):
+        """Add old-style history entries ({"q": ..., "a": ...}), e.g. memory["chat_history"]."""
+        now = self.clock()
+        for item in turns:
+            if isinstance(item, dict) and (item.get("q") or item.get("query")):
+                self.add(item.get("q") or item.get("query"), item.get("a") or item.get("response"),
+                         item.get("intent"), item.get("ts", now))
+
+    # -- questions -----------------------------------------------------------------
+    def asked_between(self, start, end, limit=None):
+        """(ts, question) asked in [start, end), oldest first; history questions left out."""
+        with self._lock:
+            return self._db.execute("SELECT ts, query FROM turns WHERE ts >= ? AND ts < ? "
+                                    "AND intent IS NOT 'history' ORDER BY ts LIMIT ?",
+                                    (start, end, -1 if limit is None else limit)).fetchall()
+
+    def search(self, text, limit=5, start=None, end=None):
+        """(total, [(ts, question)]) of questions mentioning every word of ``text``, newest first."""
+        words = tokenize(text)
+        if not words:
+            return 0, []
+        span_sql = " AND t.ts >= ? AND t.ts < ?" if start is not None else ""
+        span_args = (start, end) if start is not None else ()
+        with self._lock:
+            if self.fts:
+                match = " ".join('"%s"' % w.replace('"', '') for w in words)
+                base = ("FROM turns_fts JOIN turns t ON t.id = turns_fts.rowid "
+                        "WHERE turns_fts MATCH ? AND t.intent IS NOT 'history'" + span_sql)
+                args = (match,) + span_args
+            else:
+                base = ("FROM turns t WHERE t.intent IS NOT 'history'" + span_sql
+                        + "".join(" AND t.query LIKE ?" for _ in words))
+                args = span_args + tuple(f"%{w}%" for w in words)
+            total = self._db.execute("SELECT COUNT(*) " + base, args).fetchone()[0]
+            rows = self._db.execute("SELECT t.ts, t.query " + base + " ORDER BY t.ts DESC LIMIT ?",
+                                    args + (limit,)).fetchall()
+        return total, rows
+
+    def count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM turns").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self._db.close()
+
+def _load_history():
+    with timed("open chat history"):
+        archive = ChatArchive(CHAT_ARCHIVE_DIR, segment_bytes=CHAT_SEGMENT_BYTES,
+                              max_bytes=CHAT_ARCHIVE_MAX_BYTES, recent=CHAT_RECENT_TURNS)
+    if memory.get("chat_history"):
+        # older versions kept the history inside the memory file
+        archive.import_turns(memory["chat_history"])
+        memory_store.delete("chat_history")
+    atexit.register(archive.close)
+    return archive
+
+_WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+_DAY_RE = re.compile(r"\b(?:(today|yesterday|this morning|tonight)|(\d+|a|one|two|three|four|five|six|seven) days? ago"
+                     r"|(?:on |last )?(monday|tuesday|wednesday|thursday|friday|saturday|sunday)|(last|this) week)\b")
+_SMALL_NUMBERS = {"a": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7}
+
+def history_period(q, today=None):
+    """(start, end, label, matched text) for the day named in ``q``, or None.
+
+    start/end are local-midnight timestamps; "last week" is the seven days
+    before today.
+    """
+    m = _DAY_RE.search(q)
+    if not m:
+        return None
+    today = today or datetime.date.today()
+    word, ago, weekday, week = m.groups()
+    if word in ("today", "this morning", "tonight"):
+        first, days, label = today, 1, "today"
+    elif word == "yesterday":
+        first, days, label = today - datetime.timedelta(days=1), 1, "yesterday"
+    elif ago:
+        n = _SMALL_NUMBERS.get(ago) or int(ago)
+        first, days, label = today - datetime.timedelta(days=n), 1, f"{n} day{'s' if n > 1 else ''} ago"
+    elif weekday:
+        back = (today.weekday() - _WEEKDAYS.index(weekday)) % 7 or 7
+        first, days, label = today - datetime.timedelta(days=back), 1, f"on {weekday.capitalize()}"
+    elif week == "this":
+        first = today - datetime.timedelta(days=today.weekday())
+        days, label = (today - first).days + 1, "this week"
+    else:
+        first, days, label = today - datetime.timedelta(days=7), 7, "last week"
+    start = time.mktime(first.timetuple())
+    end = time.mktime((first + datetime.timedelta(days=days)).timetuple())
+    return start, end, label, m.group(0)
+
+def _when(ts, now=None):
+    when = datetime.datetime.fromtimestamp(ts)
+    days = ((now or datetime.date.today()) - when.date()).days
+    day = "today" if days == 0 else "yesterday" if days == 1 else when.strftime("on %d %B")
+    return f"{day} at {when:%H:%M}"
+
+def _quoted_list(questions, most=4):
+    shown = [f'"{q}"' for q in questions[:most]]
+    if len(questions) > most:
+        shown.append(f"{len(questions) - most} more")
+    return shown[0] if len(shown) == 1 else ", ".join(shown[:-1]) + " and " + shown[-1]
+
+def _history(q):
+    # "what did I ask about yesterday", "when did I ask about pakistan", "what did we talk about last week"
+    archive = current_history()
+    today = datetime.date.fromtimestamp(archive.clock())
+    period = history_period(q, today)
+    rest = q.replace(period[3], " ") if period else q
+    m = re.search(r"\babout (.+)$", rest)
+    topic = m.group(1).strip(" ?.") if m else ""
+    if topic:
+        total, rows = archive.search(topic, limit=1, start=period and period[0], end=period and period[1])
+        if not total:
+            return f"You haven't asked me about {topic}" + (f" {period[2]}." if period else " yet.")
+        times = "once" if total == 1 else "twice" if total == 2 else f"{total} times"
+        return f'You asked me about {topic} {times}; most recently {_when(rows[0][0], today)}: "{rows[0][1]}".'
+    if period:
+        questions = [query for _, query in archive.asked_between(period[0], period[1])]
+        if not questions:
+            return f"You didn't ask me anything {period[2]}."
+        return f"{period[2].capitalize()} you asked: {_quoted_list(questions)}."
+    questions = [t["q"] for t in archive.recent if t.get("intent") != "history"][-4:]
+    if not questions:
+        return "You haven't asked me anything yet."
+    return f"Recently you asked: {_quoted_list(questions[::-1])}."
+
+# ---------------- Local knowledge base ------------------------------------------
+# Knowledge lives in JSON files in KNOWLEDGE_DIR, one topic per file:
+#   {"topic": "pakistan",
+#    "entries": [{"key": "capital", "keywords": ["capital", "capital city"], "answer": "..."}]}
+# The files are compiled once into a BM25 inverted index file that is
+# memory-mapped at startup; it is rebuilt automatically when a file changes.
+KB_STOPWORDS = frozenset("""a an the of in on at to for is are was were be what whats what's who whos
+who's when where why how which tell me about please do does did you your i my can could
+would is it its it's and or""".split())
+
+class KnowledgeBase:
+    """Read-only BM25 index over the knowledge files, served from a memory map.
+
+    File layout: b"JKB1", header length (uint32), JSON header (terms, docs),
+    padding to 4 bytes, then one uint32 array of postings ((doc << 8) | tf) and
+    finally the UTF-8 answers.
+    """
+
+    MAGIC = b"JKB1"
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:4] != self.MAGIC:
+            raise ValueError(f"not a knowledge index: {path}")
+        (hlen,) = struct.unpack_from("<I", self._mm, 4)
+        header = json.loads(self._mm[8:8 + hlen].decode("utf-8"))
+        self.fingerprint = header["fingerprint"]
+        self.terms = header["terms"]            # term -> [first posting, df]
+        self.docs = header["docs"]              # [topic, key, answer offset, answer length, length]
+        self.avgdl = header["avgdl"] or 1.0
+        self._answers_start = header["answers_start"]
+        postings = sum(df for _, df in self.terms.values())
+        end = self._answers_start + sum(d[3] for d in self.docs)
+        if (header["postings_start"] < 8 + hlen or header["postings_start"] % 4
+                or self._answers_start != header["postings_start"] + 4 * postings or end != len(self._mm)):
+            self._mm.close()
+            raise ValueError(f"damaged knowledge index: {path}")
+        self._postings = memoryview(self._mm)[header["postings_start"]:self._answers_start].cast("I")
+        self._by_key = {(d[0], d[1]): i for i, d in enumerate(self.docs)}
+        self._topic_terms = {t: set(tokenize(t)) for t in {d[0] for d in self.docs}}
+
+    def __len__(self):
+        return len(self.docs)
+
+    def answer(self, doc_id):
+        _, _, off, length, _ = self.docs[doc_id]
+        start = self._answers_start + off
+        return self._mm[start:start + length].decode("utf-8")
+
+    def get(self, topic, key):
+        """Answer stored under ``key`` in ``topic`` (or None)."""
+        doc_id = self._by_key.get((topic, key))
+        return None if doc_id is None else self.answer(doc_id)
+
+    def search(self, query, topic=None, limit=1):
+        """Best (score, topic, key, answer) matches for ``query``.
+
+        A match must hit at least one word besides its own topic name, so "tell
+        me about pakistan" doesn't return a random Pakistan fact.
+        """
+        n = len(self.docs)
+        scores = {}
+        hits = {}
+        terms = [t for t in dict.fromkeys(tokenize(query)) if t not in KB_STOPWORDS]
+        for term in terms:
+            entry = self.terms.get(term)
+            if entry is None:
+                continue
+            first, df = entry
+            idf = math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+            for packed in self._postings[first:first + df]:
+                doc_id, tf = packed >> 8, packed & 0xFF
+                doc = self.docs[doc_id]
+                if topic is not None and doc[0] != topic:
+                    continue
+                norm = tf + self.K1 * (1.0 - self.B + self.B * doc[4] / self.avgdl)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.K1 + 1.0) / norm
+                if term not in self._topic_terms[doc[0]]:
+                    hits[doc_id] = True
+        best = sorted((d for d in scores if d in hits), key=lambda d: -scores[d])[:limit]
+        return [(scores[d], self.docs[d][0], self.docs[d][1], self.answer(d)) for d in best]
+
+    def close(self):
+        self._postings.release()
+        self._mm.close()
+
+def knowledge_files(folder):
+    try:
+        return sorted(os.path.join(folder, fn) for fn in os.listdir(folder) if fn.endswith(".json"))
+    except OSError:
+        return []
+
+def knowledge_fingerprint(files):
+    h = hashlib.sha1()
+    for path in files:
+        st = os.stat(path)
+        h.update(f"{os.path.basename(path)}|{st.st_size}|{st.st_mtime_ns}\n".encode("utf-8"))
+    return h.hexdigest()
+
+def build_knowledge_index(files, path, entries=None):
+    """Compile knowledge files (or ``entries``: (topic, key, keywords, answer)) into ``path``."""
+    if entries is None:
+        entries = []
+        for fn in files:
+            with open(fn, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            topic = data.get("topic") or os.path.splitext(os.path.basename(fn))[0]
+            for e in data.get("entries", []):
+                entries.append((topic, e["key"], e.get("keywords", []), e["answer"]))
+    postings = {}     # term -> [(doc, tf)]
+    docs = []
+    answers = io.BytesIO()
+    total_len = 0
+    for doc_id, (topic, key, keywords, answer) in enumerate(entries):
+        words = [t for t in tokenize(" ".join([topic, key] + list(keywords))) if t not in KB_STOPWORDS]
+        counts = collections.Counter(words)
+        for term, tf in counts.items():
+            postings.setdefault(term, []).append((doc_id << 8) | min(tf, 255))
+        raw = answer.encode("utf-8")
+        docs.append([topic, key, answers.tell(), len(raw), len(words)])
+        answers.write(raw)
+        total_len += len(words)
+    terms = {}
+    flat = array.array("I")
+    for term in sorted(postings):
+        terms[term] = [len(flat), len(postings[term])]
+        flat.extend(postings[term])
+    header = {"fingerprint": knowledge_fingerprint(files), "terms": terms, "docs": docs,
+              "avgdl": total_len / len(docs) if docs else 1.0}
+    # offsets depend on the header size, which depends on the offsets: grow the
+    # start until the header written with it fits in front of it
+    start = 0
+    while True:
+        header["postings_start"] = start
+        header["answers_start"] = start + len(flat) * 4
+        raw = json.dumps(header, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        needed = 8 + len(raw)
+        needed += -needed % 4
+        if needed <= start:
+            break
+        start = needed
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(KnowledgeBase.MAGIC + struct.pack("<I", len(raw)) + raw)
+        f.write(b"\0" * (start - 8 - len(raw)))
+        f.write(flat.tobytes())
+        f.write(answers.getvalue())
+    try:
+        _check_knowledge_index(tmp, docs, flat, entries)
+    except Exception:
+        os.remove(tmp)
+        raise
+    os.replace(tmp, path)
+
+def _check_knowledge_index(path, docs, flat, entries):
+    """Read a freshly written index back; ValueError if it does not hold what was written."""
+    kb = KnowledgeBase(path)
+    try:
+        if len(kb) != len(docs) or kb._postings != memoryview(flat):
+            raise ValueError(f"knowledge index {path} does not read back")
+        for doc_id in {0, len(docs) // 2, len(docs) - 1} if docs else ():
+            if kb.answer(doc_id) != entries[doc_id][3]:
+                raise ValueError(f"knowledge index {path} does not read back")
+    finally:
+        kb.close()
+
+def _load_knowledge():
+    """Map the knowledge index, rebuilding it first if the knowledge files changed."""
+    files = knowledge_files(KNOWLEDGE_DIR)
+    fingerprint = knowledge_fingerprint(files)
+    with timed("load knowledge base"):
+        try:
+            kb = KnowledgeBase(KNOWLEDGE_INDEX_FILE)
+            if kb.fingerprint == fingerprint:
+                return kb
+            kb.close()
+        except (OSError, ValueError, KeyError, IndexError):
+            # unreadable (e.g. written by an older, buggy build): start over
+            try:
+                os.remove(KNOWLEDGE_INDEX_FILE)
+            except OSError:
+                pass
+        build_knowledge_index(files, KNOWLEDGE_INDEX_FILE)
+        return KnowledgeBase(KNOWLEDGE_INDEX_FILE)
+
+def get_knowledge_base():
+    return get_backend("knowledge")
+
+def knowledge_answer(query, topic=None):
+    """Best local answer for ``query`` (or None)."""
+    try:
+        with span("knowledge"):
+            found = get_knowledge_base().search(query, topic=topic)
+    except Exception as e:
+        print("Knowledge base error:", e)
+        return None
+    return found[0][3] if found else None
+
+# ---------------- ChatterBot training & timing -----------------------------------
+# Training runs only when the corpus changed: its fingerprint is kept in a small
+# table inside the ChatterBot database itself.
+CHATBOT_CONVERSATIONS = [
+    ["hello", "Hello! I am Jarvis, your assistant.",
+     "how are you", "I am fine, thank you!",
+     "what is your name", "My name is Jarvis.",
+     "who created you", "You did — an awesome developer."],
+]
+
+def load_corpus_files(folder):
+    """Conversations from CHATBOT_CORPUS_DIR.
+
+    .json: a list of conversations (each a list of lines)
+    .txt:  one line per statement, blank lines between conversations
+    .yml:  chatterbot-corpus format ("conversations:" list; needs PyYAML)
+    """
+    conversations = []
+    for fn in sorted(os.listdir(folder)) if folder and os.path.isdir(folder) else []:
+        path = os.path.join(folder, fn)
+        ext = os.path.splitext(fn)[1].lower()
+        try:
+            if ext == ".json":
+                with open(path, "r", encoding="utf-8") as f:
+                    conversations.extend(json.load(f))
+            elif ext == ".txt":
+                with open(path, "r", encoding="utf-8") as f:
+                    for block in f.read().split("\n\n"):
+                        lines = [ln.strip() for ln in block.splitlines() if ln.strip()]
+                        if lines:
+                            conversations.append(lines)
+            elif ext in (".yml", ".yaml"):
+                import yaml
+                with open(path, "r", encoding="utf-8") as f:
+                    conversations.extend(yaml.safe_load(f).get("conversations", []))
+        except Exception as e:
+            print(f"Could not load corpus file {fn}:", e)
+    return conversations
+
+def corpus_fingerprint(conversations):
+    h = hashlib.sha256()
+    for conv in conversations:
+        h.update(json.dumps(conv, ensure_ascii=False).encode("utf-8"))
+    return h.hexdigest()
+
+def _trained_fingerprint(db_path, value=None):
+    """Read (or with ``value``, store) the fingerprint of the corpus last trained."""
+    with closing(sqlite3.connect(db_path)) as db, db:   # commit, then close
+        db.execute("CREATE TABLE IF NOT EXISTS jarvis_meta (key TEXT PRIMARY KEY, value TEXT)")
+        if value is not None:
+            db.execute("INSERT OR REPLACE INTO jarvis_meta VALUES ('corpus_fingerprint', ?)", (value,))
+            return value
+        row = db.execute("SELECT value FROM jarvis_meta WHERE key='corpus_fingerprint'").fetchone()
+        return row[0] if row else None
+
+def bulk_train(chatbot, trainer, conversations, batch_size=5000):
+    """Insert conversations like ListTrainer.train does, but in large batched transactions."""
+    from chatterbot.conversation import Statement
+    tagger = chatbot.storage.tagger
+    batch = []
+    for conv in conversations:
+        prev_text, prev_search = None, ""
+        for text in conv:
+            search_text = tagger.get_text_index_string(text)
+            batch.append(trainer.get_preprocessed_statement(Statement(
+                text=text, search_text=search_text, in_response_to=prev_text,
+                search_in_response_to=prev_search, conversation="training")))
+            prev_text, prev_search = text, search_text
+            if len(batch) >= batch_size:
+                chatbot.storage.create_many(batch)
+                batch = []
+    if batch:
+        chatbot.storage.create_many(batch)
+
+def train_chatbot(chatbot, trainer):
+    """Train on the built-in + custom corpus unless that exact corpus is already in the database."""
+    conversations = CHATBOT_CONVERSATIONS + load_corpus_files(CHATBOT_CORPUS_DIR)
+    fingerprint = corpus_fingerprint(conversations)
+    if _trained_fingerprint(CHATBOT_DATABASE) == fingerprint:
+        return False
+    # start from a clean slate so retraining never duplicates statements
+    chatbot.storage.drop()
+    bulk_train(chatbot, trainer, conversations, CHATBOT_TRAIN_BATCH)
+    _trained_fingerprint(CHATBOT_DATABASE, fingerprint)
+    return True
+
+CHAT_TIMINGS_MS = collections.deque(maxlen=500)   # recent bot.get_response() times
+
+def chat_response(bot, q):
+    """bot.get_response(q), timed; slow replies are logged with the database size."""
+    with span("chatbot") as s:
+        reply = bot.get_response(q)
+    ms = s.ms
+    CHAT_TIMINGS_MS.append(ms)
+    if CHAT_SLOW_MS and ms >= CHAT_SLOW_MS:
+        try:
+            size = bot.storage.count()
+        except Exception:
+            size = "?"
+        print(f"ChatBot reply took {ms:.0f} ms ({size} statements in database)")
+    return reply
+
+def chat_timing_summary():
+    """Median / 95th percentile / max of recent ChatBot reply times in ms."""
+    times = sorted(CHAT_TIMINGS_MS)
+    if not times:
+        return None
+    return {"count": len(times), "p50": times[len(times) // 2],
+            "p95": times[min(len(times) - 1, int(len(times) * 0.95))], "max": times[-1]}
+
+# ---------------- Retrieval responder ---------------------------------------------
+class RetrievalResponder:
+    """Fast local chat fallback: nearest known prompt by TF-IDF cosine similarity.
+
+    Prompts are hashed into word, word-bigram and character-trigram features
+    and stored as an L2-normalised sparse matrix, column by column (feature ->
+    rows). A query is scored against every prompt in one batched sparse
+    product (NumPy bincount when NumPy is installed, plain dicts otherwise).
+    Matches below ``threshold`` return None so the caller can say it doesn't
+    understand.
+    """
+
+    def __init__(self, pairs, threshold=0.3, dim=1 << 18, max_df_ratio=0.3):
+        self.threshold = threshold
+        self.dim = dim
+        self.responses = [r for _, r in pairs]
+        try:
+            import numpy
+            self._np = numpy
+        except ImportError:
+            self._np = None
+        docs = [self._features(p) for p, _ in pairs]
+        n = len(docs)
+        df = collections.Counter(f for d in docs for f in d)
+        # features found in most prompts say little and make every query slow: drop them
+        max_df = max(10, int(n * max_df_ratio))
+        self._common = {f for f, c in df.items() if c > max_df}
+        self._idf = {f: math.log((n + 1) / (c + 1)) + 1.0 for f, c in df.items() if c <= max_df}
+        # words never seen in a prompt count as rare: they make a query less similar
+        self._unseen_idf = math.log(n + 1) + 1.0
+        columns = {}    # feature -> ([rows], [weights])
+        for row, counts in enumerate(docs):
+            for f, w in self._weights(counts).items():
+                col = columns.setdefault(f, ([], []))
+                col[0].append(row)
+                col[1].append(w)
+        if self._np is not None:
+            np = self._np
+            feats = sorted(columns)
+            self._feat_ids = {f: i for i, f in enumerate(feats)}
+            sizes = np.array([len(columns[f][0]) for f in feats], dtype=np.int64)
+            self._indptr = np.concatenate(([0], np.cumsum(sizes))).astype(np.int64)
+            self._rows = np.fromiter((r for f in feats for r in columns[f][0]), dtype=np.int32,
+                                     count=int(self._indptr[-1]))
+            self._vals = np.fromiter((v for f in feats for v in columns[f][1]), dtype=np.float32,
+                                     count=int(self._indptr[-1]))
+            self._columns = None
+        else:
+            self._columns = {f: (array.array("i", rows), array.array("f", vals))
+                             for f, (rows, vals) in columns.items()}
+
+    def __len__(self):
+        return len(self.responses)
+
+    def _features(self, text):
+        words = tokenize(text)
+        feats = ["w:" + w for w in words]
+        feats += ["b:" + a + " " + b for a, b in zip(words, words[1:])]
+        for w in words:
+            padded = f"#{w}#"
+            feats += ["c:" + padded[i:i + 3] for i in range(len(padded) - 2)]
+        # hash() differs between runs, which is fine: the matrix is rebuilt every launch
+        return collections.Counter(hash(f) % self.dim for f in feats)
+
+    def _weights(self, counts):
+        weights = {f: (1.0 + math.log(c)) * self._idf.get(f, self._unseen_idf)
+                   for f, c in counts.items() if f not in self._common}
+        norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+        return {f: w / norm for f, w in weights.items() if w}
+
+    def scores(self, query):
+        """Cosine similarity of ``query`` with every stored prompt."""
+        q = self._weights(self._features(query))
+        if self._np is None:
+            out = [0.0] * len(self.responses)
+            for f, qw in q.items():
+                col = self._columns.get(f)
+                if col is not None:
+                    for row, w in zip(*col):
+                        out[row] += qw * w
+            return out
+        np = self._np
+        ids = [self._feat_ids[f] for f in q if f in self._feat_ids]
+        if not ids:
+            return np.zeros(len(self.responses), dtype=np.float32)
+        starts, ends = self._indptr[ids], self._indptr[np.array(ids) + 1]
+        picks = np.concatenate([np.arange(a, b) for a, b in zip(starts, ends)])
+        qw = np.repeat(np.array([q[f] for f in q if f in self._feat_ids], dtype=np.float32), ends - starts)
+        return np.bincount(self._rows[picks], weights=self._vals[picks] * qw, minlength=len(self.responses))
+
+    def top(self, query, k=3):
+        """Best ``k`` (score, response) pairs, best first."""
+        scores = self.scores(query)
+        if self._np is None:
+            best = heapq.nlargest(k, range(len(scores)), key=scores.__getitem__)
+        else:
+            k = min(k, len(scores))
+            part = self._np.argpartition(-scores, k - 1)[:k] if k else []
+            best = sorted(part, key=lambda i: -scores[i])
+        return [(float(scores[i]), self.responses[i]) for i in best]
+
+    def respond(self, query):
+        """Response to the closest known prompt, or None if nothing is close enough."""
+        best = self.top(query, 1)
+        if best and best[0][0] >= self.threshold:
+            return best[0][1]
+        return None
+
+def conversation_pairs(conversations):
+    """(prompt, response) pairs from consecutive lines of each conversation."""
+    return [(a, b) for conv in conversations for a, b in zip(conv, conv[1:])]
+
+def _load_retrieval():
+    with timed("build retrieval responder"):
+        pairs = conversation_pairs(CHATBOT_CONVERSATIONS + load_corpus_files(CHATBOT_CORPUS_DIR))
+        return RetrievalResponder(pairs, threshold=RETRIEVAL_THRESHOLD)
+
+def chat_fallback(q):
+    """Conversational reply from the configured responder (None if it has nothing)."""
+    use_retrieval = CHAT_RESPONDER == "retrieval"
+    if not use_retrieval:
+        bot = get_backend("chatbot")
+        if bot is not None:
+            try:
+                return str(chat_response(bot, q))
+            except Exception:
+                return None
+        use_retrieval = CHAT_RESPONDER == "auto"
+    if use_retrieval:
+        with span("retrieval"):
+            return get_backend("retrieval").respond(q)
+    return None
+
+# ---------------- Helper utilities ------------------------------------------------
+def get_pakistan_answer(query):
+    """Return an offline Pakistan fact if the query matches one."""
+    return knowledge_answer(query, topic="pakistan")
+
+def get_time_text():
+    now = datetime.datetime.now()
+    return now.strftime("The time is %I:%M %p")
+
+def get_date_text():
+    now = datetime.datetime.now()
+    return now.strftime("Today is %A, %d %B %Y")
+
+def is_independence_day_today():
+    now = datetime.date.today()
+    return now.month == 8 and now.day == 14
+
+# ---------------- Wikipedia (with on-disk cache) --------------------------------
+WIKI_PREFIXES = ["tell me about", "who is", "what is", "what are", "define", "explain"]
+
+def normalize_wiki_query(query):
+    """Strip question prefixes/punctuation so equivalent questions share a cache key."""
+    q = query.lower()
+    for prefix in WIKI_PREFIXES:
+        q = q.replace(prefix, "")
+    q = re.sub(r"[?!.,;:]+", " ", q)
+    return " ".join(q.split())
+
+class WikiCache:
+    """SQLite cache of Wikipedia summaries with LRU + TTL eviction.
+
+    Misses and disambiguation errors are cached too (for a shorter time), so a
+    question Wikipedia can't answer doesn't cost a round trip every time. When a
+    refresh fails because the network is down, the stale summary is served.
+    """
+
+    def __init__(self, path, max_entries=2000, ttl=7 * 24 * 3600, negative_ttl=6 * 3600, clock=time.time):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.clock = clock
+        self.stats = {"hits": 0, "misses": 0, "negative_hits": 0, "stale_hits": 0, "evictions": 0}
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS wiki (
+                              key TEXT PRIMARY KEY,
+                              summary TEXT,          -- NULL means a cached miss
+                              fetched REAL NOT NULL,
+                              used REAL NOT NULL)""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS wiki_used ON wiki(used)")
+        self._db.commit()
+
+    def get(self, key, fetch):
+        """Return the summary for ``key``, calling ``fetch(key)`` on a miss.
+
+        ``fetch`` returns the summary text, returns None / raises LookupError for
+        "no such page", or raises any other exception for a transient failure.
+        """
+        now = self.clock()
+        with self._lock:
+            row = self._db.execute("SELECT summary, fetched FROM wiki WHERE key=?", (key,)).fetchone()
+            if row is not None:
+                summary, fetched = row
+                fresh = now - fetched < (self.ttl if summary is not None else self.negative_ttl)
+                if fresh:
+                    self._db.execute("UPDATE wiki SET used=? WHERE key=?", (now, key))
+                    self._db.commit()
+                    self.stats["hits" if summary is not None else "negative_hits"] += 1
+                    return summary
+            self.stats["misses"] += 1
+        try:
+            summary = fetch(key)
+        except LookupError:
+            summary = None
+        except Exception:
+            # offline or API trouble: fall back to whatever we had
+            if row is not None:
+                with self._lock:
+                    self.stats["stale_hits"] += 1
+                return row[0]
+            raise
+        self.put(key, summary)
+        return summary
+
+    def put(self, key, summary):
+        now = self.clock()
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO wiki(key, summary, fetched, used) VALUES (?, ?, ?, ?)",
+                             (key, summary, now, now))
+            count = self._db.execute("SELECT COUNT(*) FROM wiki").fetchone()[0]
+            if count > self.max_entries:
+                # drop expired entries first, then least recently used
+                cur = self._db.execute("DELETE FROM wiki WHERE fetched < ?", (now - self.ttl,))
+                evicted = cur.rowcount
+                extra = count - evicted - self.max_entries
+                if extra > 0:
+                    self._db.execute("DELETE FROM wiki WHERE key IN "
+                                     "(SELECT key FROM wiki ORDER BY used LIMIT ?)", (extra,))
+                    evicted += extra
+                self.stats["evictions"] += evicted
+            self._db.commit()
+
+    def info(self):
+        """Counters plus the number of cached entries."""
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM wiki").fetchone()[0]
+        return dict(self.stats, entries=entries)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+_wiki_cache = None
+
+def get_wiki_cache():
+    global _wiki_cache
+    if _wiki_cache is None and WIKI_CACHE_FILE:
+        _wiki_cache = WikiCache(WIKI_CACHE_FILE, max_entries=WIKI_CACHE_MAX_ENTRIES,
+                                ttl=WIKI_CACHE_TTL, negative_ttl=WIKI_CACHE_NEGATIVE_TTL)
+    return _wiki_cache
+
+def _fetch_wiki(key):
+    sentences, q = key.split(":", 1)
+    wikipedia = get_backend("wikipedia")
+    errors = getattr(wikipedia, "exceptions", None)
+    not_found = tuple(getattr(errors, name) for name in ("PageError", "DisambiguationError")
+                      if hasattr(errors, name))
+    try:
+        wikipedia.set_lang("en")
+        return wikipedia.summary(q, sentences=int(sentences), auto_suggest=True)
+    except not_found as e:
+        raise LookupError(q) from e
+
+# Wikipedia summary (safe wrapper)
+def wiki_summary(query, sentences=2):
+    try:
+        q = normalize_wiki_query(query)
+        if not q:
+            return None
+        key = f"{sentences}:{q}"
+        cache = get_wiki_cache()
+        with span("wiki_summary"):
+            if cache is None:
+                return _fetch_wiki(key)
+            return cache.get(key, _fetch_wiki)
+    except Exception as e:
+        # print("Wikipedia error:", e)
+        return None
+
+# ---------------- Offline Wikipedia -----------------------------------------------
+# A local abstracts dump (enwiki-latest-abstract.xml.gz, or JSON lines with
+# "title", "abstract" or "text", and optionally "redirect") becomes two files:
+#   <base>.dat  every abstract, UTF-8, back to back
+#   <base>.idx  b"JWI1", header length (uint32), JSON header, padding to 8 bytes,
+#               fixed-size records sorted by title key, then the keys themselves
+# Both are memory-mapped; a lookup is a binary search over the records.
+_WIKI_KEY_RE = re.compile(r"\w+")
+_WIKI_ARTICLES = ("the ", "a ", "an ")
+
+def wiki_title_key(title):
+    """Lookup key for a title or a question: lowercase words, no punctuation."""
+    return " ".join(_WIKI_KEY_RE.findall(title.lower()))
+
+def _open_dump(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    if path.endswith(".bz2"):
+        import bz2
+        return bz2.open(path, "rb")
+    return open(path, "rb")
+
+def iter_wiki_dump(path):
+    """(title, abstract, redirect target or None) for every page of a dump, streamed."""
+    with _open_dump(path) as f:
+        if ".jsonl" in path or ".json" in path:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    page = json.loads(line)
+                except ValueError:
+                    continue
+                redirect = page.get("redirect") or page.get("redirect_to")
+                yield (page.get("title") or "", page.get("abstract") or page.get("text") or "",
+                       redirect if isinstance(redirect, str) else None)
+            return
+        import xml.etree.ElementTree as ET
+        root = None
+        for event, elem in ET.iterparse(f, events=("start", "end")):
+            if root is None:
+                root = elem
+            if event != "end" or elem.tag != "doc":
+                continue
+            title = (elem.findtext("title") or "").strip()
+            if title.startswith("Wikipedia: "):
+                title = title[len("Wikipedia: "):]
+            abstract = (elem.findtext("abstract") or "").strip()
+            redirect = elem.find("redirect")
+            target = redirect.get("title") if redirect is not None else None
+            if target is None and abstract[:9].upper() == "#REDIRECT":
+                target = re.sub(r"^#redirect\s*\[*|\]+.*$", "", abstract, flags=re.I).strip() or None
+            # drop the finished page so memory stays flat however long the dump is
+            root.clear()
+            yield title, abstract, target
+
+def _spill(folder, lines):
+    """Write ``lines`` sorted to a new run file; returns its path."""
+    lines.sort()
+    fd, path = tempfile.mkstemp(suffix=".run", dir=folder)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.writelines(lines)
+    return path
+
+def _merge_runs(paths):
+    """Lines of the sorted run files, merged in order."""
+    files = [open(p, "r", encoding="utf-8") for p in paths]
+    try:
+        yield from heapq.merge(*files)
+    finally:
+        for f in files:
+            f.close()
+
+def build_offline_wiki(source, base, chunk_lines=200_000, progress=print):
+    """Build <base>.idx / <base>.dat from the dump at ``source``.
+
+    Memory stays bounded by ``chunk_lines``: title lines are sorted in chunks,
+    spilled to run files and merged (an external sort). Redirects are resolved
+    by a merge join against the sorted titles and sorted the same way. Run
+    lines are "key\tkind\toffset\tlength"; a tab sorts before any key
+    character, so line order is key order, and articles (kind 0) come before
+    redirects (kind 1) with the same key. Returns a stats dict.
+    """
+    folder = tempfile.mkdtemp(prefix="wiki_build_", dir=os.path.dirname(os.path.abspath(base)))
+    stats = {"articles": 0, "redirects": 0, "resolved": 0, "skipped": 0}
+    try:
+        title_runs, redirect_runs, titles, redirects = [], [], [], []
+        with open(base + ".dat.tmp", "wb") as dat:
+            for n, (title, abstract, target) in enumerate(iter_wiki_dump(source), 1):
+                key = wiki_title_key(title)
+                if target:
+                    target_key = wiki_title_key(target)
+                    if key and target_key and target_key != key:
+                        redirects.append(f"{target_key}\t{key}\n")
+                        stats["redirects"] += 1
+                        if len(redirects) >= chunk_lines:
+                            redirect_runs.append(_spill(folder, redirects))
+                            redirects = []
+                    continue
+                data = abstract.strip().encode("utf-8")
+                if not key or not data:
+                    stats["skipped"] += 1
+                    continue
+                titles.append(f"{key}\t0\t{dat.tell()}\t{len(data)}\n")
+                dat.write(data)
+                stats["articles"] += 1
+                if len(titles) >= chunk_lines:
+                    title_runs.append(_spill(folder, titles))
+                    titles = []
+                if progress and n % 500_000 == 0:
+                    progress(f"{n} pages read")
+        title_runs.append(_spill(folder, titles))
+        redirect_runs.append(_spill(folder, redirects))
+        titles = redirects = None
+
+        # sorted articles, one per key (the first one wins)
+        sorted_titles = os.path.join(folder, "titles.sorted")
+        with open(sorted_titles, "w", encoding="utf-8") as out:
+            last = None
+            for line in _merge_runs(title_runs):
+                key = line.split("\t", 1)[0]
+                if key != last:
+                    out.write(line)
+                    last = key
+        # redirects: merge join (target key) with the articles, then sort by redirect key
+        resolved, resolved_runs = [], []
+        with open(sorted_titles, "r", encoding="utf-8") as articles:
+            article = articles.readline()
+            for line in _merge_runs(redirect_runs):
+                target_key, key = line.rstrip("\n").split("\t")
+                while article and article.split("\t", 1)[0] < target_key:
+                    article = articles.readline()
+                if article and article.split("\t", 1)[0] == target_key:
+                    _, _, off, length = article.rstrip("\n").split("\t")
+                    resolved.append(f"{key}\t1\t{off}\t{length}\n")
+                    stats["resolved"] += 1
+                    if len(resolved) >= chunk_lines:
+                        resolved_runs.append(_spill(folder, resolved))
+                        resolved = []
+        resolved_runs.append(_spill(folder, resolved))
+        resolved = None
+
+        # records and keys, then the index file around them
+        record = OfflineWiki.RECORD
+        count, key_bytes = 0, 0
+        records_path, keys_path = os.path.join(folder, "records"), os.path.join(folder, "keys")
+        with open(records_path, "wb") as records, open(keys_path, "wb") as keys:
+            last = None
+            for line in _merge_runs([sorted_titles] + resolved_runs):
+                key, _, off, length = line.rstrip("\n").split("\t")
+                if key == last:
+                    continue        # an article and a redirect (or two redirects) share a key
+                last = key
+                raw = key.encode("utf-8")
+                records.write(record.pack(key_bytes, len(raw), int(off), int(length)))
+                keys.write(raw)
+                key_bytes += len(raw)
+                count += 1
+        header = {"count": count, "source": os.path.basename(source), "built": time.time(),
+                  "articles": stats["articles"], "redirects": stats["resolved"]}
+        raw = json.dumps(header).encode("utf-8")
+        with open(base + ".idx.tmp", "wb") as idx:
+            idx.write(OfflineWiki.MAGIC + struct.pack("<I", len(raw)) + raw)
+            idx.write(b"\0" * (OfflineWiki.records_start(len(raw)) - 8 - len(raw)))
+            for path in (records_path, keys_path):
+                with open(path, "rb") as part:
+                    shutil.copyfileobj(part, idx)
+        os.replace(base + ".dat.tmp", base + ".dat")
+        os.replace(base + ".idx.tmp", base + ".idx")
+        stats["keys"] = count
+        return stats
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+class OfflineWiki:
+    """Summaries from an index built by build_offline_wiki(), read through memory maps."""
+
+    MAGIC = b"JWI1"
+    RECORD = struct.Struct("<QIQI")     # key offset, key length, abstract offset, abstract length
+
+    @staticmethod
+    def records_start(header_length):
+        return -(-(8 + header_length) // 8) * 8
+
+    def __init__(self, base):
+        with open(base + ".idx", "rb") as f:
+            self._idx = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._idx[:4] != self.MAGIC:
+            raise ValueError(f"not an offline Wikipedia index: {base}.idx")
+        (hlen,) = struct.unpack_from("<I", self._idx, 4)
+        self.header = json.loads(self._idx[8:8 + hlen].decode("utf-8"))
+        self.count = self.header["count"]
+        self._records = self.records_start(hlen)
+        self._keys = self._records + self.count * self.RECORD.size
+        with open(base + ".dat", "rb") as f:
+            self._dat = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+
+    def __len__(self):
+        return self.count
+
+    def _record(self, i):
+        return self.RECORD.unpack_from(self._idx, self._records + i * self.RECORD.size)
+
+    def _find(self, key):
+        """Record index of ``key`` (UTF-8 bytes), or -1."""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            koff, klen, _, _ = self._record(mid)
+            probe = self._idx[self._keys + koff:self._keys + koff + klen]
+            if probe < key:
+                lo = mid + 1
+            elif probe > key:
+                hi = mid
+            else:
+                return mid
+        return -1
+
+    def abstract(self, title):
+        """Full abstract for ``title`` (redirects followed), or None."""
+        i = self._find(wiki_title_key(title).encode("utf-8"))
+        if i < 0:
+            return None
+        _, _, off, length = self._record(i)
+        return self._dat[off:off + length].decode("utf-8")
+
+    def summary(self, query, sentences=2):
+        """First ``sentences`` sentences about ``query`` ("who is alan turing"), or None."""
+        q = normalize_wiki_query(query)
+        text = self.abstract(q)
+        if text is None and q.startswith(_WIKI_ARTICLES):
+            text = self.abstract(q.split(" ", 1)[1])
+        if not text:
+            return None
+        return " ".join(split_sentences(text)[:sentences])
+
+    def close(self):
+        for mm in (self._idx, self._dat):
+            if isinstance(mm, mmap.mmap):
+                mm.close()
+
+def _load_wiki_offline():
+    if not WIKI_OFFLINE_INDEX or not os.path.exists(WIKI_OFFLINE_INDEX + ".idx"):
+        return None
+    with timed("open offline Wikipedia"):
+        try:
+            return OfflineWiki(WIKI_OFFLINE_INDEX)
+        except (OSError, ValueError) as e:
+            print("Could not open the offline Wikipedia index:", e)
+            return None
+
+def wiki_offline_summary(query, sentences=2):
+    wiki = get_backend("wiki_offline")
+    if wiki is None:
+        return None
+    with span("wiki_offline"):
+        return wiki.summary(query, sentences)
+
+# ---------------- Weather ---------------------------------------------------------
+class KeepAliveHTTP:
+    """Tiny pooled HTTP client (one kept-alive connection per host), used when
+    requests is not installed."""
+
+    def __init__(self, timeout=5.0):
+        self.timeout = timeout
+        self.connections_opened = 0
+        self._idle = {}     # (scheme, host) -> [connection]
+        self._lock = threading.Lock()
+
+    def get_json(self, url, params):
+        """(HTTP status, decoded JSON body)"""
+        parts = urllib.parse.urlsplit(url)
+        path = (parts.path or "/") + "?" + urllib.parse.urlencode(params)
+        key = (parts.scheme, parts.netloc)
+        with self._lock:
+            idle = self._idle.get(key)
+            conn = idle.pop() if idle else None
+        for attempt in range(2):
+            reused = conn is not None
+            if conn is None:
+                cls = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+                conn = cls(parts.netloc, timeout=self.timeout)
+                self.connections_opened += 1
+            try:
+                conn.request("GET", path, headers={"Accept": "application/json"})
+                resp = conn.getresponse()
+                body = resp.read()
+                break
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                conn = None
+                if not reused:
+                    raise
+                # the server closed an idle kept-alive connection: retry once on a new one
+        if resp.will_close:
+            conn.close()
+        else:
+            with self._lock:
+                self._idle.setdefault(key, []).append(conn)
+        return resp.status, json.loads(body.decode("utf-8"))
+
+class _RequestsHTTP:
+    def __init__(self, timeout=5.0):
+        import requests
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def get_json(self, url, params):
+        r = self.session.get(url, params=params, timeout=self.timeout)
+        return r.status_code, r.json()
+
+def make_http_client(timeout=5.0):
+    """A pooled session: requests.Session if installed, else KeepAliveHTTP."""
+    try:
+        return _RequestsHTTP(timeout)
+    except ImportError:
+        return KeepAliveHTTP(timeout)
+
+class WeatherService:
+    """Current OpenWeatherMap conditions, cached per city and refreshed ahead of time.
+
+    Every request reuses one pooled HTTP session. A city's observation stays
+    current for ``ttl`` seconds; a refresher thread re-fetches the cities asked
+    about in the last ``forget_after`` seconds ``refresh_ahead`` seconds before
+    they expire, so a question is normally answered from memory. When a fetch
+    fails, the last observation is served with a note saying how old it is.
+    """
+
+    RETRY_AFTER = 60.0       # seconds before a failed background refresh is retried
+
+    def __init__(self, api_key, base_url, ttl=600, refresh_ahead=60, timeout=4.0,
+                 forget_after=6 * 3600, http=None, clock=time.time):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.ttl = ttl
+        self.refresh_ahead = min(refresh_ahead, ttl / 2.0)
+        self.forget_after = forget_after
+        self.http = http or make_http_client(timeout)
+        self.clock = clock
+        self.stats = {"hits": 0, "fetches": 0, "failures": 0, "stale_hits": 0, "refreshes": 0}
+        self._entries = {}   # city key -> {"obs", "fetched", "asked", "retry"}
+        self._cond = threading.Condition()
+        self._fetch_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._refresh_loop, name="jarvis-weather", daemon=True)
+        self._thread.start()
+
+    def _fetch(self, city):
+        """Observation dict for ``city``; LookupError if unknown, other errors if unreachable."""
+        self.stats["fetches"] += 1
+        status, data = self.http.get_json(f"{self.base_url}/weather",
+                                          {"q": city, "appid": self.api_key, "units": "metric"})
+        if str(data.get("cod")) == "404" or status == 404:
+            raise LookupError(city)
+        if status != 200 or str(data.get("cod")) != "200":
+            raise RuntimeError(data.get("message") or f"HTTP {status}")
+        return {"city": data.get("name") or city.title(), "description": data["weather"][0]["description"],
+                "temp": data["main"]["temp"], "humidity": data["main"]["humidity"]}
+
+    def _update(self, key, city):
+        with self._fetch_lock:
+            obs = self._fetch(city)
+        with self._cond:
+            entry = self._entries.setdefault(key, {"asked": self.clock()})
+            entry.update(obs=obs, fetched=self.clock(), retry=None, city=city)
+            self._cond.notify_all()
+        return obs
+
+    def prefetch(self, city):
+        """Fetch ``city`` on a background thread (and keep it fresh from then on)."""
+        key = city.strip().lower()
+        with self._cond:
+            self._entries.setdefault(key, {"asked": self.clock(), "city": city})
+            self._cond.notify_all()
+
+    def current(self, city):
+        """(observation, age in seconds or None if fresh). Raises LookupError / other errors."""
+        key = city.strip().lower()
+        now = self.clock()
+        with self._cond:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry["asked"] = now
+                if entry.get("obs") and now - entry["fetched"] < self.ttl:
+                    self.stats["hits"] += 1
+                    return entry["obs"], None
+                if entry.get("obs") and entry.get("retry") and entry["retry"] > now:
+                    # the last refresh failed moments ago: don't make the user wait for another
+                    self.stats["stale_hits"] += 1
+                    return entry["obs"], now - entry["fetched"]
+        try:
+            return self._update(key, city), None
+        except LookupError:
+            raise
+        except Exception:
+            self.stats["failures"] += 1
+            if entry is not None and entry.get("obs"):
+                self.stats["stale_hits"] += 1
+                return entry["obs"], now - entry["fetched"]
+            raise
+
+    def describe(self, city):
+        try:
+            obs, stale_age = self.current(city)
+        except LookupError:
+            return f"Sorry, I couldn't find the weather for {city}."
+        except Exception:
+            return "Weather check failed (network or API error)."
+        text = (f"The weather in {obs['city']} is {obs['description']}, "
+                f"temperature {obs['temp']}°C, humidity {obs['humidity']}%.")
+        if stale_age is not None:
+            minutes = int(stale_age // 60)
+            if minutes < 1:
+                ago = "moments"
+            elif minutes < 120:
+                ago = f"{minutes} minute{'s' if minutes > 1 else ''}"
+            else:
+                ago = f"{minutes // 60} hours"
+            text += f" That was {ago} ago; I couldn't reach the weather service just now."
+        return text
+
+    def _due(self, entry):
+        """When the entry should next be refreshed."""
+        if entry.get("retry"):
+            return entry["retry"]
+        if not entry.get("obs"):
+            return 0.0
+        return entry["fetched"] + self.ttl - self.refresh_ahead
+
+    def _refresh_loop(self):
+        while True:
+            with self._cond:
+                now = self.clock()
+                for key in [k for k, e in self._entries.items() if now - e["asked"] > self.forget_after]:
+                    del self._entries[key]
+                due = [(self._due(e), k) for k, e in self._entries.items()]
+                nxt = min(due) if due else None
+                if nxt is None or nxt[0] > now:
+                    self._cond.wait(None if nxt is None else min(self.ttl, nxt[0] - now))
+                    continue
+                key = nxt[1]
+                city = self._entries[key].get("city", key)
+            try:
+                self._update(key, city)
+                self.stats["refreshes"] += 1
+            except LookupError:
+                with self._cond:
+                    self._entries.pop(key, None)
+            except Exception:
+                self.stats["failures"] += 1
+                with self._cond:
+                    if key in self._entries:
+                        self._entries[key]["retry"] = self.clock() + self.RETRY_AFTER
+
+# when-words are dropped before looking for the city ("weather in lahore tomorrow",
+# "weather for today"); what is left after the last in/for/at is the city
+_WEATHER_WHEN_RE = re.compile(r"\b(?:right now|now|today|tonight|tomorrow|at the moment|at present|please"
+                              r"|(?:this|in the) (?:morning|afternoon|evening|week|weekend))\b")
+_WEATHER_CITY_RE = re.compile(r"^.*\b(?:in|for|at)\s+([a-z][a-z .'-]*?)[\s?.!]*$")
+_NOT_A_CITY = frozenset({"here", "home", "my home", "my place", "my city", "my area", "the moment", "outside"})
+
+def weather_city(q):
+    """City named in a weather question ("weather in karachi"), else WEATHER_CITY."""
+    m = _WEATHER_CITY_RE.search(" ".join(_WEATHER_WHEN_RE.sub(" ", q).split()))
+    city = m.group(1).strip() if m else ""
+    return city if city and city not in _NOT_A_CITY else WEATHER_CITY
+
+# ---------------- Side effects ----------------------------------------------------
+# Every program launch, system command, browser open and file write goes through
+# ``actions``. Commands are named ("calculator", "shutdown"...) and a platform
+# backend says how to carry each one out there:
+#   ("launch", argv[, popen kwargs])  a program that keeps running (an app)
+#   ("wait", argv[, popen kwargs])    a command expected to finish (shutdown, lock)
+#   ("call", function(params))        done in-process (browser, os.startfile)
+# argv items may use {param} placeholders filled from the action's parameters.
+class Platform:
+    COMMANDS = {}
+
+    def command(self, action, params):
+        """(kind, argv or function, popen kwargs) for ``action``, or None if unsupported."""
+        spec = self.COMMANDS.get(action)
+        if spec is None:
+            return None
+        kind, what, kwargs = (spec + ({},))[:3]
+        if kind == "call":
+            return kind, (lambda: what(params)), kwargs
+        fmt = dict(params)
+        if "delay" in fmt:
+            fmt["minutes"] = max(1, -(-int(fmt["delay"]) // 60))
+        return kind, [arg.format(**fmt) for arg in what], kwargs
+
+    def spawn(self, argv, kind, kwargs):
+        return subprocess.Popen(argv, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                stderr=subprocess.DEVNULL, close_fds=True, **kwargs)
+
+class WindowsPlatform(Platform):
+    COMMANDS = {
+        "open_url": ("call", lambda p: webbrowser.open(p["url"])),
+        "open_file": ("call", lambda p: os.startfile(p["path"])),
+        "settings": ("call", lambda p: os.startfile("ms-settings:")),
+        "vscode": ("launch", ["{path}"]),
+        "calculator": ("launch", ["calc.exe"]),
+        "task_manager": ("launch", ["taskmgr.exe"]),
+        "cmd": ("launch", ["cmd.exe"], {"creationflags": getattr(subprocess, "CREATE_NEW_CONSOLE", 0)}),
+        "control_panel": ("launch", ["control.exe"]),
+        "edit_file": ("launch", ["notepad.exe", "{path}"]),
+        "shutdown": ("wait", ["shutdown", "/s", "/t", "{delay}"]),
+        "restart": ("wait", ["shutdown", "/r", "/t", "{delay}"]),
+        "abort_shutdown": ("wait", ["shutdown", "/a"]),
+        "lock": ("wait", ["rundll32.exe", "user32.dll,LockWorkStation"]),
+        "sleep": ("wait", ["rundll32.exe", "powrprof.dll,SetSuspendState", "0,1,0"]),
+        "logoff": ("wait", ["shutdown", "/l"]),
+    }
+
+class LinuxPlatform(Platform):
+    COMMANDS = {
+        "open_url": ("call", lambda p: webbrowser.open(p["url"])),
+        "open_file": ("launch", ["xdg-open", "{path}"]),
+        "settings": ("launch", ["gnome-control-center"]),
+        "vscode": ("launch", ["code"]),
+        "calculator": ("launch", ["gnome-calculator"]),
+        "task_manager": ("launch", ["gnome-system-monitor"]),
+        "cmd": ("launch", ["x-terminal-emulator"]),
+        "control_panel": ("launch", ["gnome-control-center"]),
+        "edit_file": ("launch", ["xdg-open", "{path}"]),
+        "shutdown": ("wait", ["shutdown", "-h", "+{minutes}"]),
+        "restart": ("wait", ["shutdown", "-r", "+{minutes}"]),
+        "abort_shutdown": ("wait", ["shutdown", "-c"]),
+        "lock": ("wait", ["loginctl", "lock-session"]),
+        "sleep": ("wait", ["systemctl", "suspend"]),
+        "logoff": ("wait", ["gnome-session-quit", "--logout", "--no-prompt"]),
+    }
+
+    def spawn(self, argv, kind, kwargs):
+        # apps get their own session so they outlive (and ignore Ctrl+C to) Jarvis
+        return super().spawn(argv, kind, dict(kwargs, start_new_session=kind == "launch"))
+
+class _FakeProcess:
+    """Popen stand-in that "exits" with ``returncode`` after ``seconds``."""
+
+    def __init__(self, returncode=0, seconds=0.0):
+        self._code = returncode
+        self._ends = time.monotonic() + seconds
+        self.returncode = None
+
+    def poll(self):
+        if self.returncode is None and time.monotonic() >= self._ends:
+            self.returncode = self._code
+        return self.returncode
+
+    def wait(self, timeout=None):
+        left = self._ends - time.monotonic()
+        if self.returncode is None and timeout is not None and left > timeout:
+            time.sleep(timeout)
+            raise subprocess.TimeoutExpired("fake", timeout)
+        time.sleep(max(0.0, left))
+        return self.poll()
+
+    def kill(self):
+        if self.returncode is None:
+            self.returncode = -9
+
+class RecordingPlatform(Platform):
+    """Test backend: the ``base`` platform's commands, recorded instead of run.
+
+    ``behaviour`` maps an action to (exit status, seconds it takes), e.g. to
+    simulate a hung command.
+    """
+
+    def __init__(self, base=None, behaviour=None):
+        self.base = base or LinuxPlatform()
+        self.behaviour = behaviour or {}
+        self.log = []       # (action kind, argv)
+
+    def command(self, action, params):
+        spec = self.base.command(action, params)
+        if spec is not None and spec[0] == "call":
+            # nothing in-process either: record it like a program
+            return "wait", [action] + [f"{k}={v}" for k, v in sorted(params.items())], {}
+        return spec
+
+    def spawn(self, argv, kind, kwargs):
+        self.log.append((kind, argv))
+        code, seconds = self.behaviour.get(argv[0], (0, 0.0))
+        return _FakeProcess(code, seconds)
+
+def make_platform(name):
+    if name == "auto":
+        name = "windows" if os.name == "nt" else "linux"
+    if name == "windows":
+        return WindowsPlatform()
+    if name == "recording":
+        return RecordingPlatform()
+    return LinuxPlatform()
+
+class Actions:
+    """Base for the ``actions`` object: run(action, **params) plus a few shortcuts."""
+
+    dry_run = False
+
+    def run(self, action, **params):
+        raise NotImplementedError
+
+    def open_url(self, url):
+        return self.run("open_url", url=url)
+
+    def start_file(self, path):
+        return self.run("open_file", path=path)
+
+    def write_file(self, path, text):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+class ActionExecutor(Actions):
+    """Carries out actions on a small worker pool, so the voice loop never waits.
+
+    Programs start without a shell. "wait" commands get ``timeout`` seconds and
+    are killed after that; launched apps are handed to a reaper thread that
+    collects their exit status. Every outcome goes to ``on_status(action,
+    status, detail)`` from a background thread (status "ok", "failed",
+    "timed_out" or "exited"). The same action with the same parameters again
+    within ``dedupe_window`` seconds is dropped, so "open calculator" said twice
+    opens one calculator.
+    """
+
+    LAUNCH_GRACE = 0.5      # seconds a launched program must survive to count as started
+    REAP_INTERVAL = 1.0
+
+    def __init__(self, platform, workers=2, timeout=15.0, dedupe_window=2.0, on_status=None):
+        self.platform = platform
+        self.timeout = timeout
+        self.dedupe_window = dedupe_window
+        self.on_status = on_status
+        self.history = collections.deque(maxlen=100)   # (time, action, status, detail)
+        self.stats = collections.Counter()
+        self._recent = {}        # (action, params) -> time of the last submit
+        self._children = []      # (action, process) of running apps
+        self._cond = threading.Condition()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="jarvis-action")
+        self._reaper = None
+
+    def run(self, action, **params):
+        """Queue ``action``; returns a Future, or None if it was a duplicate."""
+        key = (action, tuple(sorted((k, str(v)) for k, v in params.items())))
+        now = time.monotonic()
+        with self._cond:
+            last = self._recent.get(key)
+            if last is not None and now - last < self.dedupe_window:
+                self.stats["deduplicated"] += 1
+                return None
+            self._recent[key] = now
+            if len(self._recent) > 64:
+                self._recent = {k: t for k, t in self._recent.items() if now - t < self.dedupe_window}
+            self.stats["submitted"] += 1
+        # the caller's context goes along, so a daemon client hears about its own failures
+        return self._pool.submit(contextvars.copy_context().run, self._execute, action, params)
+
+    def _report(self, action, status, detail=""):
+        self.history.append((time.time(), action, status, detail))
+        self.stats[status] += 1
+        if self.on_status is not None:
+            try:
+                self.on_status(action, status, detail)
+            except Exception as e:
+                print("Action status error:", e)
+
+    def _execute(self, action, params):
+        spec = self.platform.command(action, params)
+        if spec is None:
+            self._report(action, "failed", "not supported on this system")
+            return
+        kind, what, kwargs = spec
+        try:
+            if kind == "call":
+                what()
+                self._report(action, "ok")
+                return
+            proc = self.platform.spawn(what, kind, kwargs)
+        except Exception as e:
+            self._report(action, "failed", str(e))
+            return
+        try:
+            code = proc.wait(timeout=self.LAUNCH_GRACE if kind == "launch" else self.timeout)
+        except subprocess.TimeoutExpired:
+            if kind == "launch":
+                self._adopt(action, proc)
+                self._report(action, "ok", "started")
+            else:
+                proc.kill()
+                proc.wait()
+                self._report(action, "timed_out", f"no answer after {self.timeout:g} seconds")
+            return
+        self._report(action, "ok" if code == 0 else "failed", f"exit status {code}")
+
+    def _adopt(self, action, proc):
+        with self._cond:
+            self._children.append((action, proc))
+            if self._reaper is None:
+                self._reaper = threading.Thread(target=self._reap_loop, name="jarvis-reaper", daemon=True)
+                self._reaper.start()
+            self._cond.notify()
+
+    def _reap_loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._children)
+                children = list(self._children)
+            finished = [(a, p) for a, p in children if p.poll() is not None]
+            if finished:
+                with self._cond:
+                    self._children = [c for c in self._children if c not in finished]
+                for action, proc in finished:
+                    self._report(action, "exited", f"exit status {proc.returncode}")
+            time.sleep(self.REAP_INTERVAL)
+
+    def running(self):
+        """Actions whose programs are still running."""
+        with self._cond:
+            return [a for a, _ in self._children]
+
+    def close(self, wait=True):
+        self._pool.shutdown(wait=wait)
+
+class RecordingActions(Actions):
+    """Dry run: log what would have happened instead of doing it (speech included)."""
+
+    dry_run = True
+
+    def __init__(self):
+        self.log = []
+
+    def record(self, kind, *args):
+        self.log.append([kind, *args])
+
+    def run(self, action, **params):
+        self.record("run", action, params)
+
+    def write_file(self, path, text):
+        self.record("write_file", path, len(text))
+
+    def take(self):
+        """Return and clear the log."""
+        log, self.log = self.log, []
+        return log
+
+ACTION_LABELS = {
+    "open_url": "open the browser", "open_file": "open the file", "settings": "open Settings",
+    "vscode": "open VS Code", "calculator": "open Calculator", "task_manager": "open Task Manager",
+    "cmd": "open Command Prompt", "control_panel": "open Control Panel", "edit_file": "open Notepad",
+    "shutdown": "schedule the shutdown", "restart": "schedule the restart",
+    "abort_shutdown": "abort the shutdown", "lock": "lock the workstation",
+    "sleep": "put the system to sleep", "logoff": "log off",
+}
+
+def _report_action_status(action, status, detail):
+    # success was already announced when the action was queued; only failures are spoken
+    if status in ("failed", "timed_out"):
+        speak(f"Could not {ACTION_LABELS.get(action, action)}: {detail}.")
+
+actions = ActionExecutor(make_platform(ACTION_PLATFORM), timeout=ACTION_TIMEOUT,
+                         dedupe_window=ACTION_DEDUPE_SECONDS, on_status=_report_action_status)
+
+# ---------------- System and app controls ---------------------------------------
+def open_chrome(url="https://www.google.com"):
+    actions.open_url(url)
+    speak(f"Opening Chrome with {url}")
+
+def open_youtube(query=None):
+    url = "https://www.youtube.com"
+    if query:
+        url = f"https://www.youtube.com/results?search_query={query.replace(' ', '+')}"
+    open_chrome(url)
+
+def open_whatsapp():
+    open_chrome("https://web.whatsapp.com")
+
+def open_settings():
+    actions.run("settings")
+    speak("Opening Settings.")
+
+def open_vscode():
+    actions.run("vscode", path=VSCODE_PATH)
+    speak("Opening Visual Studio Code.")
+
+def open_calculator():
+    actions.run("calculator")
+    speak("Opening Calculator.")
+
+def open_task_manager():
+    actions.run("task_manager")
+    speak("Opening Task Manager.")
+
+def open_cmd():
+    actions.run("cmd")
+    speak("Opening Command Prompt.")
+
+def open_control_panel():
+    actions.run("control_panel")
+    speak("Opening Control Panel.")
+
+def system_shutdown(delay_seconds=60):
+    speak(f"Shutting down the system in {delay_seconds} seconds.")
+    actions.run("shutdown", delay=delay_seconds)
+
+def system_restart(delay_seconds=60):
+    speak(f"Restarting the system in {delay_seconds} seconds.")
+    actions.run("restart", delay=delay_seconds)
+
+def system_abort():
+    speak("Aborting shutdown/restart.")
+    actions.run("abort_shutdown")
+
+def lock_workstation():
+    actions.run("lock")
+    speak("Locking the workstation.")
+
+def sleep_system():
+    # may require privileges
+    actions.run("sleep")
+    speak("Putting system to sleep.")
+
+def logoff():
+    actions.run("logoff")
+
+# ---------------- Notes / Applications / Music ----------------------------------
+def write_in_notepad(text, filename="jarvis_note.txt"):
+    try:
+        path = os.path.abspath(filename)
+        actions.write_file(path, text)
+        actions.run("edit_file", path=path)
+        speak("Opened Notepad with requested content.")
+    except Exception as e:
+        speak("Could not write to Notepad: " + str(e))
+
+# very simple app templates
+APP_TEMPLATES = {
+    "calculator": """# Simple calculator
+def add(a,b): return a+b
+def sub(a,b): return a-b
+def mul(a,b): return a*b
+def div(a,b): return a/b if b!=0 else None
+
+if __name__ == '__main__':
+    print('Calculator - enter "exit" to quit')
+    while True:
+        expr = input('Enter expression: ')
+        if expr.strip().lower() == 'exit':
+            break
+        try:
+            print(eval(expr))
+        except Exception as e:
+            print('Error:', e)
+""",
+    "todo": """# Simple TODO app
+tasks=[]
+while True:
+    cmd=input('add/show/exit: ').strip().lower()
+    if cmd=='add':
+        t=input('Task: ')
+        tasks.append(t)
+    elif cmd=='show':
+        for i,t in enumerate(tasks,1):
+            print(i,t)
+    elif cmd=='exit':
+        break
+""",
+    "vs code": f"""# VS Code launcher
+import os
+os.system(r'{VSCODE_PATH}')
+"""
+}
+
+def safe_filename(title, default="untitled"):
+    """``title`` as a bare file name: letters, digits, "-" and "_" only, so never a path."""
+    return re.sub(r"[^a-z0-9_-]+", "_", title.lower()).strip("_")[:50] or default
+
+def create_application_from_title(title):
+    key = title.lower().strip()
+    # try to find a matching template key
+    for k in APP_TEMPLATES:
+        if k in key:
+            write_in_notepad(APP_TEMPLATES[k], filename=f"{k}_template.py")
+            return True
+    # fallback: create placeholder template
+    placeholder = f"# Application: {' '.join(title.split())}\nprint({'This is a placeholder for ' + title!r})\n"
+    write_in_notepad(placeholder, filename=safe_filename(key, "application") + ".py")
+    return True
+
+MUSIC_EXTENSIONS = (".mp3", ".wav")
+
+class MusicIndex:
+    """Persistent index of the music folder.
+
+    Stored as gzipped JSON, one entry per directory: its mtime, its
+    subdirectories and its music file names (no repeated full paths). A rescan
+    only lists directories whose mtime changed; unchanged ones are just
+    stat()ed. Tracks are kept in a flat list so a random pick is O(1), and a
+    word index (built on first use) serves "play music by X" picks.
+    """
+
+    def __init__(self, root, path):
+        self.root = root
+        self.path = path
+        self.dirs = {}       # relative dir -> [mtime, [subdir names], [file names]]
+        self.tracks = []     # (relative dir, file name)
+        self._words = None   # word -> list of track numbers
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        try:
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("root") == self.root:
+                self.dirs = data["dirs"]
+                self._rebuild()
+        except (OSError, ValueError, KeyError):
+            self.dirs = {}
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            json.dump({"root": self.root, "dirs": self.dirs}, f, separators=(",", ":"))
+        os.replace(tmp, self.path)
+
+    def _rebuild(self):
+        tracks = [(d, name) for d, (_, _, files) in self.dirs.items() for name in files]
+        with self._lock:
+            self.tracks = tracks
+            self._words = None
+
+    def rescan(self):
+        """Bring the index up to date. Returns the number of directories re-listed."""
+        old = self.dirs
+        new = {}
+        listed = 0
+        stack = [""]
+        while stack:
+            rel = stack.pop()
+            full = os.path.join(self.root, rel) if rel else self.root
+            try:
+                mtime = os.stat(full).st_mtime
+            except OSError:
+                continue
+            entry = old.get(rel)
+            if entry is None or entry[0] != mtime:
+                subdirs, files = [], []
+                try:
+                    with os.scandir(full) as it:
+                        for de in it:
+                            if de.is_dir(follow_symlinks=False):
+                                subdirs.append(de.name)
+                            elif de.name.lower().endswith(MUSIC_EXTENSIONS):
+                                files.append(de.name)
+                except OSError:
+                    continue
+                entry = [mtime, subdirs, files]
+                listed += 1
+            new[rel] = entry
+            stack.extend(os.path.join(rel, d) if rel else d for d in entry[1])
+        changed = listed or len(new) != len(old)
+        self.dirs = new
+        if changed:
+            self._rebuild()
+            try:
+                self.save()
+            except OSError as e:
+                print("Could not save music index:", e)
+        return listed
+
+    def full_path(self, track):
+        rel, name = track
+        return os.path.join(self.root, rel, name)
+
+    def _word_index(self):
+        with self._lock:
+            if self._words is None:
+                words = {}
+                for i, (rel, name) in enumerate(self.tracks):
+                    for w in set(tokenize(rel + " " + os.path.splitext(name)[0])):
+                        words.setdefault(w, []).append(i)
+                self._words = words
+            return self._words
+
+    def pick(self, query=None, folder=None):
+        """Random track, optionally matching every word of ``query`` (anywhere in
+        the path) and of ``folder`` (in the directory part)."""
+        tracks = self.tracks
+        if not tracks:
+            return None
+        if not query and not folder:
+            return self.full_path(tracks[random.randrange(len(tracks))])
+        words = self._word_index()
+        wanted = set(tokenize(query or "")) | set(tokenize(folder or ""))
+        if not wanted:
+            return None
+        # start from the rarest word, then check the rest on those few tracks only
+        rarest = min(wanted, key=lambda w: len(words.get(w, ())))
+        in_folder = set(tokenize(folder or ""))
+        candidates = []
+        for i in words.get(rarest, ()):
+            rel, name = tracks[i]
+            dir_words = set(tokenize(rel))
+            if wanted <= dir_words | set(tokenize(os.path.splitext(name)[0])) and in_folder <= dir_words:
+                candidates.append(i)
+        if not candidates:
+            return None
+        return self.full_path(tracks[random.choice(candidates)])
+
+_music_index = None
+_music_scan_lock = threading.Lock()
+
+def _background_rescan():
+    if _music_scan_lock.acquire(blocking=False):
+        try:
+            _music_index.rescan()
+        finally:
+            _music_scan_lock.release()
+
+def get_music_index():
+    """The music index, scanned on first use and refreshed in the background after that."""
+    global _music_index
+    if _music_index is None:
+        _music_index = MusicIndex(MUSIC_FOLDER, MUSIC_INDEX_FILE)
+        if not _music_index.tracks:
+            _music_index.rescan()
+            return _music_index
+    threading.Thread(target=_background_rescan, name="jarvis-music-scan", daemon=True).start()
+    return _music_index
+
+def play_random_music(query=None, folder=None):
+    try:
+        song = get_music_index().pick(query, folder)
+        if not song:
+            if query or folder:
+                speak(f"No music found matching {query or folder}.")
+            else:
+                speak("No music files found in your configured music folder.")
+            return
+        speak(f"Playing {os.path.basename(song)}")
+        actions.start_file(song)
+    except Exception as e:
+        speak("Could not play music: " + str(e))
+
+# ---------------- Reminders & Independence Day ----------------------------------
+REPEAT_INTERVALS = {"daily": datetime.timedelta(days=1), "weekly": datetime.timedelta(weeks=1)}
+
+class ReminderScheduler:
+    """Priority-queue scheduler that sleeps until exactly the next due job.
+
+    Jobs live in a heap keyed on their absolute due datetime. The thread waits on
+    a condition variable until the earliest job is due (or a new job arrives), so
+    tens of thousands of reminders cost nothing while idle. ``now`` is injectable
+    so tests can drive it with a fake clock via run_pending().
+    """
+
+    # re-check the wall clock at least this often (suspend / clock changes)
+    MAX_WAIT = 300.0
+
+    def __init__(self, now=datetime.datetime.now):
+        self.now = now
+        self._heap = []          # (due, seq, job_id)
+        self._jobs = {}          # job_id -> (due, callback, repeat)
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._stopped = False
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def schedule(self, job_id, due, callback, repeat=None):
+        """Run ``callback(job_id, due)`` at ``due``; ``repeat`` is a timedelta or None.
+
+        Scheduling an existing id replaces it.
+        """
+        with self._cond:
+            self._jobs[job_id] = (due, callback, repeat)
+            self._seq += 1
+            heapq.heappush(self._heap, (due, self._seq, job_id))
+            if self._heap[0][2] == job_id:
+                self._cond.notify()
+
+    def cancel(self, job_id):
+        with self._cond:
+            # the heap entry is skipped lazily when it reaches the top
+            return self._jobs.pop(job_id, None) is not None
+
+    def due_of(self, job_id):
+        """Due datetime of a scheduled job (None if not scheduled)."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            return job[0] if job else None
+
+    def next_due(self):
+        with self._cond:
+            self._drop_stale()
+            return self._heap[0][0] if self._heap else None
+
+    def _drop_stale(self):
+        heap = self._heap
+        while heap:
+            due, _, job_id = heap[0]
+            job = self._jobs.get(job_id)
+            if job is not None and job[0] == due:
+                return
+            heapq.heappop(heap)
+
+    def run_pending(self):
+        """Fire every job that is due now. Returns how many fired."""
+        fired = []
+        with self._cond:
+            now = self.now()
+            while True:
+                self._drop_stale()
+                if not self._heap or self._heap[0][0] > now:
+                    break
+                due, _, job_id = heapq.heappop(self._heap)
+                _, callback, repeat = self._jobs.pop(job_id)
+                if repeat:
+                    # catch up: one call for all missed runs, then the next future one
+                    nxt = due + repeat
+                    if nxt <= now:
+                        nxt += repeat * ((now - nxt) // repeat + 1)
+                    self._jobs[job_id] = (nxt, callback, repeat)
+                    self._seq += 1
+                    heapq.heappush(self._heap, (nxt, self._seq, job_id))
+                fired.append((callback, job_id, due))
+        # callbacks may speak or touch memory; never hold the lock while they run
+        for callback, job_id, due in fired:
+            try:
+                callback(job_id, due)
+            except Exception as e:
+                print("Reminder error:", e)
+        return len(fired)
+
+    def run(self):
+        """Scheduler thread body."""
+        while True:
+            self.run_pending()
+            with self._cond:
+                if self._stopped:
+                    return
+                self._drop_stale()
+                timeout = self.MAX_WAIT
+                if self._heap:
+                    timeout = min(timeout, max(0.0, (self._heap[0][0] - self.now()).total_seconds()))
+                if timeout > 0:
+                    self._cond.wait(timeout)
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+def next_occurrence(time_str, now):
+    """Next datetime (today or tomorrow) at HH:MM."""
+    t = datetime.datetime.strptime(time_str, "%H:%M").time()
+    due = datetime.datetime.combine(now.date(), t)
+    return due if due > now else due + datetime.timedelta(days=1)
+
+def _find_reminder(rem_id, store=None):
+    for rem in list((store or memory_store).data.get("reminders", [])):
+        if rem.get("id") == rem_id:
+            return rem
+    return None
+
+def _reminder_due(rem_id, due, session=None):
+    if session is not None and session.closed:
+        return
+    store = memory_store if session is None else session.store
+    rem = _find_reminder(rem_id, store)
+    if rem is None:
+        return
+    late = reminder_scheduler.now() - due > datetime.timedelta(minutes=2)
+    token = _session.set(session)     # a daemon client's reminder goes to that client
+    try:
+        speak(("Missed reminder: " if late else "Reminder: ") + rem.get("text", ""))
+    finally:
+        _session.reset(token)
+    if rem.get("repeat") in REPEAT_INTERVALS:
+        nxt = reminder_scheduler.due_of(rem_id)
+        if nxt is not None:
+            store.remove("reminders", rem)
+            store.append("reminders", dict(rem, due=nxt.isoformat(timespec="seconds")))
+    else:
+        # remove one-time reminder
+        store.remove("reminders", rem)
+
+def schedule_reminder(rem, session=None):
+    """Put a stored reminder into the scheduler (reminders without a time never fire)."""
+    if not rem.get("due"):
+        return
+    callback = _reminder_due if session is None else functools.partial(_reminder_due, session=session)
+    reminder_scheduler.schedule(rem["id"], datetime.datetime.fromisoformat(rem["due"]), callback,
+                                REPEAT_INTERVALS.get(rem.get("repeat")))
+
+def add_reminder(text, time_str=None, repeat=None):
+    """time_str optional in HH:MM 24-hour format; repeat is None, "daily" or "weekly"."""
+    rem = {"id": uuid.uuid4().hex[:12], "text": text, "time": time_str, "repeat": repeat, "due": None}
+    if time_str:
+        rem["due"] = next_occurrence(time_str, reminder_scheduler.now()).isoformat(timespec="seconds")
+    current_store().append("reminders", rem)
+    schedule_reminder(rem, _session.get())
+    speak(f"Reminder added: {text} at {time_str if time_str else 'no specific time'}")
+
+def load_reminders():
+    """Schedule stored reminders; overdue ones fire right away as missed reminders."""
+    now = reminder_scheduler.now()
+    for rem in list(memory.get("reminders", [])):
+        if "id" not in rem:
+            # reminder saved by an older version: plain HH:MM, next occurrence
+            new = dict(rem, id=uuid.uuid4().hex[:12], repeat=None, due=None)
+            if rem.get("time"):
+                try:
+                    new["due"] = next_occurrence(rem["time"], now).isoformat(timespec="seconds")
+                except ValueError:
+                    pass
+            memory_store.remove("reminders", rem)
+            memory_store.append("reminders", new)
+            rem = new
+        schedule_reminder(rem)
+
+def _next_independence_day(now):
+    due = datetime.datetime(now.year, 8, 14)
+    if due.year <= memory.get("last_independence_year", 0) or now >= due + datetime.timedelta(days=1):
+        due = datetime.datetime(now.year + 1, 8, 14)
+    return max(due, now)
+
+def _independence_day_due(job_id, due):
+    # independence day alert once per year
+    today = reminder_scheduler.now().date()
+    if today.month == 8 and today.day == 14 and memory.get("last_independence_year", 0) != today.year:
+        speak("Happy Independence Day! Today is 14th August — Pakistan's Independence Day.")
+        memory_store.set("last_independence_year", today.year)
+    reminder_scheduler.schedule(job_id, _next_independence_day(reminder_scheduler.now()), _independence_day_due)
+
+def check_reminders_loop():
+    """Background thread: fires reminders exactly when they are due."""
+    load_reminders()
+    reminder_scheduler.schedule("independence_day", _next_independence_day(reminder_scheduler.now()),
+                                _independence_day_due)
+    reminder_scheduler.run()
+
+reminder_scheduler = ReminderScheduler()
+reminder_thread = None
+
+def start_reminders():
+    """Start the reminder thread for the memory file's reminders (once)."""
+    global reminder_thread
+    if reminder_thread is None:
+        reminder_thread = threading.Thread(target=check_reminders_loop, name="jarvis-reminders", daemon=True)
+        reminder_thread.start()
+    return reminder_thread
+
+# ---------------- Intent routing ------------------------------------------------
+# Every command is listed once in INTENTS. Phrases match whole words only, so
+# "day" no longer fires inside "today's" and "lock" no longer fires inside "clock".
+#   "open chrome"          -> the words must appear next to each other
+#   ("what", "time")       -> every phrase in the tuple must appear somewhere
+#   "^my name is"          -> phrase must start the utterance
+#   "=cmd"                 -> phrase must be the whole utterance
+# When several intents match, the highest priority wins; ties go to the longest match.
+# Power and session commands (GUARDED_INTENTS) need command phrasing and never
+# answer a question or a negation: "how do i restart my router", "don't shut down".
+def _device_phrases(*verbs):
+    return [p for v in verbs for p in (f"={v}", f"={v} now", f"{v} the computer", f"{v} my computer",
+                                       f"{v} the pc", f"{v} my pc", f"{v} the system")]
+
+INTENTS = [
+    # (intent, priority, phrases)
+    ("reminder", 120, ["remind me to"]),
+    ("set_name", 120, ["^my name is"]),
+    ("history", 110, ["what did i ask", "what did i say", "what did we talk about", "when did i ask",
+                      "did i ask about", "what have i asked"]),
+    ("exit", 100, ["exit", "quit", "bye", "goodbye"]),
+    ("time", 95, [("what", "time"), "=time", "tell me the time", "what time is it"]),
+    ("independence_day", 92, ["independence day", "14 august", "august 14"]),   # above "day"
+    ("date", 90, ["date", "day", "what day", "what is the date", "=today", "what is today"]),
+    ("get_name", 85, ["what is my name", "what's my name"]),
+    ("pakistan", 80, ["pakistan", "capital of pakistan", "history of pakistan", "pakistan geography",
+                      "founder of pakistan", "k2", "karachi", "islamabad"]),
+    ("weather", 82, ["weather"]),
+    ("write_application", 72, ["write application", "create application", ("write", "application")]),
+    ("write_text", 72, ["write note", "write a note", "write essay", "write letter"]),
+    ("chrome", 70, ["open chrome", "=chrome"]),
+    ("youtube", 70, ["open youtube"]),
+    ("whatsapp", 70, ["open whatsapp", "whatsapp"]),
+    ("settings", 70, ["open settings", "settings"]),
+    ("vscode", 70, ["open vscode", "open visual studio code", "vs code"]),
+    ("calculator", 70, ["open calculator", "calculator"]),
+    ("task_manager", 70, ["task manager"]),
+    ("cmd", 70, ["command prompt", "=cmd", "open cmd"]),
+    ("control_panel", 70, ["control panel"]),
+    ("abort_shutdown", 66, ["abort shutdown", "cancel shutdown", "abort restart", "cancel restart",
+                            ("abort", "shutdown"), ("cancel", "shutdown")]),
+    ("shutdown", 65, _device_phrases("shutdown", "shut down", "turn off")),
+    ("restart", 65, _device_phrases("restart", "reboot")),
+    ("lock", 65, _device_phrases("lock") + ["lock the screen", "lock workstation", "lock the workstation"]),
+    ("sleep", 65, ["=sleep", "go to sleep", "sleep mode", "put the computer to sleep", "put the pc to sleep"]),
+    ("logoff", 65, _device_phrases("log off", "logoff", "sign out") + ["log me off", "sign me out"]),
+    ("music", 60, ["play music", "=music", "play songs", "play some music"]),
+    ("wiki", 10, ["who", "what", "when", "where", "why", "how", "tell me about", "define", "explain"]),
+]
+
+GUARDED_INTENTS = {"shutdown", "restart", "lock", "sleep", "logoff"}
+QUESTION_WORDS = frozenset("what what's whats who when where why how which is are does did should".split())
+NEGATIONS = frozenset("don't dont not never without".split())
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+def tokenize(text):
+    """Split an utterance into lowercase word tokens."""
+    return _TOKEN_RE.findall(text.lower())
+
+class IntentRouter:
+    """Precompiled intent table resolved in a single pass over the query tokens.
+
+    All phrases are compiled into one token trie. Walking the trie from each token
+    position finds every phrase in the utterance, so routing cost depends on the
+    length of the query, not on how many intents are registered.
+    """
+
+    def __init__(self, intents, guarded=()):
+        self.guarded = set(guarded)   # intents skipped for questions and negations
+        self._trie = {}        # token -> child node; node["$"] holds phrase ids ending here
+        self._anchored = {}    # same trie, but only walked from the first token
+        self._exact = {}       # whole-utterance token tuple -> phrase id
+        self._phrase_ids = {}  # (kind, tokens) -> phrase id
+        self._phrase_len = []  # phrase id -> number of tokens
+        self._patterns = []    # (intent, priority, phrase ids, match length)
+        self._by_phrase = []   # phrase id -> indices into self._patterns
+        for intent, priority, phrases in intents:
+            self.add(intent, priority, phrases)
+
+    def _compile_phrase(self, phrase):
+        kind = ""
+        if phrase[:1] in ("^", "="):
+            kind, phrase = phrase[0], phrase[1:]
+        tokens = tuple(tokenize(phrase))
+        if not tokens:
+            raise ValueError(f"empty intent phrase: {phrase!r}")
+        key = (kind, tokens)
+        pid = self._phrase_ids.get(key)
+        if pid is not None:
+            return pid
+        pid = len(self._phrase_len)
+        self._phrase_ids[key] = pid
+        self._phrase_len.append(len(tokens))
+        self._by_phrase.append([])
+        if kind == "=":
+            self._exact[tokens] = pid
+        else:
+            node = self._anchored if kind == "^" else self._trie
+            for tok in tokens:
+                node = node.setdefault(tok, {})
+            node.setdefault("$", []).append(pid)
+        return pid
+
+    def add(self, intent, priority, phrases):
+        """Register an intent. See INTENTS for the phrase syntax."""
+        for phrase in phrases:
+            parts = phrase if isinstance(phrase, tuple) else (phrase,)
+            pids = tuple(self._compile_phrase(p) for p in parts)
+            idx = len(self._patterns)
+            self._patterns.append((intent, priority, pids, sum(self._phrase_len[p] for p in pids)))
+            for pid in pids:
+                self._by_phrase[pid].append(idx)
+
+    @staticmethod
+    def _walk(node, tokens, start, found):
+        for i in range(start, len(tokens)):
+            node = node.get(tokens[i])
+            if node is None:
+                return
+            ids = node.get("$")
+            if ids:
+                found.update(ids)
+
+    def route(self, query):
+        """Return the best matching intent name for ``query`` (or None)."""
+        tokens = tokenize(query)
+        if not tokens:
+            return None
+        found = set()
+        pid = self._exact.get(tuple(tokens))
+        if pid is not None:
+            found.add(pid)
+        self._walk(self._anchored, tokens, 0, found)
+        trie = self._trie
+        for i in range(len(tokens)):
+            if tokens[i] in trie:
+                self._walk(trie, tokens, i, found)
+        guard = bool(self.guarded) and (tokens[0] in QUESTION_WORDS or not NEGATIONS.isdisjoint(tokens))
+        best = None
+        for pid in found:
+            for idx in self._by_phrase[pid]:
+                intent, priority, pids, length = self._patterns[idx]
+                if len(pids) > 1 and not all(p in found for p in pids):
+                    continue
+                if guard and intent in self.guarded:
+                    continue
+                if best is None or (priority, length) > best[:2]:
+                    best = (priority, length, intent)
+        return best[2] if best else None
+
+router = IntentRouter(INTENTS, guarded=GUARDED_INTENTS)
+
+# ---------------- Fuzzy intent correction ---------------------------------------
+# When nothing (or only the catch-all "wiki") matched, the utterance is compared
+# with every command phrase, letter by letter and by sound, so "pay music" and
+# "open calculate her" still play music and open the calculator instead of
+# going to Wikipedia and making the user repeat themselves.
+FUZZY_EXCLUDE = {"wiki", "set_name", "exit", "shutdown", "restart", "lock", "sleep", "logoff"}  # never guessed
+FUZZY_TAIL_INTENTS = {"music", "youtube", "reminder", "history"}   # their phrases may be followed by arguments
+FUZZY_FILLERS = [("hey",), ("jarvis",), ("please",), ("ok",), ("okay",), ("can", "you"), ("could", "you"),
+                 ("would", "you"), ("will", "you")]
+
+_VOWELS = frozenset("aeiou")
+_METAPHONE_SKIP_FIRST = ("kn", "gn", "pn", "ae", "wr")
+
+@functools.lru_cache(maxsize=4096)    # the same few hundred words come up again and again
+def metaphone(word):
+    """Simplified Metaphone key of one word: "calculator" -> "KLKLTR", "phone" -> "FN"."""
+    w = "".join(ch for ch in word.lower() if ch.isalnum())
+    if w[:2] in _METAPHONE_SKIP_FIRST:
+        w = w[1:]
+    elif w[:2] == "wh":
+        w = "w" + w[2:]
+    elif w[:1] == "x":
+        w = "s" + w[1:]
+    out = []
+    n = len(w)
+    for i, c in enumerate(w):
+        prev = w[i - 1] if i else ""
+        nxt = w[i + 1] if i + 1 < n else ""
+        nxt2 = w[i + 2] if i + 2 < n else ""
+        if c == prev and c != "c":
+            continue
+        if c in _VOWELS:
+            if i == 0:
+                out.append("A")
+        elif c == "b":
+            if not (i == n - 1 and prev == "m"):
+                out.append("B")
+        elif c == "c":
+            if nxt == "h" or (nxt == "i" and nxt2 == "a"):
+                out.append("K" if prev == "s" else "X")
+            elif nxt in ("i", "e", "y"):
+                if prev != "s":
+                    out.append("S")
+            else:
+                out.append("K")
+        elif c == "d":
+            out.append("J" if nxt == "g" and nxt2 in ("e", "i", "y") else "T")
+        elif c == "g":
+            if (nxt == "h" and nxt2 not in _VOWELS) or (prev == "d" and nxt in ("e", "i", "y")):
+                continue
+            if nxt == "n" and w[i + 2:] in ("", "ed", "s"):
+                continue
+            out.append("J" if nxt in ("i", "e", "y") and prev != "g" else "K")
+        elif c == "h":
+            if prev in ("c", "g", "p", "s", "t") or (prev in _VOWELS and nxt not in _VOWELS):
+                continue
+            out.append("H")
+        elif c == "k":
+            if prev != "c":
+                out.append("K")
+        elif c == "p":
+            out.append("F" if nxt == "h" else "P")
+        elif c == "q":
+            out.append("K")
+        elif c == "s":
+            out.append("X" if nxt == "h" or (nxt == "i" and nxt2 in ("o", "a")) else "S")
+        elif c == "t":
+            if nxt == "i" and nxt2 in ("o", "a"):
+                out.append("X")
+            elif nxt == "h":
+                out.append("0")
+            elif not (nxt == "c" and nxt2 == "h"):
+                out.append("T")
+        elif c == "v":
+            out.append("F")
+        elif c in ("w", "y"):
+            if nxt in _VOWELS:
+                out.append(c.upper())
+        elif c == "x":
+            out.append("KS")
+        elif c == "z":
+            out.append("S")
+        else:
+            out.append(c.upper())
+    return "".join(out)
+
+def command_phrases(intents):
+    """(intent, phrase, may start at any word, takes trailing words) for every phrase fuzzy correction may pick."""
+    seen = set()
+    for intent, _, phrases in intents:
+        if intent in FUZZY_EXCLUDE:
+            continue
+        for phrase in phrases:
+            parts = phrase if isinstance(phrase, tuple) else (phrase,)
+            text = " ".join(p.lstrip("^=") for p in parts)
+            if (intent, text) not in seen:
+                seen.add((intent, text))
+                anchored = any(p[:1] in ("^", "=") for p in parts)
+                exact = any(p.startswith("=") for p in parts)
+                yield intent, text, not anchored, intent in FUZZY_TAIL_INTENTS and not exact
+
+class IntentCorrector:
+    """Closest command phrase to a misheard utterance, by spelling and by sound.
+
+    Every phrase is kept twice, as its letters ("opencalculator") and as its
+    Metaphone key ("APNKLKLTR"); spaces are dropped so split or merged words
+    ("calculate her", "you tube") cost little. An utterance is scored against
+    all phrases at once with Myers' bit-parallel edit distance: the phrases
+    are packed into 32-bit lanes of one integer (the spare bits stop
+    carries), so each utterance character updates every phrase's column of
+    the distance table in a dozen integer operations. Confidence is one
+    minus the mean of the two distances, each divided by the longer string.
+
+    As in the router, a plain phrase may start anywhere in the utterance
+    ("open control panal" -> "control panel"), while "^" and "=" phrases must
+    start it. Phrases whose intent takes arguments may end at any word, the
+    rest is kept ("pay music by queen" -> "play music by queen").
+    """
+
+    LANE = 32        # bits per phrase in the packed integers: up to 31 characters and a guard bit
+
+    def __init__(self, phrases, min_confidence=0.8, min_letters=5):
+        self.min_confidence = min_confidence
+        self.entries = []    # (intent, phrase, may start anywhere, takes trailing words)
+        letters, keys = [], []
+        for intent, text, anywhere, tail in phrases:
+            words = tokenize(text)
+            spelled = "".join(words).replace("'", "")
+            if len(spelled) < min_letters:
+                continue     # "day", "cmd", "k2": too short to tell apart from ordinary words
+            self.entries.append((intent, text, anywhere, tail))
+            letters.append(spelled[:self.LANE - 1])
+            keys.append("".join(metaphone(w) for w in words)[:self.LANE - 1])
+        self._lengths = [[len(s) for s in letters], [len(s) for s in keys]]
+        self._anchored = [not e[2] for e in self.entries]
+        self._tail = [p for p, e in enumerate(self.entries) if e[3]]
+        # one 1 bit at the bottom of every lane, and the same for the lanes of "^" and "=" phrases
+        ones = sum(1 << (self.LANE * p) for p in range(len(self.entries)))
+        self._starts = sum(1 << (self.LANE * p) for p, a in enumerate(self._anchored) if a)
+        self._count_masks = [m * ones for m in (0x55555555, 0x33333333, 0x0F0F0F0F, 0xFF)]
+        # bit 8 of a lane flags a phrase still in the running; only these may match a leading part
+        self._all = 0x100 * ones
+        self._tails = sum(0x100 << (self.LANE * p) for p in self._tail)
+        self._budgets = {}   # letters in the utterance -> per-lane edit budgets (see _budget)
+        self._packed = [self._pack(letters), self._pack(keys)]
+        # an utterance this much longer than every phrase cannot reach min_confidence
+        # (and a distance has to fit in a byte)
+        self._max_chars = min(int(max(map(len, letters), default=0) / max(2 * min_confidence - 1, 0.1)) + 1, 224)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _pack(self, strings):
+        """(character -> bits where it occurs, bits in use) with phrase p in lane p."""
+        peq, mask = {}, 0
+        for p, s in enumerate(strings):
+            offset = self.LANE * p
+            for n, ch in enumerate(s):
+                peq[ch] = peq.get(ch, 0) | 1 << (offset + n)
+            mask |= ((1 << len(s)) - 1) << offset
+        return peq, mask
+
+    def _lane_counts(self, x):
+        """Number of 1 bits in every lane of ``x``, in the low byte of the lane."""
+        m1, m2, m4, low = self._count_masks
+        x -= (x >> 1) & m1
+        x = (x & m2) + ((x >> 2) & m2)
+        x = (x + (x >> 4)) & m4
+        x += x >> 8
+        x += x >> 16
+        return x & low
+
+    def _budget(self, chars):
+        """Most letter edits each phrase can take against ``chars`` letters and still reach
+        min_confidence (even if it sounds exactly right), plus bit 8, per lane."""
+        budget = self._budgets.get(chars)
+        if budget is None:
+            slack = 2 * (1 - self.min_confidence)
+            budget = self._budgets[chars] = sum(
+                (0x100 + int(slack * (max(chars, n) if anchored else n) + 1e-9)) << (self.LANE * p)
+                for p, (n, anchored) in enumerate(zip(self._lengths[0], self._anchored)))
+        return budget
+
+    def _distances(self, packed, query, stops):
+        """{stop: edit distance of every phrase to query[:stop], in the low byte of its lane}"""
+        peq, mask = packed
+        starts = self._starts
+        pv, mv = mask, 0     # vertical deltas of the current column: +1 all the way down
+        out = {}
+        for i in range(stops[-1] + 1):
+            if i:
+                eq = peq.get(query[i - 1], 0)
+                xv = eq | mv
+                xh = (((eq & pv) + pv) ^ pv) | eq     # a carry out of a lane stops in its guard bit
+                ph = mv | (~(xh | pv) & mask)
+                mh = pv & xh
+                ph = ((ph << 1) & mask) | starts    # row 0 counts the utterance characters "^"/"=" phrases skip
+                mh = (mh << 1) & mask
+                pv = mh | (~(xv | ph) & mask)
+                mv = ph & xv
+            if i in stops and i not in out:
+                # bottom of each column: row 0 plus the vertical deltas (never negative, fits a byte)
+                out[i] = self._lane_counts(pv) + i * starts - self._lane_counts(mv)
+        return out
+
+    @staticmethod
+    def _strip_fillers(words):
+        """(index of the first word that is not a filler, index after the last)"""
+        start, end = 0, len(words)
+        changed = True
+        while changed:
+            changed = False
+            for filler in FUZZY_FILLERS:
+                if tuple(words[start:start + len(filler)]) == filler:
+                    start, changed = start + len(filler), True
+        while end > start and words[end - 1] in ("please", "jarvis", "now"):
+            end -= 1
+        return start, end
+
+    def match(self, query):
+        """(intent, confidence, corrected query) for the closest phrase, or None below min_confidence."""
+        q = query.lower()
+        found = list(_TOKEN_RE.finditer(q))
+        start, end = self._strip_fillers([m.group() for m in found])
+        found = found[start:end]
+        if not found or not self.entries:
+            return None
+        words = [m.group() for m in found]
+        spelled = [w.replace("'", "") for w in words]
+        letters = "".join(spelled)
+        # word ends: a phrase that takes arguments may end at any of them
+        char_stops, c = [], 0
+        for w in spelled:
+            c += len(w)
+            if c > self._max_chars:
+                break
+            char_stops.append(c)
+        if not char_stops:
+            return None
+        dc = self._distances(self._packed[0], letters, char_stops)
+        # phrases within their letter budget, as (word count, phrase); usually none for ordinary speech
+        candidates = []
+        lane = self.LANE
+        for s, cs in enumerate(char_stops):
+            allowed = self._all if cs == len(letters) else self._tails
+            hits = (self._budget(cs) - dc[cs]) & allowed
+            while hits:
+                bit = hits & -hits
+                hits ^= bit
+                candidates.append((s, (bit.bit_length() - 9) // lane))
+        if not candidates:
+            return None
+        sounds = [metaphone(w) for w in words[:candidates[-1][0] + 1]]
+        key_stops = list(itertools.accumulate(map(len, sounds)))
+        dk = self._distances(self._packed[1], "".join(sounds), sorted({key_stops[s] for s, _ in candidates}))
+        lc, lk = self._lengths
+        confidence, stop, best = -1.0, 0, 0
+        for s, p in candidates:
+            cs, ks = char_stops[s], key_stops[s]
+            rc, rk = dc[cs] >> (lane * p) & 0xFF, dk[ks] >> (lane * p) & 0xFF
+            # a phrase that may start anywhere has skipped the words before it: measure it on its own
+            if self._anchored[p]:
+                score = 1.0 - 0.5 * (rc / max(cs, lc[p]) + rk / max(ks, lk[p], 1))
+            else:
+                score = 1.0 - 0.5 * (rc / lc[p] + rk / max(lk[p], 1))
+            if score > confidence:
+                confidence, stop, best = score, s, p
+        if confidence < self.min_confidence:
+            return None
+        intent, text = self.entries[best][:2]
+        rest = q[found[stop + 1].start():].strip() if stop + 1 < len(found) else ""
+        return intent, confidence, f"{text} {rest}" if rest else text
+
+def _load_corrector():
+    with timed("build intent corrector"):
+        return IntentCorrector(command_phrases(INTENTS), min_confidence=FUZZY_MIN_CONFIDENCE)
+
+def correct_intent(q, routed=None):
+    """(intent, corrected query) when ``q`` looks like a misheard command, else None.
+
+    ``routed`` is what the router made of ``q``: None, or "wiki" when it only
+    found a question word, which needs a closer match to be overridden.
+    """
+    if not FUZZY_CORRECTION:
+        return None
+    with span("correct"):
+        found = get_backend("corrector").match(q)
+    if found is None:
+        return None
+    intent, confidence, text = found
+    if routed is not None and confidence < FUZZY_WIKI_CONFIDENCE:
+        return None
+    trace_turn_attrs(corrected=q, confidence=round(confidence, 3))
+    return intent, text
+
+# ---------------- Command handling ---------------------------------------------
+def _parse_reminder(q):
+    # e.g. 'remind me to call david at 18:00' or '... at 07:30 every day'
+    try:
+        after = q.split("remind me to", 1)[1].strip()
+        repeat = None
+        for suffix, kind in ((" every day", "daily"), (" daily", "daily"), (" every week", "weekly"), (" weekly", "weekly")):
+            if after.endswith(suffix):
+                after, repeat = after[:-len(suffix)].strip(), kind
+                break
+        # naive: if 'at HH:MM' present
+        if " at " in after:
+            text, tstr = after.rsplit(" at ", 1)
+            # validate HH:MM
+            try:
+                datetime.datetime.strptime(tstr.strip(), "%H:%M")
+                add_reminder(text.strip(), tstr.strip(), repeat)
+                if repeat:
+                    return f"Reminder set for {tstr.strip()} {repeat}: {text.strip()}"
+                return f"Reminder set for {tstr.strip()}: {text.strip()}"
+            except Exception:
+                add_reminder(after.strip(), None)
+                return "Reminder added without specific time (time format invalid)."
+        else:
+            add_reminder(after.strip(), None)
+            return "Reminder added without time."
+    except Exception:
+        return "Sorry, I couldn't parse the reminder."
+
+def _set_name(q):
+    name = q.replace("my name is", "", 1).strip()
+    if name:
+        current_store().set("name", name)
+        return f"Nice to meet you, {name}. I will remember your name."
+    return "I did not catch your name."
+
+def _get_name(q):
+    name = current_store().data.get("name")
+    if name:
+        return f"Your name is {name}."
+    return "I don't know your name yet. Tell me 'my name is ...' to save it."
+
+def _pakistan(q):
+    ans = get_pakistan_answer(q)
+    if ans:
+        return ans
+    # fallback to general Pakistan summary
+    return get_knowledge_base().get("pakistan", "history")  # or more general text
+
+def _weather(q):
+    # Weather (optional using OpenWeather), answered from the cache when possible
+    if not OPENWEATHER_API_KEY:
+        return "Weather is not configured. Please add your OpenWeatherMap API key in the script to enable weather."
+    return get_backend("weather").describe(weather_city(q))
+
+def _youtube(q):
+    # optionally: "open youtube for cats"
+    if " for " in q:
+        open_youtube(q.split(" for ", 1)[1].strip())
+    else:
+        open_youtube()
+    return "Opened YouTube."
+
+def _music(q):
+    # "play music by queen" / "play music from the folder workout"
+    m = re.search(r"\b(by|from(?: the)?(?: folder)?)\s+(.+)$", q)
+    if not m:
+        play_random_music()
+    elif m.group(1) == "by":
+        play_random_music(query=m.group(2))
+    else:
+        play_random_music(folder=m.group(2))
+    return "Playing music."
+
+def _action(func, reply, *args):
+    """Handler that runs an action helper and returns a fixed reply."""
+    CANNED_PHRASES.append(reply)
+    def handler(q):
+        func(*args)
+        return reply
+    return handler
+
+# Commands that take no arguments: with a streaming recognizer they are answered
+# as soon as a stable partial hypothesis names them.
+EARLY_ROUTE_INTENTS = {"time", "independence_day", "get_name", "chrome", "whatsapp", "settings",
+                       "vscode", "calculator", "task_manager", "cmd", "control_panel"}
+
+def early_intent(text):
+    """The intent ``text`` clearly asks for, if it is safe to act before the user stops talking."""
+    intent = router.route(text.lower())
+    return intent if intent in EARLY_ROUTE_INTENTS else None
+
+INTENT_HANDLERS = {
+    "exit": lambda q: "exit",
+    "time": lambda q: get_time_text(),
+    "date": lambda q: get_date_text(),
+    "independence_day": lambda q: "Pakistan's Independence Day is on 14 August. Pakistan became independent on 14 August 1947.",
+    "pakistan": _pakistan,
+    "weather": _weather,
+    "chrome": _action(open_chrome, "Opened Chrome."),
+    "youtube": _youtube,
+    "whatsapp": _action(open_whatsapp, "Opened WhatsApp Web."),
+    "settings": _action(open_settings, "Opened Settings."),
+    "vscode": _action(open_vscode, "Opening VS Code."),
+    "calculator": _action(open_calculator, "Calculator opened."),
+    "task_manager": _action(open_task_manager, "Task Manager opened."),
+    "cmd": _action(open_cmd, "Command Prompt opened."),
+    "control_panel": _action(open_control_panel, "Control Panel opened."),
+    "shutdown": _action(system_shutdown, "Shutdown scheduled in 60 seconds.", 60),
+    "restart": _action(system_restart, "Restart scheduled in 60 seconds.", 60),
+    "abort_shutdown": _action(system_abort, "Shutdown/restart aborted."),
+    "lock": _action(lock_workstation, "Workstation locked."),
+    "sleep": _action(sleep_system, "System sleep attempted."),
+    "logoff": _action(logoff, "Logoff initiated."),
+    "music": _music,
+    # prompt for title / text externally (handled in main loop)
+    "write_application": lambda q: "prompt_application_title",
+    "write_text": lambda q: "prompt_write_text",
+    "reminder": _parse_reminder,
+    "get_name": _get_name,
+    "set_name": _set_name,
+    "history": _history,
+    # "wiki" has no handler: its questions go to the fallback resolvers below
+}
+
+# ---------------- Fallback resolvers ----------------------------------------------
+# Questions no handler answered are put to every resolver in FALLBACK_ORDER at
+# once. The best answer by that order wins as soon as nothing better can still
+# arrive; at FALLBACK_DEADLINE Jarvis answers with whatever it has.
+FALLBACK_RESOLVERS = {       # name -> function(q) returning an answer or None
+    "knowledge": lambda q: knowledge_answer(q),
+    "wiki_offline": lambda q: wiki_offline_summary(q, sentences=2),
+    "wikipedia": lambda q: wiki_summary(q, sentences=2) if WIKI_ONLINE else None,
+    "chat": lambda q: chat_fallback(q),
+}
+FALLBACK_ORDER = {           # intent -> resolvers, best first (None: no intent matched)
+    "wiki": ("knowledge", "wiki_offline", "wikipedia", "chat"),
+    None: ("chat",),
+}
+FALLBACK_INLINE = {"knowledge", "wiki_offline"}   # local and fast: asked first, on the calling thread
+FALLBACK_WORKERS = 2         # threads per other resolver; a hung lookup only ties up its own
+SLOW_LOOKUP_REPLY = "That is taking me too long to look up. Please ask me again in a moment."
+CANNED_PHRASES.append(SLOW_LOOKUP_REPLY)
+
+_fallback_pools = {}         # name -> (executor, free threads)
+_fallback_pool_lock = threading.Lock()
+
+def _get_fallback_pool(name):
+    with _fallback_pool_lock:
+        if name not in _fallback_pools:
+            _fallback_pools[name] = (ThreadPoolExecutor(max_workers=FALLBACK_WORKERS,
+                                                        thread_name_prefix="jarvis-resolve-" + name),
+                                     threading.BoundedSemaphore(FALLBACK_WORKERS))
+        return _fallback_pools[name]
+
+def _submit_resolver(name, q):
+    """Start resolver ``name`` on its own threads; None while they are all still busy."""
+    pool, free = _get_fallback_pool(name)
+    if not free.acquire(blocking=False):
+        return None
+    future = pool.submit(_run_resolver, name, q)
+    future.add_done_callback(lambda f: free.release())
+    return future
+
+def _run_resolver(name, q):
+    try:
+        with span("resolve:" + name):
+            return FALLBACK_RESOLVERS[name](q)
+    except Exception as e:
+        print(f"{name} lookup failed:", e)
+        return None
+
+def resolve_fallbacks(q, names, deadline=None):
+    """Ask the ``names`` resolvers concurrently. Returns (name, answer), or (None, None).
+
+    Lookups still running when the winner is known (or at the deadline) are
+    abandoned: queued ones are cancelled, running ones finish in the background
+    (a late Wikipedia summary still lands in the cache for next time). Each
+    resolver has FALLBACK_WORKERS threads of its own; while they are all stuck
+    on earlier questions it is skipped. The name is "timeout" when nothing
+    answered in time but a lookup was still running or skipped.
+    """
+    deadline = FALLBACK_DEADLINE if deadline is None else deadline
+    names = list(names)
+    # leading inline resolvers outrank everything after them: no need to race
+    while names and names[0] in FALLBACK_INLINE:
+        name = names.pop(0)
+        answer = _run_resolver(name, q)
+        if answer:
+            return name, answer
+    if not names:
+        return None, None
+    rank = {}
+    for i, name in enumerate(names):
+        future = _submit_resolver(name, q)
+        if future is not None:
+            rank[future] = i
+    busy = len(rank) < len(names)
+    pending = set(rank)
+    best = None    # (rank, answer)
+    end = time.monotonic() + deadline
+    while pending:
+        remaining = end - time.monotonic()
+        if remaining <= 0:
+            break
+        done, pending = wait_futures(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        for f in done:
+            answer = f.result()
+            if answer and (best is None or rank[f] < best[0]):
+                best = (rank[f], answer)
+        if best is not None and all(rank[f] > best[0] for f in pending):
+            break
+    for f in pending:
+        f.cancel()
+    if best is not None:
+        return names[best[0]], best[1]
+    return ("timeout", None) if pending or busy else (None, None)
+
+def route_query(query):
+    """Answer ``query``; returns (intent, response).
+
+    Fallback answers report "wiki" (knowledge base or Wikipedia), "chat",
+    "timeout" or "unknown".
+    """
+    q = query.lower()
+    with span("route"):
+        intent = router.route(q)
+    if intent is None or intent == "wiki":
+        corrected = correct_intent(q, intent)
+        if corrected is not None:
+            intent, q = corrected
+    handler = INTENT_HANDLERS.get(intent)
+    if handler:
+        with span("intent:" + intent):
+            result = handler(q)
+        if result is not None:
+            trace_turn_attrs(intent=intent, query=q)
+            return intent, result
+
+    # Local knowledge / Wikipedia / ChatterBot (or the retrieval responder), raced
+    with span("fallback"):
+        name, reply = resolve_fallbacks(q, FALLBACK_ORDER.get(intent, FALLBACK_ORDER[None]))
+    if name == "timeout":
+        trace_turn_attrs(intent="timeout", query=q)
+        return "timeout", SLOW_LOOKUP_REPLY
+    intent = "chat" if name == "chat" else ("wiki" if reply else "unknown")
+    trace_turn_attrs(intent=intent, query=q, answered_by=name)
+    if reply:
+        return intent, reply
+
+    # Ultimate fallback
+    return "unknown", "Sorry, I don't understand that yet. Try asking another way."
+
+def handle_query(query):
+    """Central command parser. Returns a text response (may be None if action already speaks)."""
+    return route_query(query)[1]
+
+# ---------------- Headless batch mode -------------------------------------------
+# Replays a transcript (one utterance per line) through route_query with every
+# side effect recorded instead of performed, and writes one JSON line per
+# utterance. Memory is a RAM copy of the memory file (so "what is my name"
+# still works), never written back; reminders are not started.
+def _batch_init():
+    global actions, memory_store, memory
+    actions = RecordingActions()
+    memory_store = MemoryStore.read_only(MEMORY_FILE, defaults=_memory_defaults())
+    memory = memory_store.data
+    _backends["history"] = ChatArchive(None)
+
+def _batch_one(item):
+    n, utterance = item
+    actions.take()
+    t0 = time.perf_counter()
+    try:
+        intent, response = route_query(utterance)
+        error = None
+    except Exception as e:
+        intent, response, error = None, None, f"{type(e).__name__}: {e}"
+    ms = (time.perf_counter() - t0) * 1000.0
+    rec = {"line": n, "utterance": utterance, "intent": intent, "response": response,
+           "latency_ms": round(ms, 3), "actions": actions.take()}
+    if error:
+        rec["error"] = error
+    return rec
+
+def run_batch(lines, out, workers=1, chunksize=32):
+    """Answer every non-blank line of ``lines``, writing JSONL records to ``out`` in input order.
+
+    With workers > 1 the utterances are spread over a process pool. Returns a
+    summary dict (count, wall seconds, utterances/s, latency percentiles).
+    """
+    items = [(n, ln.strip()) for n, ln in enumerate(lines, 1) if ln.strip()]
+    latencies = []
+    t0 = time.perf_counter()
+    if workers > 1:
+        import multiprocessing
+        with multiprocessing.Pool(workers, initializer=_batch_init) as pool:
+            results = pool.imap(_batch_one, items, chunksize)
+            for rec in results:
+                latencies.append(rec["latency_ms"])
+                out.write(json.dumps(rec, ensure_ascii=False) + "\n")
+    else:
+        _batch_init()
+        for item in items:
+            rec = _batch_one(item)
+            latencies.append(rec["latency_ms"])
+            out.write(json.dumps(rec, ensure_ascii=False) + "\n")
+    wall = time.perf_counter() - t0
+    latencies.sort()
+    pct = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] if latencies else 0.0
+    return {"count": len(items), "seconds": round(wall, 3),
+            "per_second": round(len(items) / wall, 1) if wall else 0.0,
+            "p50_ms": pct(0.5), "p95_ms": pct(0.95), "max_ms": latencies[-1] if latencies else 0.0}
+
+# ---------------- Daemon mode ---------------------------------------------------
+# One Jarvis serving many local text clients: JSON lines over a Unix socket, or
+# HTTP on localhost. Every client has its own namespace (name, reminders, chat
+# history); the knowledge base, Wikipedia cache, chat responder and weather
+# service are shared and stay warm. Answers are worked out on a thread pool
+# because lookups block; the event loop only moves bytes.
+#
+# Clients can launch programs and shut the PC down, so HTTP takes commands by
+# POST only, from local Host/Origin headers only (no DNS rebinding or
+# cross-site requests from a browser), with the token from DAEMON_TOKEN_FILE.
+# The Unix socket is only accessible to its owner.
+class Session:
+    """One daemon client's namespace.
+
+    Its memory (name, reminders) lives in ``path`` (None: RAM only) and is
+    opened by the first question; chat history is kept in RAM.
+    """
+
+    def __init__(self, client_id, path=None, recent=20, after=None):
+        self.client_id = client_id
+        self.path = path
+        self.store = None
+        self.history = ChatArchive(None, recent=recent)
+        self.outbox = collections.deque(maxlen=50)   # things said outside a reply (reminders...)
+        self.prompt = None       # a follow-up Jarvis asked for ("what should I write?")
+        self.lock = threading.Lock()   # one question at a time per client
+        self.closed = False
+        self._after = after      # the previous session of this client, still closing
+
+    def open(self):
+        """Worker thread, holding ``lock``: load the client's memory and schedule its reminders."""
+        if self.store is not None:
+            return
+        if self._after is not None:
+            wait_futures([self._after])
+            self._after = None
+        self.store = MemoryStore(self.path, defaults={"name": None, "reminders": []})
+        for rem in list(self.store.data.get("reminders", [])):
+            schedule_reminder(rem, self)
+
+    def close(self):
+        """Wait for the question in progress, then stop the client's reminders and save its memory."""
+        with self.lock:
+            self.closed = True
+            if self.store is not None:
+                for rem in self.store.data.get("reminders", []):
+                    reminder_scheduler.cancel(rem.get("id"))
+                self.store.close()
+            self.history.close()
+
+def client_memory_path(client_id):
+    """Memory file for a daemon client in DAEMON_CLIENTS_DIR (None when clients live in RAM)."""
+    if not DAEMON_CLIENTS_DIR:
+        return None
+    os.makedirs(DAEMON_CLIENTS_DIR, exist_ok=True)
+    digest = hashlib.sha1(client_id.encode("utf-8")).hexdigest()[:12]
+    return os.path.join(DAEMON_CLIENTS_DIR, f"{safe_filename(client_id, 'client')[:32]}-{digest}.json")
+
+def daemon_token(path=None):
+    """The daemon's HTTP token, read from ``path`` (DAEMON_TOKEN_FILE), created there on first use."""
+    path = path or DAEMON_TOKEN_FILE
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            token = f.read().strip()
+        if token:
+            return token
+    except FileNotFoundError:
+        pass
+    token = secrets.token_urlsafe(32)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(token + "\n")
+    return token
+
+def is_loopback(host):
+    """True for localhost, 127.x.x.x and ::1 (with or without [brackets])."""
+    host = (host or "").strip("[]").lower()
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+# replies that ask the client for more, and what to do with the answer
+DAEMON_PROMPTS = {
+    "prompt_application_title": ("Please tell me the application title.", create_application_from_title),
+    "prompt_write_text": ("What should I write?", write_in_notepad),
+}
+
+class JarvisDaemon:
+    BACKLOG = 1024     # hundreds of clients may connect at once (asyncio's default is 100)
+    MAX_HEADERS = 100
+
+    def __init__(self, workers=8, max_sessions=1000, token=None, allow_remote=False,
+                 max_request=DAEMON_MAX_REQUEST):
+        self.max_sessions = max_sessions
+        self.token = token                           # required from HTTP clients (None: HTTP is refused)
+        self.allow_remote = allow_remote
+        self.max_request = max_request
+        self.sessions = collections.OrderedDict()    # client id -> Session, least recently seen first
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="jarvis-daemon")
+        # dropped sessions close here, apart from the workers: closing waits for their answers
+        self._closer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="jarvis-daemon-close")
+        self._closing = {}                           # client id -> Future of its dropped session's close()
+        self.stats = collections.Counter()
+        self._servers = []
+        self._connections = 0
+
+    def session(self, client_id):
+        session = self.sessions.get(client_id)
+        if session is None:
+            after = self._closing.pop(client_id, None)
+            session = self.sessions[client_id] = Session(client_id, client_memory_path(client_id),
+                                                         recent=CHAT_RECENT_TURNS, after=after)
+            if len(self.sessions) > self.max_sessions:
+                self._drop(self.sessions.popitem(last=False)[1])
+        else:
+            self.sessions.move_to_end(client_id)
+        return session
+
+    def _drop(self, session):
+        future = self._closer.submit(session.close)
+        self._closing[session.client_id] = future
+        loop = asyncio.get_running_loop()
+        future.add_done_callback(functools.partial(self._closed, loop, session.client_id))
+        self.stats["sessions_dropped"] += 1
+
+    def _closed(self, loop, client_id, future):
+        # forget the close once done, unless the client came back meanwhile
+        def forget():
+            if self._closing.get(client_id) is future:
+                del self._closing[client_id]
+        try:
+            loop.call_soon_threadsafe(forget)
+        except RuntimeError:
+            pass         # the event loop has already stopped
+
+    def close(self):
+        """Save every client's memory and stop their reminders."""
+        sessions, self.sessions = list(self.sessions.values()), collections.OrderedDict()
+        for session in sessions:
+            session.close()
+        self._closer.shutdown(wait=True)
+        self.executor.shutdown(wait=False)
+
+    def _answer(self, session, q):
+        """Worker thread: answer ``q`` inside the client's namespace (None if the session was dropped)."""
+        token = _session.set(session)
+        try:
+            with session.lock, turn_trace():
+                if session.closed:
+                    return None
+                session.open()
+                if session.prompt is not None:
+                    _, finish = DAEMON_PROMPTS[session.prompt]
+                    session.prompt = None
+                    finish(q)
+                    intent, reply = "prompt", "Done."
+                else:
+                    intent, reply = route_query(q)
+                    if reply in DAEMON_PROMPTS:
+                        session.prompt = reply
+                        reply = DAEMON_PROMPTS[reply][0]
+                    elif reply == "exit":
+                        reply = "Goodbye! Have a great day."
+                session.history.add(q, reply, intent)
+                return intent, reply
+        finally:
+            _session.reset(token)
+
+    async def ask(self, client_id, query):
+        """Answer one query for ``client_id``: {"client", "intent", "response", "said", "ms"}."""
+        t0 = time.perf_counter()
+        session = self.session(str(client_id))
+        q = str(query).strip().lower()
+        self.stats["queries"] += 1
+        if not q:
+            intent, reply = "no_input", "I didn't catch that."
+        else:
+            try:
+                answered = None
+                while answered is None:
+                    answered = await asyncio.get_running_loop().run_in_executor(
+                        self.executor, self._answer, session, q)
+                    if answered is None:
+                        # dropped while the question waited for a worker: ask the new one
+                        session = self.session(str(client_id))
+                intent, reply = answered
+            except Exception as e:
+                self.stats["errors"] += 1
+                intent, reply = "error", f"Sorry, something went wrong: {e}"
+        said = []
+        while session.outbox:
+            said.append(session.outbox.popleft())
+        return {"client": session.client_id, "intent": intent, "response": reply, "said": said,
+                "ms": round((time.perf_counter() - t0) * 1000.0, 3)}
+
+    # -- Unix socket: one JSON object per line each way --------------------------------
+    async def _serve_lines(self, reader, writer):
+        self._connections += 1
+        default_client = f"conn-{self._connections}"
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:       # longer than max_request
+                    self.stats["rejected"] += 1
+                    writer.write(json.dumps({"error": "line too long"}).encode("utf-8") + b"\n")
+                    await writer.drain()
+                    break
+                if not line:
+                    break
+                try:
+                    msg = json.loads(line)
+                except ValueError:
+                    msg = {"q": line.decode("utf-8", "replace")}   # plain text works too
+                if not isinstance(msg, dict):
+                    msg = {"q": str(msg)}
+                rec = await self.ask(msg.get("client", default_client), msg.get("q", ""))
+                writer.write(json.dumps(rec, ensure_ascii=False).encode("utf-8") + b"\n")
+                await writer.drain()
+                if rec["intent"] == "exit":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    # -- HTTP: POST /query {"client": ..., "q": ...}, GET /status; both need the token ---
+    async def _serve_http(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                method, target, version = line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    h = await reader.readline()
+                    if h in (b"\r\n", b"\n", b""):
+                        break
+                    if len(headers) >= self.MAX_HEADERS:
+                        raise ValueError("too many headers")
+                    k, _, v = h.decode("latin-1").partition(":")
+                    headers[k.strip().lower()] = v.strip()
+                length = int(headers.get("content-length") or 0)
+                keep = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                if not 0 <= length <= self.max_request:
+                    # the body is never read, so the connection cannot be reused
+                    self.stats["rejected"] += 1
+                    status, payload, keep = "413 Payload Too Large", {"error": "request too large"}, False
+                else:
+                    body = await reader.readexactly(length)
+                    status, payload = await self._http_request(method, target, headers, body)
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                writer.write(f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                             f"Content-Length: {len(data)}\r\n"
+                             f"Connection: {'keep-alive' if keep else 'close'}\r\n\r\n".encode("latin-1") + data)
+                await writer.drain()
+                if not keep:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def _http_refusal(self, headers):
+        """(status, payload) if the request may not be answered, else None."""
+        host = urllib.parse.urlsplit("//" + headers.get("host", "")).hostname
+        if not self.allow_remote and not is_loopback(host):
+            return "403 Forbidden", {"error": "Host must be localhost"}
+        origin = headers.get("origin")
+        if origin is not None and not is_loopback(urllib.parse.urlsplit(origin).hostname):
+            return "403 Forbidden", {"error": "cross-origin requests are not allowed"}
+        auth = headers.get("authorization", "")
+        given = auth[7:].strip() if auth.lower().startswith("bearer ") else headers.get("x-jarvis-token", "")
+        if not self.token or not hmac.compare_digest(given.encode("utf-8"), self.token.encode("utf-8")):
+            return "401 Unauthorized", {"error": "missing or wrong token"}
+        return None
+
+    async def _http_request(self, method, target, headers, body):
+        refused = self._http_refusal(headers)
+        if refused is not None:
+            self.stats["rejected"] += 1
+            return refused
+        url = urllib.parse.urlsplit(target)
+        if url.path == "/status" and method == "GET":
+            return "200 OK", dict(self.stats, sessions=len(self.sessions))
+        if url.path != "/query":
+            return "404 Not Found", {"error": "unknown path"}
+        if method != "POST":
+            return "405 Method Not Allowed", {"error": "use POST"}
+        try:
+            msg = json.loads(body or b"{}")
+        except ValueError:
+            return "400 Bad Request", {"error": "body is not JSON"}
+        if not isinstance(msg, dict):
+            return "400 Bad Request", {"error": "body must be a JSON object"}
+        client = msg.get("client") or headers.get("x-jarvis-client") or "http"
+        return "200 OK", await self.ask(client, msg.get("q", ""))
+
+    async def serve(self, addresses):
+        """Listen on each address ("host:port" for HTTP, anything else is a Unix socket path)."""
+        for address in addresses:
+            host, _, port = address.rpartition(":")
+            host = host or "127.0.0.1"
+            if port.isdigit() and not (self.allow_remote or is_loopback(host)):
+                raise ValueError(f"refusing to serve on {host}: anyone who can reach it could run commands "
+                                 f"on this PC (use --allow-remote if you really mean it)")
+            if port.isdigit():
+                server = await asyncio.start_server(self._serve_http, host.strip("[]"), int(port),
+                                                    backlog=self.BACKLOG, limit=self.max_request)
+                print(f"Jarvis daemon: HTTP on http://{host}:{port}/query")
+            else:
+                if os.path.exists(address):
+                    os.remove(address)      # left over from a previous run
+                server = await asyncio.start_unix_server(self._serve_lines, address, backlog=self.BACKLOG,
+                                                         limit=self.max_request)
+                os.chmod(address, 0o600)
+                print(f"Jarvis daemon: JSON lines on {address}")
+            self._servers.append(server)
+        await asyncio.gather(*(s.serve_forever() for s in self._servers))
+
+def _raise_open_file_limit(needed):
+    """Each open client holds its memory file: lift the soft descriptor limit (Unix) if it is too low."""
+    try:
+        import resource
+    except ImportError:
+        return      # Windows: the C runtime allows 8192 open files
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != resource.RLIM_INFINITY and soft < needed:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (needed if hard == resource.RLIM_INFINITY else min(needed, hard), hard))
+
+def run_daemon(addresses, workers=DAEMON_WORKERS, allow_remote=None):
+    """Serve clients until interrupted (see JarvisDaemon)."""
+    if DAEMON_CLIENTS_DIR:
+        _raise_open_file_limit(DAEMON_MAX_SESSIONS + JarvisDaemon.BACKLOG + 256)
+    open_memory()
+    start_reminders()
+    # shared backends, loaded once for every client
+    warm_up(["knowledge", "wiki_offline", "corrector", "wikipedia"] + (["weather"] if OPENWEATHER_API_KEY else [])
+            + (["retrieval"] if CHAT_RESPONDER == "retrieval" else ["chatbot"]))
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT)
+    daemon = JarvisDaemon(workers=workers, max_sessions=DAEMON_MAX_SESSIONS, token=daemon_token(),
+                          allow_remote=DAEMON_ALLOW_REMOTE if allow_remote is None else allow_remote)
+    print(f"Jarvis daemon: HTTP clients send the token in {os.path.abspath(DAEMON_TOKEN_FILE)} "
+          f"as \"Authorization: Bearer <token>\"")
+    try:
+        asyncio.run(daemon.serve(addresses))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.close()
+    return daemon
+
+# ---------------- Main loop -----------------------------------------------------
+def main_loop():
+    open_memory()
+    start_reminders()
+    preload_voice()
+    if STARTUP_MODE == "background":
+        warm_up(["knowledge", "wiki_offline", "corrector", "sr", "recognizer", "wikipedia", "history"]
+                + (["weather"] if OPENWEATHER_API_KEY else [])
+                + (["retrieval"] if CHAT_RESPONDER == "retrieval" else ["chatbot"]))
+    speak("Jarvis starting up.")
+    # greet
+    if memory.get("name"):
+        speak(f"Welcome back, {memory['name']}!")
+    else:
+        speak("Hello! What's your name?")
+        nm = listen(timeout=6)
+        if nm:
+            memory_store.set("name", nm)
+            speak(f"Nice to meet you, {nm}!")
+
+    # Independence Day immediate check
+    if is_independence_day_today():
+        today = datetime.date.today()
+        last = memory.get("last_independence_year", 0)
+        if last != today.year:
+            speak("Happy Independence Day! Today is 14th August, Pakistan's Independence Day.")
+            memory_store.set("last_independence_year", today.year)
+
+    speak("How can I assist you today?")
+
+    if METRICS_PORT:
+        try:
+            start_metrics_server(METRICS_PORT)
+        except OSError as e:
+            print("Could not start metrics server:", e)
+    while True:
+        speak("Please say your command.")
+        mark_first_prompt()
+        with turn_trace():
+            if not _turn():
+                break
+        time.sleep(0.5)
+
+def _turn():
+    """Listen for one command and answer it. Returns False when the user said goodbye."""
+    q = listen(timeout=8)
+    if not q:
+        speak("I didn't catch that. Say please type your command.")
+        # allow typed fallback
+        try:
+            with span("typed_input"):
+                typed = input("Type command (or press Enter to skip): ").strip()
+        except Exception:
+            typed = ""
+        if not typed:
+            trace_turn_attrs(intent="no_input")
+            return True
+        q = typed.lower()
+    return respond(q)
+
+def respond(q):
+    """Answer one command and act on it (speech, prompts). Returns False on goodbye."""
+    intent, result = route_query(q)
+    try:
+        # prompts ("write a note") record the request, not the marker string
+        get_backend("history").add(q, None if intent in ("exit", "write_application", "write_text") else result, intent)
+    except Exception as e:
+        print("Could not record chat history:", e)
+
+    if result == "exit":
+        speak("Goodbye! Have a great day.")
+        save_memory()
+        speech_wait(timeout=10)
+        return False
+
+    # special prompts from handle_query
+    if result == "prompt_application_title":
+        speak("Please tell me the application title.")
+        title = listen(timeout=8)
+        if not title:
+            speak("I did not catch the title. Please type the application title:")
+            title = input("Application title: ").strip()
+        if title:
+            create_application_from_title(title)
+            speak(f"Created application template for {title} in Notepad.")
+        else:
+            speak("No title provided. Cancelled.")
+        return True
+
+    if result == "prompt_write_text":
+        speak("What should I write?")
+        body = listen(timeout=12)
+        if not body:
+            speak("I did not catch the text. Please type the text to write:")
+            body = input("Text: ").strip()
+        if body:
+            write_in_notepad(body)
+            speak("Written to Notepad.")
+        else:
+            speak("No text provided. Cancelled.")
+        return True
+
+    # Normal textual response
+    if result:
+        speak(result)
+    return True
+
+STARTUP_TIMINGS.append(("import jarvis", (time.perf_counter() - _PROCESS_START) * 1000.0))
+
+def preload_voice():
+    """Load what the voice loop needs before it first speaks.
+
+    Only main_loop calls this: batch, daemon and index-building runs never
+    speak, so they never load SAPI.
+    """
+    if STARTUP_MODE == "eager":
+        names = list(_BACKEND_LOADERS)
+    elif STARTUP_MODE == "background":
+        names = ["speaker"]   # needed for the greeting; the rest warms up in main_loop
+    else:
+        names = []
+    for name in names:
+        try:
+            get_backend(name)
+        except Exception as e:
+            print(f"Could not load {name}:", e)
+
+def main(argv=None):
+    import argparse
+    import sys
+    parser = argparse.ArgumentParser(description="Jarvis voice assistant.")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="answer each line of FILE ('-' for stdin) without a microphone; "
+                             "actions are recorded, not performed")
+    parser.add_argument("--out", metavar="FILE", default="-", help="JSONL output for --batch (default stdout)")
+    parser.add_argument("--workers", type=int, default=1, help="processes for --batch")
+    parser.add_argument("--serve", metavar="ADDRESS", action="append",
+                        help="run as a daemon for text clients: HOST:PORT for HTTP, or a Unix socket "
+                             "path (JSON lines); may be given more than once")
+    parser.add_argument("--allow-remote", action="store_true",
+                        help="let --serve listen on addresses other than localhost (DAEMON_ALLOW_REMOTE)")
+    parser.add_argument("--build-wiki-index", metavar="DUMP",
+                        help="build the offline Wikipedia index (WIKI_OFFLINE_INDEX) from an abstracts "
+                             "dump (.xml/.jsonl, optionally .gz/.bz2) and exit")
+    args = parser.parse_args(argv)
+    if args.build_wiki_index:
+        t0 = time.perf_counter()
+        stats = build_offline_wiki(args.build_wiki_index, WIKI_OFFLINE_INDEX)
+        print(f"{stats['keys']} titles ({stats['articles']} articles, {stats['resolved']} of "
+              f"{stats['redirects']} redirects) indexed in {time.perf_counter() - t0:.1f} s "
+              f"-> {WIKI_OFFLINE_INDEX}.idx/.dat")
+        return
+    if args.serve:
+        run_daemon(args.serve, allow_remote=args.allow_remote or None)
+        return
+    if not args.batch:
+        main_loop()
+        return
+    src = sys.stdin if args.batch == "-" else open(args.batch, "r", encoding="utf-8")
+    dst = sys.stdout if args.out == "-" else open(args.out, "w", encoding="utf-8")
+    try:
+        summary = run_batch(src, dst, workers=max(1, args.workers))
+    finally:
+        if src is not sys.stdin:
+            src.close()
+        if dst is not sys.stdout:
+            dst.close()
+    print(json.dumps(summary), file=sys.stderr)
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("Exiting Jarvis.")
+    except Exception as e:
         print("Jarvis crashed:", e)
\ No newline at end of file
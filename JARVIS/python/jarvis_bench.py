@@ -0,0 +1,1338 @@
+"""
+Jarvis benchmarks (offline, no microphone or SAPI needed)
+
+Runs on any OS: speech_recognition, wikipedia and win32com are replaced by small
+stand-in modules before jarvis.py is imported, and all state files go to a
+temporary folder.
+
+Usage:
+    python jarvis_bench.py routing
+    python jarvis_bench.py query pakistan memory reminders startup --save baseline.json
+    python jarvis_bench.py --compare baseline.json      # exit status 1 on a regression
+"""
+
+import os
+import sys
+import json
+import gzip
+import html
+import time
+import types
+import random
+import datetime
+import platform
+import tempfile
+import argparse
+import subprocess
+import wave
+import threading
+import urllib.request
+import urllib.parse
+import asyncio
+import socket
+import functools
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import math
+import array
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Mixed corpus of utterances used by the benchmarks
+UTTERANCES = [
+    "what time is it", "what is the date today", "what day is it today",
+    "tell me about pakistan", "capital of pakistan", "who founded pakistan",
+    "what's the weather in islamabad", "open chrome", "open youtube for cats",
+    "open whatsapp", "open settings", "open visual studio code", "open calculator",
+    "open task manager", "open command prompt", "open control panel",
+    "shutdown", "restart", "cancel shutdown", "lock workstation", "sleep", "log off",
+    "play music", "write application calculator", "write a note",
+    "remind me to call david at 18:00", "what is my name", "my name is ali",
+    "who is alan turing", "what is photosynthesis", "how are you",
+    "set the clock forward", "today's weather please", "tell me a joke",
+]
+
+
+def install_stubs():
+    """Put offline stand-ins for the Windows/online modules into sys.modules."""
+    sr = types.ModuleType("speech_recognition")
+
+    class UnknownValueError(Exception):
+        pass
+
+    class RequestError(Exception):
+        pass
+
+    class Recognizer:
+        energy_threshold = 300
+
+        def listen(self, source, phrase_time_limit=None):
+            raise UnknownValueError()
+
+        def recognize_google(self, audio):
+            raise UnknownValueError()
+
+    class AudioData:
+        def __init__(self, frame_data, sample_rate, sample_width):
+            self.frame_data = frame_data
+            self.sample_rate = sample_rate
+            self.sample_width = sample_width
+
+    class Microphone:
+        def __init__(self, device_index=None):
+            self.device_index = device_index
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+    sr.UnknownValueError = UnknownValueError
+    sr.RequestError = RequestError
+    sr.Recognizer = Recognizer
+    sr.Microphone = Microphone
+    sr.AudioData = AudioData
+
+    wikipedia = types.ModuleType("wikipedia")
+    exceptions = types.ModuleType("wikipedia.exceptions")
+
+    class PageError(Exception):
+        pass
+
+    class DisambiguationError(Exception):
+        pass
+
+    exceptions.PageError = PageError
+    exceptions.DisambiguationError = DisambiguationError
+    wikipedia.exceptions = exceptions
+    wikipedia.set_lang = lambda lang: None
+
+    def summary(query, sentences=2, auto_suggest=True):
+        # answers anything except nonsense words, like a (very fast) Wikipedia
+        if query.startswith("zz"):
+            raise PageError(query)
+        return f"{query.title()} is a topic with a Wikipedia article."
+
+    wikipedia.summary = summary
+
+    class _Voice:
+        Voice = types.SimpleNamespace(Id="stub")
+        Rate = 0
+        Volume = 100
+        AudioOutputStream = None
+
+        def Speak(self, text, flags=0):
+            return 0
+
+        def WaitUntilDone(self, ms):
+            return True
+
+    class _MemoryStream:
+        def __init__(self):
+            self.Format = types.SimpleNamespace(Type=0)
+
+        def GetData(self):
+            return b"\0\0" * 2205
+
+    win32com = types.ModuleType("win32com")
+    client = types.ModuleType("win32com.client")
+    client.Dispatch = lambda name: _MemoryStream() if name == "SAPI.SpMemoryStream" else _Voice()
+    win32com.client = client
+
+    for name, mod in (("speech_recognition", sr), ("wikipedia", wikipedia),
+                      ("wikipedia.exceptions", exceptions),
+                      ("win32com", win32com), ("win32com.client", client)):
+        sys.modules.setdefault(name, mod)
+
+
+def import_jarvis():
+    """Import jarvis.py with stubs, keeping its state files in a temp folder."""
+    install_stubs()
+    os.chdir(tempfile.mkdtemp(prefix="jarvis_bench_"))
+    if HERE not in sys.path:
+        sys.path.insert(0, HERE)
+    import jarvis
+    return jarvis
+
+
+def rss_mb():
+    """Resident set size of this process in MB (Linux; 0 elsewhere)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError, AttributeError):
+        return 0.0
+
+
+def per_call_us(func, items, repeat=5):
+    """Best-of-``repeat`` average microseconds per call of ``func(item)``."""
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for item in items:
+            func(item)
+        elapsed = (time.perf_counter() - t0) / len(items) * 1e6
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+# ---------------- Routing ---------------------------------------------------------
+def synthetic_intents(count, seed=0):
+    """Generate ``count`` extra intents with 1-3 word phrases from a large vocabulary."""
+    rng = random.Random(seed)
+    vocab = [f"w{n}" for n in range(count * 4 + 50)]
+    intents = []
+    for n in range(count):
+        phrases = [" ".join(rng.sample(vocab, rng.randint(1, 3))) for _ in range(3)]
+        intents.append((f"extra_{n}", rng.randint(20, 60), phrases))
+    return intents
+
+
+def linear_route(table, q):
+    """The old approach: substring test of every phrase, in order."""
+    for intent, _, phrases in table:
+        for phrase in phrases:
+            parts = phrase if isinstance(phrase, tuple) else (phrase,)
+            if all(p.lstrip("^=") in q for p in parts):
+                return intent
+    return None
+
+
+def bench_routing(jarvis, sizes=(0, 100, 300, 1000)):
+    queries = UTTERANCES * 30
+    results = {}
+    print(f"{'intents':>8} {'router us/query':>16} {'linear us/query':>16}")
+    for extra in sizes:
+        table = list(jarvis.INTENTS) + synthetic_intents(extra)
+        r = jarvis.IntentRouter(table)
+        routed = per_call_us(r.route, queries)
+        linear = per_call_us(lambda q: linear_route(table, q), queries)
+        results[len(table)] = {"router_us": routed, "linear_us": linear}
+        print(f"{len(table):>8} {routed:>16.2f} {linear:>16.2f}")
+    return results
+
+
+# ---------------- Fuzzy intent correction -----------------------------------------
+# (heard, meant) pairs of the kind speech recognizers produce for short commands
+MISHEARD = [
+    ("open calculate her", "calculator"), ("pay music", "music"), ("play muse ick", "music"),
+    ("open crome", "chrome"), ("open chrom", "chrome"), ("open what's app", "whatsapp"),
+    ("open what sap", "whatsapp"), ("open you tube", "youtube"), ("open you tube for cats", "youtube"),
+    ("open setting", "settings"), ("open sittings", "settings"), ("open vs coat", "vscode"),
+    ("open visual studio cold", "vscode"), ("open calculators", "calculator"), ("task manger", "task_manager"),
+    ("tusk manager", "task_manager"), ("open command promt", "cmd"), ("command prom", "cmd"),
+    ("open control panal", "control_panel"), ("control panels", "control_panel"),
+    ("cancel shut down", "abort_shutdown"), ("abort shot down", "abort_shutdown"),
+    ("play some musik", "music"), ("play songs by queen", "music"), ("pay music by queen", "music"),
+    ("what time is a", "time"), ("what's the thyme", "time"), ("tell me the tim", "time"),
+    ("what is the dates", "date"), ("independence days", "independence_day"),
+    ("what is my naim", "get_name"), ("whats my name", "get_name"), ("whether", "weather"),
+    ("write a noat", "write_text"), ("right a note", "write_text"), ("right application", "write_application"),
+    ("remind me too call david at 18:00", "reminder"), ("remind me two drink water at 09:30", "reminder"),
+    ("what did i ask yesterday", "history"), ("what did i asked about pakistan", "history"),
+    ("hey jarvis open the calculator please", "calculator"), ("could you open crome", "chrome"),
+]
+
+# things people say that are not commands: correction must leave them alone
+NOT_COMMANDS = [
+    "who is alan turing", "what is photosynthesis", "how are you", "tell me a joke", "good morning",
+    "thank you", "hello there", "what can you do", "who made you", "i am bored", "what is love",
+    "how far is the moon", "tell me about the roman empire", "what is a black hole", "who wrote hamlet",
+    "how do planes fly", "explain gravity", "define entropy", "where is paris", "why is the sky blue",
+    "when was the internet invented", "what is music theory", "who invented the telephone", "what is toga",
+    "tell me about chrome plating", "what is a setting in a story", "who is the king of music", "nice to meet you",
+    "what is the meaning of life", "do you like music", "what is calculus", "how do i make tea",
+    "set the clock forward", "i love music", "you are funny", "what is your favourite colour",
+]
+
+CONFUSIONS = ["pb", "td", "kg", "fv", "sz", "mn", "ae", "ei", "ou", "io"]
+
+
+def noisy_transcript(text, rng):
+    """``text`` with one or two recognizer-style slips: a confused sound, a dropped letter or a split word."""
+    words = text.split()
+    for _ in range(rng.randint(1, 2)):
+        i = rng.randrange(len(words))
+        w = words[i]
+        kind = rng.random()
+        if kind < 0.4:
+            spots = [(n, pair) for n, ch in enumerate(w) for pair in CONFUSIONS if ch in pair]
+            if spots:
+                n, pair = rng.choice(spots)
+                w = w[:n] + pair[1 - pair.index(w[n])] + w[n + 1:]
+        elif kind < 0.7 and len(w) > 3:
+            n = rng.randrange(1, len(w))
+            w = w[:n] + w[n + 1:]
+        elif len(w) > 5:
+            n = rng.randrange(2, len(w) - 2)
+            w = w[:n] + " " + w[n:]
+        words[i] = w
+    return " ".join(words)
+
+
+def table_distance(query, phrase, anchored):
+    """Edit distance from ``phrase`` to ``query``, the textbook way (free start unless ``anchored``)."""
+    row = list(range(len(phrase) + 1))
+    for i, ch in enumerate(query, 1):
+        new = [i if anchored else 0]
+        for j, c in enumerate(phrase, 1):
+            new.append(min(row[j] + 1, new[j - 1] + 1, row[j - 1] + (c != ch)))
+        row = new
+    return row[-1]
+
+
+def final_intent(jarvis, q):
+    """What route_query would act on, without acting."""
+    intent = jarvis.router.route(q)
+    if intent is None or intent == "wiki":
+        corrected = jarvis.correct_intent(q, intent)
+        if corrected is not None:
+            return corrected[0]
+    return intent
+
+
+def bench_fuzzy(jarvis, per_phrase=20, seed=5):
+    """Accuracy and cost of fuzzy intent correction on noisy transcripts of known commands."""
+    rng = random.Random(seed)
+    phrases = list(jarvis.command_phrases(jarvis.INTENTS))
+    corrector = jarvis.get_backend("corrector")
+    synthetic = [(noisy_transcript(text, rng), intent) for intent, text, _, _ in phrases
+                 if len(text.replace(" ", "")) >= 5 for _ in range(per_phrase)]
+    results = {}
+    print(f"{'corpus':>12} {'utterances':>10} {'misrouted':>10} {'router ok':>10} {'corrected ok':>13} "
+          f"{'wrong':>6}")
+    for name, corpus in (("misheard", MISHEARD), ("synthetic", synthetic)):
+        # a slip that leaves the command intact is no test of correction: keep the ones the router gets wrong
+        missed = [(q, want) for q, want in corpus if jarvis.router.route(q) != want]
+        router_ok = sum(jarvis.router.route(q) == want for q, want in corpus)
+        fixed = sum(final_intent(jarvis, q) == want for q, want in corpus)
+        wrong = sum(final_intent(jarvis, q) not in (want, jarvis.router.route(q)) for q, want in missed)
+        results[name] = {"router_pct": 100.0 * router_ok / len(corpus), "corrected_pct": 100.0 * fixed / len(corpus),
+                         "wrong_pct": 100.0 * wrong / max(len(missed), 1)}
+        print(f"{name:>12} {len(corpus):>10} {len(missed):>10} {results[name]['router_pct']:>9.1f}% "
+              f"{results[name]['corrected_pct']:>12.1f}% {results[name]['wrong_pct']:>5.1f}%")
+    changed = [q for q in NOT_COMMANDS if final_intent(jarvis, q) != jarvis.router.route(q)]
+    results["false_corrections"] = len(changed)
+    print(f"not commands: {len(changed)} of {len(NOT_COMMANDS)} changed {changed}")
+
+    heard = [q for q, _ in MISHEARD] + [q for q, _ in synthetic[::10]]
+    results["match_us"] = per_call_us(corrector.match, heard, repeat=3)
+    results["question_us"] = per_call_us(corrector.match, NOT_COMMANDS, repeat=3)
+    # the same distances one phrase at a time, as a plain table per phrase
+    letters = ["".join(w.replace("'", "") for w in jarvis.tokenize(text)) for _, text, _, _ in corrector.entries]
+    spelled = ["".join(w.replace("'", "") for w in jarvis.tokenize(q)) for q in heard]
+    lanes = [corrector._distances(corrector._packed[0], q, [len(q)])[len(q)] for q in spelled]
+    packed = [[d >> (corrector.LANE * p) & 0xFF for p in range(len(letters))] for d in lanes]
+    assert all(packed[n] == [table_distance(q, s, not corrector.entries[p][2]) for p, s in enumerate(letters)]
+               for n, q in enumerate(spelled)), "bit-parallel distances differ"
+    table_us = per_call_us(lambda q: [table_distance(q, s, True) for s in letters], spelled, repeat=3)
+    packed_us = per_call_us(lambda q: corrector._distances(corrector._packed[0], q, [len(q)]), spelled, repeat=3)
+    results["table_us"], results["packed_us"] = table_us, packed_us
+    print(f"match: {results['match_us']:.1f} us/query misheard, {results['question_us']:.1f} us/query not commands; "
+          f"{len(corrector)} phrases, letter distances to all of them {packed_us:.1f} us bit-parallel "
+          f"vs {table_us:.0f} us one table per phrase")
+    return results
+
+
+# ---------------- Wikipedia cache -------------------------------------------------
+def bench_wiki_cache(jarvis, count=500):
+    """Cold (stub fetch + insert) vs warm (cache hit) wiki_summary calls."""
+    jarvis.WIKI_CACHE_FILE = "bench_wiki_cache.db"
+    jarvis._wiki_cache = None
+    queries = [f"who is person number {n}" for n in range(count)]
+    t0 = time.perf_counter()
+    for q in queries:
+        jarvis.wiki_summary(q)
+    cold = (time.perf_counter() - t0) / count * 1e6
+    warm = per_call_us(jarvis.wiki_summary, queries)
+    info = jarvis.get_wiki_cache().info()
+    print(f"cold {cold:.1f} us/query, warm {warm:.1f} us/query, {info}")
+    return {"cold_us": cold, "warm_us": warm}
+
+
+# ---------------- Offline Wikipedia -------------------------------------------------
+def write_abstract_dump(path, articles, redirect_every=5, seed=11):
+    """Synthetic abstracts dump in the enwiki-latest-abstract.xml(.gz) layout, or JSON
+    lines for a .jsonl(.gz) path. Every ``redirect_every``-th page is a redirect
+    ("<title> (alias)" -> an earlier article). Returns the article titles."""
+    rng = random.Random(seed)
+    syllables = ["ka", "ra", "mo", "ti", "len", "zu", "bar", "es", "ol", "vin", "da", "quo", "ny", "sel"]
+    titles = []
+    opener = gzip.open if path.endswith(".gz") else open
+    jsonl = ".jsonl" in path
+    with opener(path, "wt", encoding="utf-8") as f:
+        if not jsonl:
+            f.write("<feed>\n")
+        for n in range(articles):
+            if titles and n % redirect_every == 0:
+                title, target = f"{rng.choice(titles)} (alias {n})", rng.choice(titles)
+                page = {"title": title, "redirect": target}
+                xml = (f"<doc><title>Wikipedia: {html.escape(title)}</title><url>https://en.wikipedia.org/wiki/x</url>"
+                       f"<abstract>#REDIRECT [[{html.escape(target)}]]</abstract><links></links></doc>\n")
+            else:
+                title = " ".join("".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))).capitalize()
+                                 for _ in range(rng.randint(1, 3))) + f" {n}"
+                titles.append(title)
+                text = (f"{title} is a synthetic article number {n}. It exists to exercise the offline index. "
+                        f"A third sentence is never spoken.")
+                page = {"title": title, "abstract": text}
+                xml = (f"<doc><title>Wikipedia: {html.escape(title)}</title><url>https://en.wikipedia.org/wiki/x</url>"
+                       f"<abstract>{html.escape(text)}</abstract><links><sublink linktype=\"nav\"><anchor>History</anchor>"
+                       f"</sublink></links></doc>\n")
+            f.write(json.dumps(page) + "\n" if jsonl else xml)
+        if not jsonl:
+            f.write("</feed>\n")
+    return titles
+
+
+def bench_wiki_offline(jarvis, articles=200_000, chunk_lines=20_000, lookups=2000):
+    """Build time and peak memory for synthetic dumps, then lookup latency (offline vs cached online)."""
+    import tracemalloc
+    dump = os.path.abspath("bench_abstracts.xml.gz")
+    titles = write_abstract_dump(dump, articles)
+    base = os.path.abspath("bench_wiki_offline")
+    t0 = time.perf_counter()
+    stats = jarvis.build_offline_wiki(dump, base, chunk_lines=chunk_lines, progress=None)
+    build_s = time.perf_counter() - t0
+    # peak memory depends on the chunk size, not on the size of the dump
+    peaks = {}
+    for pages in (10_000, 50_000):
+        path = os.path.abspath(f"bench_abstracts_{pages}.xml.gz")
+        write_abstract_dump(path, pages)
+        tracemalloc.start()
+        jarvis.build_offline_wiki(path, os.path.abspath(f"bench_wiki_{pages}"), chunk_lines=5000, progress=None)
+        peaks[pages] = tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.stop()
+    sizes = {ext: os.path.getsize(base + ext) / 1e6 for ext in (".idx", ".dat")}
+    small = os.path.abspath("bench_abstracts_small.jsonl.gz")
+    small_titles = write_abstract_dump(small, 2000)
+    jarvis.build_offline_wiki(small, os.path.abspath("bench_wiki_small"), chunk_lines=300, progress=None)
+
+    wiki = jarvis.OfflineWiki(base)
+    rng = random.Random(3)
+    hits = [f"who is {t}" for t in rng.sample(titles, lookups)]
+    misses = [f"who is zz nobody {n}" for n in range(lookups)]
+    hit_us = per_call_us(lambda q: wiki.summary(q), hits)
+    miss_us = per_call_us(lambda q: wiki.summary(q), misses)
+    # the same questions through the cached online path (the stand-in API answers instantly)
+    jarvis.WIKI_CACHE_FILE = "bench_wiki_offline_cache.db"
+    jarvis._wiki_cache = None
+    for q in hits:
+        jarvis.wiki_summary(q)
+    cached_us = per_call_us(jarvis.wiki_summary, hits)
+
+    checks = [wiki.summary(f"tell me about {titles[7]}") is not None,
+              wiki.summary("who is " + titles[7].lower() + "?") == wiki.summary(titles[7]),
+              wiki.summary("zz nobody") is None,
+              jarvis.OfflineWiki(os.path.abspath("bench_wiki_small")).summary(small_titles[-1]) is not None]
+    # a redirect answers with its target's abstract
+    with gzip.open(dump, "rt", encoding="utf-8") as f:
+        alias = next(line for line in f if "#REDIRECT" in line)
+    alias_title = html.unescape(alias.split("<title>Wikipedia: ")[1].split("</title>")[0])
+    target = html.unescape(alias.split("#REDIRECT [[")[1].split("]]")[0])
+    checks.append(wiki.abstract(alias_title) == wiki.abstract(target) is not None)
+    print(f"{articles} pages: built in {build_s:.1f} s ({articles / build_s:.0f} pages/s); "
+          f"index {sizes['.idx']:.1f} MB + abstracts {sizes['.dat']:.1f} MB; {stats}")
+    print("peak traced memory with 5000-line chunks: "
+          + ", ".join(f"{pages} pages {mb:.1f} MB" for pages, mb in peaks.items()))
+    print(f"lookup: hit {hit_us:.1f} us, miss {miss_us:.1f} us | cached online path {cached_us:.1f} us")
+    if not all(checks):
+        raise RuntimeError(f"offline Wikipedia answered wrongly: {checks}")
+    wiki.close()
+    return {"build_s": build_s, "peak_mb": max(peaks.values()), "hit_us": hit_us, "miss_us": miss_us, "cached_online_us": cached_us}
+
+
+# ---------------- Speech output ---------------------------------------------------
+def bench_tts(jarvis, chars_per_second=2000):
+    """How long the main loop is blocked by a long answer: old blocking call vs queue."""
+    text = jarvis.get_knowledge_base().get("pakistan", "history")
+    backend = jarvis.NullBackend(chars_per_second)
+    t0 = time.perf_counter()
+    backend.say(text, lambda: False)       # old speak(): whole text, synchronously
+    blocking_ms = (time.perf_counter() - t0) * 1000.0
+    out = jarvis.SpeechOutput(jarvis.NullBackend(chars_per_second))
+    t0 = time.perf_counter()
+    out.say(text)
+    queued_ms = (time.perf_counter() - t0) * 1000.0
+    out.wait()
+    first_ms = out.first_audio_ms[-1]
+    print(f"main loop blocked: {blocking_ms:.1f} ms (blocking) vs {queued_ms:.3f} ms (queued); "
+          f"first audio after {first_ms:.2f} ms")
+    return {"blocking_ms": blocking_ms, "queued_ms": queued_ms, "first_audio_ms": first_ms}
+
+
+# ---------------- Music index -----------------------------------------------------
+def make_music_tree(root, files=100_000, per_dir=100, seed=0):
+    """Generate artist/album folders of empty .mp3 files (plus some cover art)."""
+    rng = random.Random(seed)
+    made = 0
+    artist = 0
+    while made < files:
+        album_dir = os.path.join(root, f"artist {artist}", f"album {rng.randint(0, 9999)}")
+        os.makedirs(album_dir, exist_ok=True)
+        for n in range(per_dir):
+            open(os.path.join(album_dir, f"track {n} song {made}.mp3"), "wb").close()
+            made += 1
+        open(os.path.join(album_dir, "cover.jpg"), "wb").close()
+        artist += 1
+    return made
+
+
+def old_music_pick(folder):
+    """The old play_random_music: walk everything, then pick."""
+    files = []
+    for root, _, filenames in os.walk(folder):
+        for fn in filenames:
+            if fn.lower().endswith((".mp3", ".wav")):
+                files.append(os.path.join(root, fn))
+    return random.choice(files)
+
+
+def bench_music(jarvis, files=100_000):
+    root = os.path.abspath("music_tree")
+    if not os.path.isdir(root):
+        make_music_tree(root, files)
+    t0 = time.perf_counter()
+    old_music_pick(root)
+    walk_ms = (time.perf_counter() - t0) * 1000.0
+    index = jarvis.MusicIndex(root, "bench_music_index.json.gz")
+    t0 = time.perf_counter()
+    index.rescan()
+    build_ms = (time.perf_counter() - t0) * 1000.0
+    t0 = time.perf_counter()
+    listed = index.rescan()
+    rescan_ms = (time.perf_counter() - t0) * 1000.0
+    t0 = time.perf_counter()
+    reloaded = jarvis.MusicIndex(root, "bench_music_index.json.gz")
+    load_ms = (time.perf_counter() - t0) * 1000.0
+    pick_us = per_call_us(lambda _: reloaded.pick(), range(10000))
+    t0 = time.perf_counter()
+    reloaded.pick(query="artist 7")
+    first_filter_ms = (time.perf_counter() - t0) * 1000.0
+    filter_us = per_call_us(lambda n: reloaded.pick(query=f"artist {n}"), range(200))
+    size_kb = os.path.getsize("bench_music_index.json.gz") / 1024.0
+    print(f"{len(reloaded.tracks)} tracks: os.walk pick {walk_ms:.0f} ms | index build {build_ms:.0f} ms, "
+          f"unchanged rescan {rescan_ms:.0f} ms ({listed} dirs listed), load {load_ms:.0f} ms, "
+          f"{size_kb:.0f} KiB on disk")
+    print(f"random pick {pick_us:.2f} us, filtered pick {filter_us:.1f} us "
+          f"(first filtered pick builds word index: {first_filter_ms:.0f} ms)")
+    return {"walk_ms": walk_ms, "build_ms": build_ms, "rescan_ms": rescan_ms, "load_ms": load_ms,
+            "pick_us": pick_us, "filter_us": filter_us}
+
+
+# ---------------- Knowledge base --------------------------------------------------
+def synthetic_knowledge(count, topics=500, seed=0):
+    """(topic, key, keywords, answer) entries drawn from a 20k-word vocabulary."""
+    rng = random.Random(seed)
+    vocab = [f"v{n}" for n in range(20000)]
+    entries = []
+    for n in range(count):
+        topic = f"topic{n % topics}"
+        words = rng.sample(vocab, 4)
+        entries.append((topic, f"fact {n}", words, f"Answer number {n} about {topic}: " + " ".join(words)))
+    return entries
+
+
+def bench_knowledge(jarvis, sizes=(1000, 10000, 50000)):
+    rng = random.Random(1)
+    results = {}
+    for count in sizes:
+        entries = synthetic_knowledge(count)
+        path = f"bench_knowledge_{count}.idx"
+        t0 = time.perf_counter()
+        jarvis.build_knowledge_index([], path, entries=entries)
+        build_ms = (time.perf_counter() - t0) * 1000.0
+        t0 = time.perf_counter()
+        kb = jarvis.KnowledgeBase(path)
+        open_ms = (time.perf_counter() - t0) * 1000.0
+        queries = []
+        for _ in range(500):
+            topic, _, words, _ = entries[rng.randrange(count)]
+            queries.append(f"what is {words[0]} {words[2]} in {topic}")
+        lookup_us = per_call_us(kb.search, queries)
+        hit = kb.search(queries[0])
+        results[count] = {"build_ms": build_ms, "open_ms": open_ms, "lookup_us": lookup_us}
+        print(f"{count:>6} entries: build {build_ms:.0f} ms, open {open_ms:.1f} ms, "
+              f"{os.path.getsize(path) / 1024.0:.0f} KiB, lookup {lookup_us:.1f} us ({bool(hit)})")
+        kb.close()
+    return results
+
+
+def bench_pakistan(jarvis):
+    hits = [u for u in UTTERANCES if "pakistan" in u] * 50
+    misses = [u for u in UTTERANCES if "pakistan" not in u] * 10
+    hit_us = per_call_us(jarvis.get_pakistan_answer, hits)
+    miss_us = per_call_us(jarvis.get_pakistan_answer, misses)
+    print(f"get_pakistan_answer: {hit_us:.1f} us (matching), {miss_us:.1f} us (other utterances)")
+    return {"hit_us": hit_us, "miss_us": miss_us}
+
+
+# ---------------- Chat fallback ---------------------------------------------------
+def synthetic_pairs(count, seed=0):
+    """(prompt, response) pairs made of 3-6 random words from a 5k-word vocabulary."""
+    rng = random.Random(seed)
+    letters = "etaoinshrdlucmfwypvbgk"
+    vocab = ["".join(rng.choice(letters) for _ in range(rng.randint(3, 8))) for _ in range(5000)]
+    return [(" ".join(rng.sample(vocab, rng.randint(3, 6))), f"response {n}") for n in range(count)]
+
+
+def bench_chat(jarvis, sizes=(1000, 10000, 100000), queries=200):
+    rng = random.Random(2)
+    results = {}
+    try:
+        from chatterbot import ChatBot
+        from chatterbot.trainers import ListTrainer
+    except Exception:
+        ChatBot = None
+        print("(ChatterBot not installed: only the retrieval responder is measured)")
+    for count in sizes:
+        pairs = synthetic_pairs(count)
+        asked = [pairs[rng.randrange(count)][0] for _ in range(queries)]
+        rss0 = rss_mb()
+        t0 = time.perf_counter()
+        responder = jarvis.RetrievalResponder(pairs)
+        build_s = time.perf_counter() - t0
+        mem_mb = rss_mb() - rss0
+        query_us = per_call_us(responder.respond, asked, repeat=3)
+        row = {"retrieval_build_s": build_s, "retrieval_query_us": query_us, "retrieval_mem_mb": mem_mb}
+        line = (f"{count:>7} pairs: retrieval build {build_s:.2f} s, {query_us:.0f} us/query, "
+                f"+{mem_mb:.1f} MB RSS (numpy: {responder._np is not None})")
+        if ChatBot is not None:
+            db = f"bench_chat_{count}.sqlite3"
+            bot = ChatBot(f"bench{count}", database_uri=f"sqlite:///{db}")
+            trainer = ListTrainer(bot, show_training_progress=False)
+            t0 = time.perf_counter()
+            jarvis.bulk_train(bot, trainer, [list(p) for p in pairs])
+            train_s = time.perf_counter() - t0
+            sample = asked[:20]
+            t0 = time.perf_counter()
+            for q in sample:
+                bot.get_response(q)
+            bot_ms = (time.perf_counter() - t0) / len(sample) * 1000.0
+            row.update(chatterbot_train_s=train_s, chatterbot_query_ms=bot_ms,
+                       chatterbot_db_mb=os.path.getsize(db) / 1e6)
+            line += f" | chatterbot train {train_s:.1f} s, {bot_ms:.1f} ms/query, db {row['chatterbot_db_mb']:.1f} MB"
+        print(line)
+        results[count] = row
+    return results
+
+
+# ---------------- Listening -------------------------------------------------------
+LISTEN_SCRIPT = ["open chrome", "what time is it", "who is alan turing"]
+
+
+def write_phrase_wav(path, transcripts, rate=16000, lead=1.5, speech=1.2, gap=1.5):
+    """WAV fixture: silence, then one tone burst per transcript (plus a transcript .txt).
+
+    Returns the end time (seconds into the file) of each burst.
+    """
+    ends, samples = [], array.array("h", [0] * int(lead * rate))
+    for n, _ in enumerate(transcripts):
+        freq = 300 + 100 * n
+        samples.extend(int(3000 * math.sin(2 * math.pi * freq * i / rate)) for i in range(int(speech * rate)))
+        ends.append(len(samples) / rate)
+        samples.extend([0] * int(gap * rate))
+    with wave.open(path, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(samples.tobytes())
+    with open(os.path.splitext(path)[0] + ".txt", "w", encoding="utf-8") as f:
+        f.write("\n".join(transcripts) + "\n")
+    return ends
+
+
+def bench_listen(jarvis):
+    """End to end from a WAV fixture (played in real time) through the streaming decoder:
+    when does listen() return, relative to the end of each spoken phrase?"""
+    path = os.path.abspath("bench_listen.wav")
+    ends = write_phrase_wav(path, LISTEN_SCRIPT)
+    jarvis.AUDIO_SOURCE = path
+    jarvis.RECOGNIZER = "script"
+    results = {}
+    for early in (False, True):
+        jarvis.EARLY_ROUTING = early
+        jarvis._backends.pop("recognizer", None)
+        jarvis._capture = None
+        t0 = time.perf_counter()
+        session = jarvis.get_capture_session(jarvis.get_backend("recognizer"))
+        heard, after = [], []
+        for end in ends:
+            heard.append(jarvis.listen())
+            after.append((time.perf_counter() - t0 - end) * 1000.0)
+        session.close()
+        # an early answer is a prefix of the phrase that already names the same command
+        if [jarvis.router.route(t) for t in heard] != [jarvis.router.route(t) for t in LISTEN_SCRIPT]:
+            raise RuntimeError(f"heard {heard!r}, expected {LISTEN_SCRIPT!r}")
+        key = "early" if early else "final"
+        results[key] = {"_".join(text.split()[:2]) + "_ms": ms for text, ms in zip(LISTEN_SCRIPT, after)}
+        print(f"{key:>5}: " + ", ".join(f"{t!r} {ms:+.0f} ms" for t, ms in zip(heard, after))
+              + f" after the phrase ended ({session.phrase_sink.partials} partials, "
+                f"{session.phrase_sink.early_hits} early)")
+    return results
+
+
+# ---------------- Voice activity gate ---------------------------------------------
+def write_room_wav(path, seconds=120, rate=16000, seed=3):
+    """WAV fixture of a room: faint noise with clicks, hiss and bumps every few
+    seconds, and a spoken-like phrase (harmonics at syllable rate) now and then.
+
+    Returns the number of phrases in it.
+    """
+    rng = random.Random(seed)
+    samples = array.array("h", (rng.randint(-40, 40) for _ in range(seconds * rate)))
+    phrases, t = 0, 2.0
+    while t < seconds - 3:
+        start = int(t * rate)
+        kind = rng.choice(["click", "hiss", "bump", "speech", "speech"])
+        if kind == "click":
+            for i in range(int(0.005 * rate)):
+                samples[start + i] = rng.choice((-8000, 8000))
+        elif kind == "hiss":
+            for i in range(int(0.3 * rate)):
+                samples[start + i] = rng.randint(-2500, 2500)
+        elif kind == "bump":
+            for i in range(int(0.08 * rate)):
+                samples[start + i] = int(6000 * math.sin(2 * math.pi * 40 * i / rate))
+        else:
+            phrases += 1
+            for i in range(int(1.2 * rate)):
+                x = i / rate
+                envelope = 0.55 + 0.45 * math.sin(2 * math.pi * 4 * x)
+                v = math.sin(2 * math.pi * 180 * x) + 0.5 * math.sin(2 * math.pi * 360 * x)
+                samples[start + i] = int(2500 * envelope * v)
+        t += rng.uniform(2.5, 5.0)
+    with wave.open(path, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(samples.tobytes())
+    return phrases
+
+
+def capture_stats(jarvis, path, vad):
+    session = jarvis.CaptureSession(jarvis.WavFileSource(path), vad=vad, keep_for=3600)
+    cpu0 = time.process_time()
+    sent = 0
+    while True:
+        pcm = session.next_phrase()
+        if pcm is None:
+            break
+        sent += len(pcm)
+    cpu = time.process_time() - cpu0
+    session.close()
+    return session.phrases_emitted, session.phrases_rejected, sent / (session.rate * 2), cpu
+
+
+def bench_vad(jarvis, seconds=120):
+    """Recognizer calls per hour and capture CPU, energy-only vs the VAD gate."""
+    path = os.path.abspath("bench_room.wav")
+    spoken = write_room_wav(path, seconds)
+    per_hour = 3600.0 / seconds
+    results = {}
+    rate = jarvis.WavFileSource(path).SAMPLE_RATE
+    numpy_vad = jarvis.VoiceActivityDetector(rate)
+    plain_vad = jarvis.VoiceActivityDetector(rate)
+    plain_vad._np = None
+    modes = [("energy_only", None), ("vad", numpy_vad)]
+    if numpy_vad._np is not None:
+        modes.append(("vad_pure_python", plain_vad))
+    print(f"{seconds} s fixture with {spoken} spoken phrases")
+    for name, vad in modes:
+        emitted, rejected, audio_s, cpu = capture_stats(jarvis, path, vad)
+        results[name] = {"calls_per_hour": emitted * per_hour, "audio_s_per_hour": audio_s * per_hour,
+                         "cpu_s_per_hour": cpu * per_hour, "rejected_per_hour": rejected * per_hour}
+        print(f"{name:>16}: {emitted * per_hour:6.0f} recognizer calls/h ({spoken * per_hour:.0f} real), "
+              f"{audio_s * per_hour / 60:5.1f} min audio sent/h, capture CPU {cpu * per_hour:5.1f} s/h "
+              f"({cpu / seconds:.2%}), {rejected * per_hour:.0f} rejected/h")
+    return results
+
+
+# ---------------- Weather ---------------------------------------------------------
+class FakeWeatherServer:
+    """Local stand-in for api.openweathermap.org/data/2.5/weather (same JSON shape).
+
+    ``latency`` seconds are added to every answer; set ``failing`` to answer 503.
+    Counts requests and TCP connections.
+    """
+
+    def __init__(self, latency=0.05):
+        self.latency = latency
+        self.failing = False
+        self.requests = 0
+        self.connections = set()
+        owner = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"     # keep-alive
+
+            def do_GET(self):
+                owner.requests += 1
+                owner.connections.add(self.client_address)
+                time.sleep(owner.latency)
+                city = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query).get("q", [""])[0]
+                if owner.failing:
+                    status, data = 503, {"cod": 503, "message": "service unavailable"}
+                elif city.lower().startswith("zz"):
+                    status, data = 404, {"cod": "404", "message": "city not found"}
+                else:
+                    status, data = 200, {"cod": 200, "name": city.title(),
+                                         "weather": [{"description": "clear sky"}],
+                                         "main": {"temp": 31.5, "humidity": 40}}
+                body = json.dumps(data).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/data/2.5"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def old_weather(base_url, city):
+    """The old _weather(): a new connection per question."""
+    url = f"{base_url}/weather?q={city}&appid=key&units=metric"
+    try:
+        import requests
+        return requests.get(url, timeout=8).json()
+    except ImportError:
+        with urllib.request.urlopen(url, timeout=8) as r:
+            return json.loads(r.read())
+
+
+def bench_weather(jarvis, questions=50):
+    fake = FakeWeatherServer(latency=0.05)
+    t0 = time.perf_counter()
+    for _ in range(questions):
+        old_weather(fake.url, "Islamabad")
+    old_ms = (time.perf_counter() - t0) / questions * 1000.0
+    old_conns = len(fake.connections)
+    fake.connections.clear()
+
+    service = jarvis.WeatherService("key", fake.url, ttl=1.0, refresh_ahead=0.4)
+    t0 = time.perf_counter()
+    first = service.describe("Islamabad")
+    cold_ms = (time.perf_counter() - t0) * 1000.0
+    warm_us = per_call_us(lambda _: service.describe("Islamabad"), range(questions))
+    time.sleep(1.5)              # past the TTL: the refresher should have kept it current
+    t0 = time.perf_counter()
+    service.describe("Islamabad")
+    after_ttl_ms = (time.perf_counter() - t0) * 1000.0
+    fake.failing = True
+    time.sleep(1.2)
+    stale = service.describe("Islamabad")
+    fake.failing = False
+    missing = service.describe("zzz nowhere")
+    fake.close()
+    print(f"old: {old_ms:.1f} ms/question, {old_conns} connections for {questions} questions")
+    print(f"service: first {cold_ms:.1f} ms, cached {warm_us:.1f} us, after the TTL {after_ttl_ms:.2f} ms "
+          f"(refreshed in the background), {len(fake.connections)} connection(s); {service.stats}")
+    print(f"  {first!r}\n  while down: {stale!r}\n  unknown city: {missing!r}")
+    if "couldn't reach" not in stale:
+        raise RuntimeError("stale observation was not served")
+    return {"old_ms": old_ms, "cold_ms": cold_ms, "cached_us": warm_us, "after_ttl_ms": after_ttl_ms}
+
+
+# ---------------- Fallback resolution ---------------------------------------------
+def old_fallback(jarvis, q):
+    """The old chain: knowledge base, then Wikipedia, then the chatbot, one after another."""
+    for name in ("knowledge", "wikipedia", "chat"):
+        answer = jarvis.FALLBACK_RESOLVERS[name](q)
+        if answer:
+            return name
+    return None
+
+
+def bench_fallback(jarvis, deadline=1.0):
+    """Time to answer a "who is" question while Wikipedia is slow, failing or hanging."""
+    jarvis.CHAT_RESPONDER = "retrieval"
+    original = dict(jarvis.FALLBACK_RESOLVERS)
+    chat = lambda q: (time.sleep(0.02), "A chat answer.")[1]
+
+    def wiki(delay, answer):
+        return lambda q: (time.sleep(delay), answer)[1]
+
+    scenarios = {"wiki_fast": wiki(0.05, "A summary."), "wiki_slow": wiki(0.6, "A summary."),
+                 "wiki_fails": wiki(0.6, None), "wiki_hangs": wiki(3.0, "A summary.")}
+    results = {}
+    q = "who is somebody nobody knows"
+    try:
+        jarvis.FALLBACK_RESOLVERS["chat"] = chat
+        for name, resolver in scenarios.items():
+            jarvis.FALLBACK_RESOLVERS["wikipedia"] = resolver
+            t0 = time.perf_counter()
+            old = old_fallback(jarvis, q)
+            old_ms = (time.perf_counter() - t0) * 1000.0
+            t0 = time.perf_counter()
+            new = jarvis.resolve_fallbacks(q, jarvis.FALLBACK_ORDER["wiki"], deadline=deadline)[0]
+            new_ms = (time.perf_counter() - t0) * 1000.0
+            results[name] = {"old_ms": old_ms, "new_ms": new_ms}
+            print(f"{name:>11}: sequential {old_ms:6.0f} ms ({old}) | concurrent {new_ms:6.0f} ms ({new}), "
+                  f"deadline {deadline * 1000:.0f} ms")
+    finally:
+        jarvis.FALLBACK_RESOLVERS.update(original)
+    return results
+
+
+# ---------------- Actions ---------------------------------------------------------
+def bench_actions(jarvis, hang=0.5):
+    """Voice-loop time spent on commands, duplicate launches, and real child processes."""
+    py = sys.executable
+
+    class BenchPlatform(jarvis.LinuxPlatform):
+        COMMANDS = {
+            "calculator": ("launch", [py, "-c", "import time; time.sleep(1.0)"]),
+            "lock": ("wait", [py, "-c", "import time; time.sleep(30)"]),
+            "logoff": ("wait", [py, "-c", "raise SystemExit(3)"]),
+            "abort_shutdown": ("wait", [py, "-c", "pass"]),
+        }
+
+    # the old helpers ran system commands with os.system(), holding up the loop
+    t0 = time.perf_counter()
+    subprocess.run([py, "-c", f"import time; time.sleep({hang})"])
+    old_ms = (time.perf_counter() - t0) * 1000.0
+
+    recording = jarvis.RecordingPlatform(behaviour={"shutdown": (0, hang)})
+    executor = jarvis.ActionExecutor(recording, dedupe_window=1.0)
+    t0 = time.perf_counter()
+    future = executor.run("shutdown", delay=60)
+    call_us = (time.perf_counter() - t0) * 1e6
+    future.result()
+    for _ in range(5):
+        executor.run("calculator")
+    executor.close()
+    launches = sum(1 for _, argv in recording.log if argv == ["gnome-calculator"])
+    collapsed = executor.stats["deduplicated"]
+
+    events = []
+    done = threading.Event()
+
+    def on_status(action, status, detail):
+        events.append((action, status, detail))
+        if len(events) == 5:
+            done.set()
+
+    executor = jarvis.ActionExecutor(BenchPlatform(), timeout=0.5, on_status=on_status)
+    executor.REAP_INTERVAL = 0.1
+    t0 = time.perf_counter()
+    for action in ("calculator", "lock", "logoff", "abort_shutdown"):
+        executor.run(action)
+    real_call_ms = (time.perf_counter() - t0) * 1000.0
+    done.wait(5.0)
+    executor.close()
+    print(f"blocking command: old {old_ms:.0f} ms in the voice loop, now {call_us:.0f} us to queue")
+    print(f"5 rapid 'open calculator': {launches} launch(es), {collapsed} collapsed")
+    print(f"real processes queued in {real_call_ms:.2f} ms; reported:")
+    for event in events:
+        print("  ", *event)
+    expected = {("calculator", "ok"), ("calculator", "exited"), ("lock", "timed_out"),
+                ("logoff", "failed"), ("abort_shutdown", "ok")}
+    if launches != 1 or {(a, s) for a, s, _ in events} != expected:
+        raise RuntimeError("action executor misreported")
+    return {"old_blocking_ms": old_ms, "queue_us": call_us, "real_queue_ms": real_call_ms}
+
+
+# ---------------- Whole queries ---------------------------------------------------
+def bench_query(jarvis, rounds=20):
+    """handle_query on the mixed corpus, with actions recorded instead of performed."""
+    jarvis.CHAT_RESPONDER = "retrieval"     # same answers whether or not ChatterBot is installed
+    jarvis.MUSIC_FOLDER = tempfile.mkdtemp(prefix="music_")
+    jarvis._batch_init()                    # dry run: "shutdown" must not shut anything down
+    t0 = time.perf_counter()
+    for u in UTTERANCES:
+        jarvis.handle_query(u)
+    first_pass_ms = (time.perf_counter() - t0) * 1000.0
+    queries = UTTERANCES * rounds
+    us = per_call_us(jarvis.handle_query, queries, repeat=3)
+    slowest = max(UTTERANCES, key=lambda u: per_call_us(jarvis.handle_query, [u], repeat=3))
+    jarvis.actions.take()
+    print(f"{us:.1f} us/query ({1e6 / us:.0f} queries/s); first pass with backend loading "
+          f"{first_pass_ms:.0f} ms; slowest utterance: {slowest!r}")
+    return {"query_us": us, "queries_per_s": 1e6 / us, "first_pass_ms": first_pass_ms}
+
+
+# ---------------- Persistence -----------------------------------------------------
+def bench_memory(jarvis, sizes=(0, 1000, 10000, 50000), saves=30):
+    """save_memory latency (one change + flush) as chat_history and reminders grow."""
+    store = jarvis.MemoryStore("bench_memory.json", defaults={"chat_history": [], "reminders": []})
+    results = {}
+    print(f"{'entries':>8} {'p50 ms':>8} {'p95 ms':>8} {'full rewrite ms':>16}")
+    for size in sizes:
+        for n in range(len(store.data["chat_history"]), size):
+            store.append("chat_history", {"q": f"question {n}", "a": f"answer number {n}"})
+            store.append("reminders", {"id": f"r{n}", "text": f"reminder {n}", "time": "18:00"})
+        store.flush(timeout=60)
+        times = []
+        for n in range(saves):
+            t0 = time.perf_counter()
+            store.append("chat_history", {"q": "how are you", "a": "I am fine, thank you!"})
+            store.flush()
+            times.append((time.perf_counter() - t0) * 1000.0)
+            store.remove("chat_history", {"q": "how are you", "a": "I am fine, thank you!"})
+            store.flush()
+        times.sort()
+        # the old save_memory(): rewrite the whole JSON file
+        t0 = time.perf_counter()
+        with open("bench_memory_full.json", "w", encoding="utf-8") as f:
+            json.dump(store.data, f, indent=4, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        full_ms = (time.perf_counter() - t0) * 1000.0
+        p50, p95 = times[len(times) // 2], times[min(len(times) - 1, int(len(times) * 0.95))]
+        results[size] = {"save_p50_ms": p50, "save_p95_ms": p95, "full_rewrite_ms": full_ms}
+        print(f"{size:>8} {p50:>8.2f} {p95:>8.2f} {full_ms:>16.2f}")
+    store.close()
+    return results
+
+
+# ---------------- Reminders -------------------------------------------------------
+def bench_history(jarvis, sizes=(10000, 100000), days=200):
+    """Chat history: RAM and load time, old in-memory list vs the segmented archive, plus lookups."""
+    import tracemalloc
+    rng = random.Random(5)
+    words = sorted({w for u in UTTERANCES for w in u.split()})
+    reply = "Pakistan is a country in South Asia. " * 3
+    now = time.time()
+    results = {}
+    print(f"{'turns':>7} {'old RAM MB':>11} {'old load ms':>12} {'RAM MB':>7} {'open ms':>8} "
+          f"{'add us':>7} {'disk MB':>8} {'yesterday ms':>13} {'search ms':>10}")
+    for size in sizes:
+        turns = [{"q": " ".join(rng.choice(words) for _ in range(5)), "a": reply, "intent": "wiki",
+                  "ts": now - days * 86400 + i * days * 86400 / size} for i in range(size)]
+        # old: the whole list inside the memory document
+        with open("bench_history_old.json", "w", encoding="utf-8") as f:
+            json.dump({"chat_history": turns}, f)
+        def load_old():
+            with open("bench_history_old.json", "r", encoding="utf-8") as f:
+                return json.load(f)
+        t0 = time.perf_counter()
+        load_old()
+        old_ms = (time.perf_counter() - t0) * 1000.0
+        tracemalloc.start()
+        old = load_old()
+        old_mb = tracemalloc.get_traced_memory()[0] / 1e6
+        tracemalloc.stop()
+        del old
+
+        path = tempfile.mkdtemp(prefix="history_", dir=".")
+        archive = jarvis.ChatArchive(path)
+        t0 = time.perf_counter()
+        for t in turns:
+            archive.add(t["q"], t["a"], t["intent"], ts=t["ts"])
+        add_us = (time.perf_counter() - t0) / size * 1e6
+        archive.close()
+        t0 = time.perf_counter()
+        jarvis.ChatArchive(path).close()
+        open_ms = (time.perf_counter() - t0) * 1000.0
+        tracemalloc.start()
+        archive = jarvis.ChatArchive(path)
+        new_mb = tracemalloc.get_traced_memory()[0] / 1e6
+        tracemalloc.stop()
+        disk_mb = sum(os.path.getsize(os.path.join(path, n)) for n in os.listdir(path)) / 1e6
+        jarvis._backends["history"] = archive
+        t0 = time.perf_counter()
+        answer = jarvis.handle_query("what did i ask about yesterday")
+        yesterday_ms = (time.perf_counter() - t0) * 1000.0
+        t0 = time.perf_counter()
+        jarvis.handle_query("when did i ask about the weather")
+        search_ms = (time.perf_counter() - t0) * 1000.0
+        archive.close()
+        print(f"{size:>7} {old_mb:>11.1f} {old_ms:>12.1f} {new_mb:>7.2f} {open_ms:>8.1f} "
+              f"{add_us:>7.1f} {disk_mb:>8.1f} {yesterday_ms:>13.2f} {search_ms:>10.2f}")
+        results[str(size)] = {"old_ram_mb": old_mb, "old_load_ms": old_ms, "ram_mb": new_mb, "open_ms": open_ms,
+                              "add_us": add_us, "yesterday_ms": yesterday_ms, "search_ms": search_ms}
+    jarvis._backends.pop("history", None)
+    print("  " + answer[:150])
+    return results
+
+
+def old_reminder_scan(reminders, now):
+    """The old reminder thread body: compare every reminder with the current HH:MM."""
+    hhmm = now.strftime("%H:%M")
+    return [rem for rem in reminders if rem.get("time") == hhmm]
+
+
+def bench_reminders(jarvis, sizes=(100, 10000, 100000)):
+    """Cost of checking for due reminders with many scheduled (none of them due)."""
+    start = datetime.datetime(2024, 1, 1, 9, 0)
+    delta = datetime.timedelta
+    results = {}
+    for count in sizes:
+        clock = [start]
+        sched = jarvis.ReminderScheduler(now=lambda: clock[0])
+        reminders = []
+        t0 = time.perf_counter()
+        for n in range(count):
+            due = start + delta(minutes=1 + n % 1440, days=n // 1440)
+            sched.schedule(f"r{n}", due, lambda job_id, due: None,
+                           repeat=delta(days=1) if n % 10 == 0 else None)
+            reminders.append({"id": f"r{n}", "time": due.strftime("%H:%M")})
+        schedule_us = (time.perf_counter() - t0) / count * 1e6
+        check_us = per_call_us(lambda _: sched.run_pending(), range(1000))
+        old_us = per_call_us(lambda _: old_reminder_scan(reminders, start), range(20))
+        clock[0] = start + delta(minutes=61)
+        t0 = time.perf_counter()
+        fired = sched.run_pending()
+        fire_us = (time.perf_counter() - t0) / max(1, fired) * 1e6
+        results[count] = {"schedule_us": schedule_us, "check_us": check_us,
+                          "old_scan_us": old_us, "fire_us": fire_us}
+        print(f"{count:>7} reminders: schedule {schedule_us:.2f} us each, check {check_us:.2f} us "
+              f"(old full scan {old_us:.0f} us), fire {fire_us:.1f} us each ({fired} due)")
+    return results
+
+
+# ---------------- Startup ---------------------------------------------------------
+STARTUP_PROBE = r"""
+import os, sys, json, time
+t_start = time.perf_counter()
+sys.path.insert(0, {here!r})
+import jarvis_bench
+jarvis_bench.install_stubs()
+t0 = time.perf_counter()
+import jarvis
+import_ms = (time.perf_counter() - t0) * 1000.0
+jarvis.STARTUP_REPORT = False
+jarvis.STARTUP_LOG_FILE = ""
+jarvis.open_memory().set("name", "bench")   # skip the "what's your name" exchange
+
+def first_prompt():
+    print(json.dumps({{"import_ms": import_ms,
+                      "first_prompt_ms": (time.perf_counter() - t_start) * 1000.0}}), flush=True)
+    os._exit(0)
+
+jarvis.mark_first_prompt = first_prompt
+jarvis.main_loop()
+"""
+
+
+def bench_startup(jarvis, runs=5):
+    """Cold import of jarvis.py and time to the first "Please say your command." (fresh processes)."""
+    code = STARTUP_PROBE.format(here=HERE)
+    rows = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, timeout=120)
+        process_ms = (time.perf_counter() - t0) * 1000.0
+        line = out.stdout.strip().splitlines()[-1] if out.stdout.strip() else ""
+        if not line.startswith("{"):
+            raise RuntimeError("startup probe failed: " + (out.stderr or out.stdout)[-500:])
+        rows.append(dict(json.loads(line), process_ms=process_ms))
+    best = {k: min(r[k] for r in rows) for k in rows[0]}
+    print(f"import jarvis {best['import_ms']:.0f} ms, first prompt after {best['first_prompt_ms']:.0f} ms "
+          f"(whole process incl. interpreter: {best['process_ms']:.0f} ms), best of {runs}")
+    return best
+
+
+DAEMON_PROBE = r"""
+import sys, tempfile
+sys.path.insert(0, {here!r})
+import jarvis_bench
+jarvis = jarvis_bench.import_jarvis()
+jarvis.CHAT_RESPONDER = "retrieval"
+jarvis.MUSIC_FOLDER = tempfile.mkdtemp(prefix="music_")
+jarvis.actions = jarvis.ActionExecutor(jarvis.RecordingPlatform())   # "shutdown" must not shut down
+jarvis.DAEMON_TOKEN_FILE = {token_file!r}
+jarvis.run_daemon({addresses!r})
+"""
+
+
+async def http_client(port, token, client, queries, latencies):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    for q in queries:
+        body = json.dumps({"client": client, "q": q}).encode("utf-8")
+        t0 = time.perf_counter()
+        writer.write(b"POST /query HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                     b"Authorization: Bearer %s\r\nContent-Length: %d\r\n\r\n" % (token.encode(), len(body)) + body)
+        await writer.drain()
+        status = await reader.readline()
+        length = 0
+        while True:
+            header = await reader.readline()
+            if header in (b"\r\n", b""):
+                break
+            if header.lower().startswith(b"content-length:"):
+                length = int(header.split(b":", 1)[1])
+        json.loads(await reader.readexactly(length))
+        if b" 200 " not in status:
+            raise RuntimeError(f"daemon answered {status!r}")
+        latencies.append((time.perf_counter() - t0) * 1000.0)
+    writer.close()
+
+
+async def unix_client(path, client, queries, latencies):
+    reader, writer = await asyncio.open_unix_connection(path)
+    for q in queries:
+        t0 = time.perf_counter()
+        writer.write(json.dumps({"client": client, "q": q}).encode("utf-8") + b"\n")
+        await writer.drain()
+        json.loads(await reader.readline())
+        latencies.append((time.perf_counter() - t0) * 1000.0)
+    writer.close()
+
+
+async def load_test(connect, clients, per_client, seed=0):
+    rng = random.Random(seed)
+    latencies = []
+    jobs = [connect(f"client{n}", [rng.choice(UTTERANCES) for _ in range(per_client)], latencies)
+            for n in range(clients)]
+    t0 = time.perf_counter()
+    await asyncio.gather(*jobs)
+    wall = time.perf_counter() - t0
+    latencies.sort()
+    return {"rps": len(latencies) / wall, "p50_ms": latencies[len(latencies) // 2],
+            "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]}
+
+
+def bench_daemon(jarvis, levels=(1, 100, 300), per_client=20):
+    """Requests/s and latency percentiles with many concurrent clients (daemon in its own process)."""
+    folder = tempfile.mkdtemp(prefix="daemon_")
+    sock = os.path.join(folder, "jarvis.sock")
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    token_file = os.path.join(folder, "daemon.token")
+    code = DAEMON_PROBE.format(here=HERE, addresses=[f"127.0.0.1:{port}", sock], token_file=token_file)
+    log_path = os.path.join(folder, "daemon.log")
+    log = open(log_path, "w")
+    proc = subprocess.Popen([sys.executable, "-c", code], stdout=log, stderr=subprocess.STDOUT)
+    results = {}
+    try:
+        deadline = time.time() + 60
+        while not os.path.exists(sock):
+            if proc.poll() is not None or time.time() > deadline:
+                raise RuntimeError("daemon did not start: " + open(log_path).read()[-500:])
+            time.sleep(0.05)
+        time.sleep(0.5)
+        with open(token_file, encoding="utf-8") as f:
+            token = f.read().strip()
+        asyncio.run(load_test(functools.partial(http_client, port, token), 4, 10))   # warm-up
+        print(f"{'transport':>9} {'clients':>8} {'requests/s':>11} {'p50 ms':>8} {'p99 ms':>8}")
+        for name, connect in (("http", functools.partial(http_client, port, token)),
+                              ("unix", functools.partial(unix_client, sock))):
+            for clients in levels:
+                r = asyncio.run(load_test(connect, clients, per_client))
+                print(f"{name:>9} {clients:>8} {r['rps']:>11.0f} {r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f}")
+                results[f"{name}_{clients}"] = r
+    except Exception:
+        time.sleep(0.5)
+        print(open(log_path).read()[-2000:])
+        raise
+    finally:
+        proc.terminate()
+        proc.wait(10)
+        log.close()
+    return results
+
+
+BENCHMARKS = {
+    "query": bench_query,
+    "pakistan": bench_pakistan,
+    "memory": bench_memory,
+    "history": bench_history,
+    "reminders": bench_reminders,
+    "startup": bench_startup,
+    "daemon": bench_daemon,
+    "listen": bench_listen,
+    "vad": bench_vad,
+    "weather": bench_weather,
+    "fallback": bench_fallback,
+    "actions": bench_actions,
+    "routing": bench_routing,
+    "fuzzy": bench_fuzzy,
+    "wiki_cache": bench_wiki_cache,
+    "wiki_offline": bench_wiki_offline,
+    "tts": bench_tts,
+    "music": bench_music,
+    "knowledge": bench_knowledge,
+    "chat": bench_chat,
+}
+
+
+# ---------------- Baseline --------------------------------------------------------
+# Metric names end in their unit; "per_s" metrics are better when higher, all
+# others when lower. Differences below the noise floor of the unit are ignored.
+NOISE_FLOOR = {"us": 2.0, "ms": 5.0, "s": 0.05, "mb": 2.0, "per_s": 0.0}
+
+
+def flatten(results, prefix=""):
+    """{"a": {"b_ms": 1}} -> {"a.b_ms": 1} (numbers only)."""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = float(value)
+    return flat
+
+
+def metric_unit(name):
+    last = name.rsplit(".", 1)[-1]
+    if last.endswith("per_s"):
+        return "per_s"
+    return last.rsplit("_", 1)[-1] if "_" in last else ""
+
+
+def compare(baseline, current, tolerance):
+    """Regressions as (metric, baseline, current) tuples."""
+    old, new = flatten(baseline), flatten(current)
+    regressions = []
+    for name in sorted(set(old) & set(new)):
+        unit = metric_unit(name)
+        if unit not in NOISE_FLOOR:
+            continue
+        a, b = old[name], new[name]
+        if unit == "per_s":
+            worse = b < a * (1.0 - tolerance)
+        else:
+            worse = b > a * (1.0 + tolerance) and b - a > NOISE_FLOOR[unit]
+        if worse:
+            regressions.append((name, a, b))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Jarvis benchmarks")
+    parser.add_argument("names", nargs="*", help="benchmarks to run (default: all)")
+    parser.add_argument("--save", metavar="FILE", help="write the results to FILE as JSON (a new baseline)")
+    parser.add_argument("--compare", metavar="FILE", help="compare with a baseline; exit 1 on a regression")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown before a metric counts as a regression (default 0.25)")
+    args = parser.parse_args(argv)
+    save = os.path.abspath(args.save) if args.save else None
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    names = args.names or (list(baseline["results"]) if baseline else list(BENCHMARKS))
+    jarvis = import_jarvis()
+    results = {}
+    for name in names:
+        print(f"== {name}")
+        results[name] = BENCHMARKS[name](jarvis)
+    if save:
+        with open(save, "w", encoding="utf-8") as f:
+            json.dump({"python": platform.python_version(), "platform": platform.platform(),
+                       "created": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": results}, f, indent=2)
+        print(f"results saved to {save}")
+    if baseline is not None:
+        regressions = compare(baseline["results"], results, args.tolerance)
+        for name, a, b in regressions:
+            print(f"REGRESSION {name}: {a:.3f} -> {b:.3f}")
+        if not regressions:
+            print(f"no regressions against {args.compare} (tolerance {args.tolerance:.0%})")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,261 @@
+"""
+Jarvis soak test: days of use compressed into minutes
+
+Runs jarvis.py headlessly (with the same stand-in modules as jarvis_bench.py)
+against a scripted stream of commands and reminders. A simulated clock drives
+the reminder scheduler, the chat history and the Wikipedia cache, so a
+simulated day passes in seconds. Every few simulated hours the harness samples
+RSS, traced Python memory (and its top allocators), threads, open file handles
+and the size of the state files. After a warm-up it fits a growth rate per
+simulated day to each and fails if one exceeds its budget.
+
+Usage:
+    python jarvis_soak.py                           # 3 simulated days
+    python jarvis_soak.py --days 14 --per-hour 60 --out soak.jsonl
+    python jarvis_soak.py --budget rss_mb=4 --budget threads=0
+"""
+
+import os
+import sys
+import gc
+import json
+import time
+import random
+import datetime
+import argparse
+import threading
+import tracemalloc
+import contextlib
+
+from jarvis_bench import UTTERANCES, import_jarvis, rss_mb
+
+# allowed growth per simulated day, after the warm-up
+DEFAULT_BUDGETS = {"rss_mb": 8.0, "traced_mb": 2.0, "threads": 0.5, "fds": 0.5, "disk_mb": 5.0}
+
+# things a user says in passing; prompts ("write a note") are left out, they wait for typing
+CHATTER = [u for u in UTTERANCES if not u.startswith(("write", "remind"))]
+TASKS = ["call david", "drink water", "stand up", "check the oven", "send the report", "water the plants"]
+TOPICS = ["volcanoes", "jazz", "the moon", "chess", "tea", "rivers", "bridges", "owls", "glass", "maps",
+          "trains", "honey", "comets", "silk", "coral", "deserts", "printing", "clocks", "salt", "kites"]
+
+
+class SimClock:
+    """Wall clock that only moves when told to."""
+
+    def __init__(self, start):
+        self.t = start.timestamp()
+
+    def time(self):
+        return self.t
+
+    def now(self):
+        return datetime.datetime.fromtimestamp(self.t)
+
+    def advance(self, seconds):
+        self.t += seconds
+
+
+def script_day(rng, day_start, per_hour, first_day):
+    """(seconds into the day, utterance) for one simulated day, in time order."""
+    events = []
+    if first_day:
+        # standing reminders: they fire every day and never go away
+        events.append((7 * 3600, "remind me to take my vitamins at 08:00 every day"))
+        events.append((7 * 3600 + 60, "remind me to plan tomorrow at 21:30 every day"))
+    events.append((9 * 3600, "what did i ask about yesterday"))
+    for hour in range(7, 23):
+        for _ in range(rng.randint(per_hour // 2, per_hour)):
+            at = hour * 3600 + rng.randrange(3600)
+            r = rng.random()
+            if r < 0.08:
+                due = day_start + datetime.timedelta(seconds=at + rng.randrange(600, 4 * 3600))
+                events.append((at, f"remind me to {rng.choice(TASKS)} at {due:%H:%M}"))
+            elif r < 0.25:
+                # new questions keep arriving, so the Wikipedia cache fills up to its cap
+                events.append((at, f"who invented {rng.choice(TOPICS)} and {rng.choice(TOPICS)} {rng.randrange(500)}"))
+            elif r < 0.3:
+                events.append((at, f"when did i ask about {rng.choice(TOPICS)}"))
+            else:
+                events.append((at, rng.choice(CHATTER)))
+    events.sort()
+    return events
+
+
+def open_fds():
+    """Open file descriptors of this process (Linux; None elsewhere)."""
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return None
+
+
+def disk_mb(path):
+    total = 0
+    for folder, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(folder, name))
+            except OSError:
+                pass    # deleted while walking (journal compaction, segment sealing)
+    return total / 1e6
+
+
+# allocations made by the harness and the import machinery, not by Jarvis
+SOAK_FRAMES = ("tracemalloc", "jarvis_soak", "<frozen importlib")
+
+
+def _where(stat):
+    frame = stat.traceback[0]
+    return f"{frame.filename.rsplit(os.sep, 1)[-1]}:{frame.lineno}"
+
+
+def _own(stats):
+    # (filtering the snapshot itself with tracemalloc.Filter is far slower)
+    return [s for s in stats if not any(name in s.traceback[0].filename for name in SOAK_FRAMES)]
+
+
+def top_allocators(snapshot, limit=3):
+    return [f"{_where(s)} {s.size / 1e3:.0f} kB" for s in _own(snapshot.statistics("lineno"))[:limit]]
+
+
+def sample(jarvis, clock, start, state_dir, started):
+    gc.collect()
+    return {"sim_time": clock.now().isoformat(timespec="minutes"),
+            "sim_days": round((clock.time() - start.timestamp()) / 86400, 3),
+            "real_s": round(time.perf_counter() - started, 2), "rss_mb": round(rss_mb(), 2),
+            "traced_mb": round(tracemalloc.get_traced_memory()[0] / 1e6, 3),
+            "threads": threading.active_count(), "fds": open_fds(), "disk_mb": round(disk_mb(state_dir), 3),
+            "reminders": len(jarvis.memory.get("reminders", [])),
+            "history_turns": jarvis.get_backend("history").count()}
+
+
+def growth_per_day(samples, key):
+    """Least-squares slope of ``key`` against simulated days."""
+    points = [(s["sim_days"], s[key]) for s in samples if s[key] is not None]
+    if len(points) < 2:
+        return 0.0
+    mx = sum(x for x, _ in points) / len(points)
+    my = sum(y for _, y in points) / len(points)
+    var = sum((x - mx) ** 2 for x, _ in points)
+    return sum((x - mx) * (y - my) for x, y in points) / var if var else 0.0
+
+
+def soak(days=3.0, per_hour=30, sample_hours=2.0, warmup_hours=24.0, tick=60, seed=7, out=None, log=sys.stdout):
+    """Run the simulated days; returns (samples, growth per day, top allocator growth)."""
+    rng = random.Random(seed)
+    tracemalloc.start()
+    jarvis = import_jarvis()
+    state_dir = os.getcwd()
+    jarvis.CHAT_RESPONDER = "retrieval"
+    jarvis.MUSIC_FOLDER = os.path.join(state_dir, "music")
+    os.makedirs(jarvis.MUSIC_FOLDER, exist_ok=True)
+    platform = jarvis.RecordingPlatform()       # commands are recorded, never run
+    jarvis.actions = jarvis.ActionExecutor(platform, on_status=jarvis._report_action_status)
+    start = datetime.datetime.combine(datetime.date.today() - datetime.timedelta(days=days + 1),
+                                      datetime.time(6, 0))
+    clock = SimClock(start)
+    jarvis.reminder_scheduler.stop()            # the harness fires reminders on simulated time
+    jarvis.reminder_scheduler.now = clock.now
+    jarvis.open_memory().set("name", "soak")    # state files in the working folder, as in real use
+    jarvis.get_backend("history").clock = clock.time
+    jarvis.get_wiki_cache().clock = clock.time
+
+    samples, baseline = [], None
+    started = time.perf_counter()
+    end = clock.time() + days * 86400
+    next_sample = clock.time()
+    warm_until = clock.time() + warmup_hours * 3600
+    day, pending = None, []
+    print(f"{'simulated':>16} {'real s':>7} {'RSS MB':>7} {'traced MB':>10} {'threads':>8} {'fds':>5} "
+          f"{'disk MB':>8} {'reminders':>10} {'turns':>7}", file=log)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        while clock.time() < end:
+            now = clock.now()
+            if now.date() != day:
+                day = now.date()
+                day_start = datetime.datetime.combine(day, datetime.time())
+                pending = [(day_start.timestamp() + at, q) for at, q in
+                           script_day(rng, day_start, per_hour, first_day=not samples)]
+            while pending and pending[0][0] <= clock.time():
+                with jarvis.turn_trace():
+                    jarvis.respond(pending.pop(0)[1])
+            jarvis.reminder_scheduler.run_pending()
+            if clock.time() >= next_sample:
+                jarvis.memory_store.flush()
+                jarvis.speech_wait(timeout=5)
+                platform.log.clear()            # the harness's own record, not Jarvis state
+                s = sample(jarvis, clock, start, state_dir, started)
+                snapshot = tracemalloc.take_snapshot()
+                s["top"] = top_allocators(snapshot)
+                if baseline is None and clock.time() >= warm_until:
+                    baseline = snapshot
+                s["warm"] = baseline is not None
+                samples.append(s)
+                print(f"{s['sim_time']:>16} {s['real_s']:>7.1f} {s['rss_mb']:>7.1f} {s['traced_mb']:>10.2f} "
+                      f"{s['threads']:>8} {str(s['fds']):>5} {s['disk_mb']:>8.2f} {s['reminders']:>10} "
+                      f"{s['history_turns']:>7}", file=log)
+                if out is not None:
+                    out.write(json.dumps(s) + "\n")
+                    out.flush()
+                next_sample += sample_hours * 3600
+            clock.advance(tick)
+    warm = [s for s in samples if s["warm"]]
+    growth = {key: growth_per_day(warm, key) for key in DEFAULT_BUDGETS}
+    movers = []
+    if baseline is not None:
+        diffs = _own(tracemalloc.take_snapshot().compare_to(baseline, "lineno"))
+        movers = [f"{_where(d)} {d.size_diff / 1e3:+.0f} kB ({d.count_diff:+d} blocks)"
+                  for d in sorted(diffs, key=lambda d: -d.size_diff)[:5] if d.size_diff > 0]
+    tracemalloc.stop()
+    return samples, growth, movers
+
+
+def parse_budgets(items):
+    budgets = dict(DEFAULT_BUDGETS)
+    for item in items or []:
+        key, _, value = item.partition("=")
+        if key not in budgets:
+            raise SystemExit(f"unknown budget {key!r} (one of {', '.join(budgets)})")
+        budgets[key] = float(value)
+    return budgets
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Jarvis soak test on a simulated clock")
+    parser.add_argument("--days", type=float, default=3.0, help="simulated days to run (default 3)")
+    parser.add_argument("--per-hour", type=int, default=30, help="most commands per waking hour (default 30)")
+    parser.add_argument("--sample-hours", type=float, default=2.0, help="simulated hours between samples")
+    parser.add_argument("--warmup-hours", type=float, default=24.0,
+                        help="simulated hours before growth is measured (caches and pools fill up)")
+    parser.add_argument("--budget", action="append", metavar="NAME=PER_DAY",
+                        help="allowed growth per simulated day, e.g. rss_mb=8 "
+                             f"(defaults: {', '.join(f'{k}={v:g}' for k, v in DEFAULT_BUDGETS.items())})")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", metavar="FILE", help="also write every sample as a JSON line to FILE")
+    args = parser.parse_args(argv)
+    budgets = parse_budgets(args.budget)
+    if args.days * 24 <= args.warmup_hours:
+        parser.error("--days must be longer than the warm-up")
+    out = open(os.path.abspath(args.out), "w", encoding="utf-8") if args.out else None
+    try:
+        samples, growth, movers = soak(args.days, args.per_hour, args.sample_hours, args.warmup_hours,
+                                       seed=args.seed, out=out)
+    finally:
+        if out is not None:
+            out.close()
+    print(f"\ngrowth per simulated day after {args.warmup_hours:g} h warm-up:")
+    failed = []
+    for key, budget in budgets.items():
+        verdict = "ok" if growth[key] <= budget else "OVER BUDGET"
+        if growth[key] > budget:
+            failed.append(key)
+        print(f"  {key:>10}: {growth[key]:+8.3f} / day (budget {budget:g}) {verdict}")
+    if movers:
+        print("largest allocation growth since the warm-up:")
+        for line in movers:
+            print("  " + line)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import jarvis_bench
+
+
+@pytest.fixture(scope="session")
+def jarvis():
+    """jarvis.py with the offline stand-ins for the Windows/online modules, run from a temp folder."""
+    return jarvis_bench.import_jarvis()
+
+
+@pytest.fixture
+def dry_run(jarvis, monkeypatch):
+    """Actions and speech are recorded, memory lives in RAM; returns the recorder."""
+    recorder = jarvis.RecordingActions()
+    monkeypatch.setattr(jarvis, "actions", recorder)
+    store = jarvis.MemoryStore(None, defaults=jarvis._memory_defaults())
+    monkeypatch.setattr(jarvis, "memory_store", store)
+    monkeypatch.setattr(jarvis, "memory", store.data)
+    return recorder
@@ -0,0 +1,40 @@
+"""Generated PCM for the capture tests (16 kHz, 16-bit mono)."""
+import array
+import math
+import threading
+
+RATE, CHUNK = 16000, 1024
+
+
+def silence(seconds):
+    return [bytes(CHUNK * 2)] * int(seconds * RATE / CHUNK)
+
+
+def voice(seconds, amplitude=3000):
+    """Voiced-like audio: a 180 Hz tone with its first harmonic."""
+    chunks = []
+    for c in range(int(seconds * RATE / CHUNK)):
+        samples = array.array("h")
+        for i in range(c * CHUNK, (c + 1) * CHUNK):
+            x = i / RATE
+            samples.append(int(amplitude * (math.sin(2 * math.pi * 180 * x) + 0.5 * math.sin(2 * math.pi * 360 * x)) / 1.5))
+        chunks.append(samples.tobytes())
+    return chunks
+
+
+def click():
+    return [array.array("h", [8000, -8000] * (CHUNK // 2)).tobytes()]
+
+
+def session(jarvis, chunks, sink=None, **kw):
+    """A capture session over ``chunks``; audio starts flowing once ``sink`` is attached."""
+    attached = threading.Event()
+
+    def gated():
+        attached.wait()
+        yield from chunks
+
+    s = jarvis.CaptureSession(jarvis.SyntheticSource(gated(), RATE, 2, CHUNK), keep_for=3600, **kw)
+    s.phrase_sink = sink
+    attached.set()
+    return s
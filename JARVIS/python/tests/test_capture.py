@@ -0,0 +1,12 @@
+from synthetic_audio import RATE, session, silence, voice
+
+
+def test_one_calibration_and_phrases_in_order(jarvis):
+    s = session(jarvis, silence(1.0) + voice(0.6) + silence(1.0) + voice(1.0) + silence(1.0))
+    first, second = s.next_phrase(timeout=5), s.next_phrase(timeout=5)
+    assert s.next_phrase(timeout=5) is None
+    s.close()
+    assert s.noise_level == 0.0 and s.energy_threshold == s.min_threshold
+    assert s.phrases_emitted == 2
+    # the phrase includes the pre-roll before speech and the pause after it
+    assert len(first) > 0.6 * RATE * 2 and len(second) > len(first)
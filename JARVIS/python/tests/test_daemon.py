@@ -0,0 +1,133 @@
+import asyncio
+import datetime
+import json
+import os
+
+import pytest
+
+TOKEN = "s3cret"
+
+
+@pytest.fixture
+def daemon(jarvis, dry_run, tmp_path, monkeypatch):
+    monkeypatch.setattr(jarvis, "DAEMON_CLIENTS_DIR", str(tmp_path / "clients"))
+    monkeypatch.setattr(jarvis, "reminder_scheduler",
+                        jarvis.ReminderScheduler(now=lambda: datetime.datetime(2024, 3, 1, 8, 0)))
+    made = []
+
+    def make(**kw):
+        made.append(jarvis.JarvisDaemon(workers=2, token=TOKEN, **kw))
+        return made[-1]
+
+    yield make
+    for d in made:
+        d.close()
+
+
+def http(d, method="POST", body=b'{"client": "ali", "q": "what time is it"}', target="/query", **extra):
+    headers = {"host": "localhost:8765", "authorization": "Bearer " + TOKEN}
+    headers.update({k.replace("_", "-"): v for k, v in extra.items()})
+    headers = {k: v for k, v in headers.items() if v is not None}
+    return asyncio.run(d._http_request(method, target, headers, body))
+
+
+def test_http_needs_post_local_headers_and_the_token(daemon):
+    d = daemon()
+    status, payload = http(d)
+    assert status == "200 OK" and payload["intent"] == "time"
+    assert http(d, authorization=None)[0] == "401 Unauthorized"
+    assert http(d, authorization="Bearer wrong")[0] == "401 Unauthorized"
+    assert http(d, authorization=None, x_jarvis_token=TOKEN)[0] == "200 OK"
+    assert http(d, host="evil.example:8765")[0] == "403 Forbidden"           # DNS rebinding
+    assert http(d, origin="https://evil.example")[0] == "403 Forbidden"      # cross-site form post
+    assert http(d, origin="http://127.0.0.1:8765")[0] == "200 OK"
+    assert http(d, "GET", b"", "/query?client=ali&q=shutdown")[0] == "405 Method Not Allowed"
+    assert http(d, "GET", b"", "/status", authorization=None)[0] == "401 Unauthorized"
+
+
+def test_no_token_means_no_http(daemon):
+    d = daemon()
+    d.token = None
+    assert http(d)[0] == "401 Unauthorized"
+
+
+def test_remote_host_header_needs_the_opt_in(daemon):
+    assert http(daemon(allow_remote=True), host="jarvis-pc:8765")[0] == "200 OK"
+
+
+@pytest.mark.parametrize("address", ["0.0.0.0:0", "192.168.1.5:0", "[::]:0"])
+def test_serving_beyond_localhost_needs_the_opt_in(daemon, address):
+    with pytest.raises(ValueError):
+        asyncio.run(daemon().serve([address]))
+
+
+def test_oversized_request_is_refused_unread(daemon):
+    d = daemon(max_request=1024)
+
+    async def exchange():
+        server = await asyncio.start_server(d._serve_http, "127.0.0.1", 0, limit=d.max_request)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"POST /query HTTP/1.1\r\nHost: localhost\r\nContent-Length: 100000000\r\n\r\n")
+        await writer.drain()
+        status = await reader.readline()
+        writer.close()
+        server.close()
+        return status
+
+    assert b"413" in asyncio.run(exchange())
+
+
+def test_prompt_titles_cannot_leave_the_folder(jarvis, daemon, dry_run):
+    assert jarvis.safe_filename("../../etc/passwd") == "etc_passwd"
+    assert jarvis.safe_filename("..") == "untitled"
+    d = daemon()
+    asyncio.run(d.ask("ali", "write an application"))
+    asyncio.run(d.ask("ali", "../../../startup/evil"))
+    (path,) = [entry[1] for entry in dry_run.take() if entry[0] == "write_file"]
+    assert os.path.dirname(path) == os.getcwd()
+    assert os.path.basename(path) == "startup_evil.py"
+
+
+def test_client_memory_survives_a_restart(jarvis, daemon):
+    first = daemon()
+    asyncio.run(first.ask("ali", "my name is ali"))
+    first.close()
+    assert asyncio.run(daemon().ask("ali", "what is my name"))["response"] == "Your name is ali."
+    assert "ali" not in asyncio.run(daemon().ask("bilal", "what is my name"))["response"]
+
+
+def test_dropped_client_stops_its_reminders_until_it_returns(jarvis, daemon):
+    d = daemon(max_sessions=1)
+    asyncio.run(d.ask("ali", "remind me to stretch at 09:00"))
+    (rem,) = d.sessions["ali"].store.data["reminders"]
+    assert jarvis.reminder_scheduler.due_of(rem["id"]) is not None
+    old = d.sessions["ali"]
+
+    async def other_client():
+        await d.ask("bilal", "what time is it")          # drops ali
+        await asyncio.get_running_loop().run_in_executor(None, d._closing["ali"].result)
+
+    asyncio.run(other_client())
+    assert old.closed and jarvis.reminder_scheduler.due_of(rem["id"]) is None
+    with open(old.path + ".journal", encoding="utf-8") as f:
+        assert "stretch" in f.read()
+    asyncio.run(d.ask("ali", "what time is it"))        # back: memory reloaded, reminder rescheduled
+    assert jarvis.reminder_scheduler.due_of(rem["id"]) == datetime.datetime(2024, 3, 1, 9, 0)
+
+
+def test_unix_lines_are_capped(jarvis, daemon, tmp_path):
+    d = daemon(max_request=1024)
+    sock = str(tmp_path / "j.sock")
+
+    async def exchange():
+        server = await asyncio.start_unix_server(d._serve_lines, sock, limit=d.max_request)
+        reader, writer = await asyncio.open_unix_connection(sock)
+        writer.write(b"x" * 5000 + b"\n")
+        await writer.drain()
+        reply = await reader.readline()
+        writer.close()
+        server.close()
+        return json.loads(reply)
+
+    assert asyncio.run(exchange()) == {"error": "line too long"}
@@ -0,0 +1,49 @@
+import threading
+import time
+
+import pytest
+
+
+@pytest.fixture
+def resolvers(jarvis, monkeypatch):
+    """Replace the resolvers; ``release`` lets any hung ones finish at teardown."""
+    release = threading.Event()
+
+    def install(**fns):
+        for name, fn in fns.items():
+            monkeypatch.setitem(jarvis.FALLBACK_RESOLVERS, name, fn)
+
+    install.hang = lambda q: (release.wait(10), "too late")[1]
+    yield install
+    release.set()
+
+
+def answer(text, delay=0.0):
+    return lambda q: (time.sleep(delay), text)[1]
+
+
+def test_inline_answer_wins_without_starting_threads(jarvis, resolvers):
+    resolvers(knowledge=answer("local"), wikipedia=answer("online"), chat=answer("chat"))
+    assert jarvis.resolve_fallbacks("q", ("knowledge", "wikipedia", "chat")) == ("knowledge", "local")
+
+
+def test_better_resolver_is_waited_for(jarvis, resolvers):
+    resolvers(knowledge=answer(None), wikipedia=answer("online", 0.1), chat=answer("chat"))
+    assert jarvis.resolve_fallbacks("q", ("knowledge", "wikipedia", "chat"), deadline=2) == ("wikipedia", "online")
+
+
+def test_lone_resolver_keeps_to_the_deadline(jarvis, resolvers):
+    resolvers(chat=resolvers.hang)
+    t0 = time.monotonic()
+    assert jarvis.resolve_fallbacks("q", ("chat",), deadline=0.2) == ("timeout", None)
+    assert time.monotonic() - t0 < 1.0
+
+
+def test_hung_wikipedia_only_ties_up_its_own_threads(jarvis, resolvers):
+    resolvers(knowledge=answer(None), wikipedia=resolvers.hang, chat=answer("chat"))
+    for _ in range(jarvis.FALLBACK_WORKERS + 5):
+        t0 = time.monotonic()
+        assert jarvis.resolve_fallbacks("q", ("knowledge", "wikipedia", "chat"), deadline=0.1) == ("chat", "chat")
+        assert time.monotonic() - t0 < 1.0
+    stuck = [t for t in threading.enumerate() if t.name.startswith("jarvis-resolve-wikipedia")]
+    assert len(stuck) == jarvis.FALLBACK_WORKERS
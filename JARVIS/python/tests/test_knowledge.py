@@ -0,0 +1,60 @@
+import json
+import os
+
+import pytest
+
+
+def entries_for(count, key_len=0):
+    return [(f"topic{n % 7}", f"fact {n}".ljust(key_len, "x"), [f"word{n}", "shared"], f"Answer {n} — café")
+            for n in range(count)]
+
+
+def check(kb, entries):
+    assert len(kb) == len(entries)
+    for n, (topic, key, _, answer) in enumerate(entries):
+        assert kb.get(topic, key) == answer
+    for n in {0, len(entries) // 2, len(entries) - 1} if entries else ():
+        (found,) = kb.search(f"word{n}")
+        assert found[3] == entries[n][3]
+
+
+@pytest.mark.parametrize("count", [0, 1, 2, 9, 10, 11, 99, 100, 143, 144, 145, 1000, 1001])
+def test_round_trip(jarvis, tmp_path, count):
+    path = str(tmp_path / "kb.idx")
+    entries = entries_for(count)
+    jarvis.build_knowledge_index([], path, entries=entries)
+    kb = jarvis.KnowledgeBase(path)
+    check(kb, entries)
+    kb.close()
+
+
+@pytest.mark.parametrize("count, key_len", [(1, k) for k in range(370, 390)] + [(2, 181), (144, 771)])
+def test_header_growing_past_its_first_estimate(jarvis, tmp_path, count, key_len):
+    # (1, 380) and (2, 181) put the offsets just under 1000 on the first sizing
+    # pass; a fixed two passes then left the header one byte longer than the
+    # space before the postings
+    path = str(tmp_path / "kb.idx")
+    entries = entries_for(count, key_len)
+    jarvis.build_knowledge_index([], path, entries=entries)
+    assert not os.path.exists(path + ".tmp")
+    kb = jarvis.KnowledgeBase(path)
+    check(kb, entries)
+    kb.close()
+
+
+def test_damaged_index_is_rebuilt(jarvis, tmp_path, monkeypatch):
+    folder = tmp_path / "knowledge"
+    folder.mkdir()
+    (folder / "cricket.json").write_text(json.dumps({"topic": "cricket", "entries": [
+        {"key": "captain", "keywords": ["captain"], "answer": "Babar Azam"}]}), encoding="utf-8")
+    index = tmp_path / "kb.idx"
+    monkeypatch.setattr(jarvis, "KNOWLEDGE_DIR", str(folder))
+    monkeypatch.setattr(jarvis, "KNOWLEDGE_INDEX_FILE", str(index))
+    jarvis._load_knowledge().close()
+    data = bytearray(index.read_bytes())
+    index.write_bytes(bytes(data[:-3]))                  # cut short
+    with pytest.raises(ValueError):
+        jarvis.KnowledgeBase(str(index))
+    kb = jarvis._load_knowledge()
+    assert kb.get("cricket", "captain") == "Babar Azam"
+    kb.close()
@@ -0,0 +1,95 @@
+import json
+import os
+
+import pytest
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "memory.json")
+
+
+def open_store(jarvis, path, **kw):
+    return jarvis.MemoryStore(path, defaults=jarvis._memory_defaults(), **kw)
+
+
+def test_mutations_replay_from_the_journal(jarvis, path):
+    store = open_store(jarvis, path)
+    store.set("name", "Ayesha")
+    for i in range(5):
+        store.append("reminders", {"id": str(i)})
+    store.remove("reminders", {"id": "2"})
+    store.delete("last_independence_year")
+    assert store.flush()
+    # no close(): as if the process died right after the flush
+    again = open_store(jarvis, path)
+    assert again.data == store.data
+    assert [r["id"] for r in again.data["reminders"]] == ["0", "1", "3", "4"]
+    assert "last_independence_year" not in again.data
+    store.close()
+    again.close()
+
+
+def test_deleting_a_none_value_is_replayed(jarvis, path):
+    store = open_store(jarvis, path)
+    store.set("name", None)
+    store.delete("name")
+    store.delete("no_such_key")         # nothing to journal
+    assert store.flush()
+    again = open_store(jarvis, path)
+    assert "name" not in again.data
+    store.close()
+    again.close()
+
+
+def test_compaction_keeps_everything_once(jarvis, path):
+    store = open_store(jarvis, path, compact_every=10)
+    for i in range(35):
+        store.append("reminders", i)
+    store.close()
+    again = open_store(jarvis, path, compact_every=10)
+    assert again.data["reminders"] == list(range(35))
+    again.close()
+
+
+def test_torn_journal_tail_is_ignored(jarvis, path):
+    store = open_store(jarvis, path)
+    store.set("name", "Bilal")
+    store.append("reminders", "kept")
+    store.close()
+    with open(path + ".journal", "a", encoding="utf-8") as f:
+        f.write(json.dumps({"op": "append", "key": "reminders", "value": "lost"})[:20])   # crash mid-write
+    again = open_store(jarvis, path)
+    assert again.data["name"] == "Bilal" and again.data["reminders"] == ["kept"]
+    # the torn line was compacted away, so the next record is not hidden behind it
+    again.append("reminders", "after")
+    again.close()
+    third = open_store(jarvis, path)
+    assert third.data["reminders"] == ["kept", "after"]
+    third.close()
+
+
+def test_failed_write_is_reported_and_retried(jarvis, path, monkeypatch):
+    store = open_store(jarvis, path, retry_delay=0.01)
+    real_fsync, calls = os.fsync, []
+
+    def failing_fsync(fd):
+        calls.append(fd)
+        if len(calls) == 1:
+            raise OSError(28, "No space left on device")
+        real_fsync(fd)
+
+    monkeypatch.setattr(jarvis.os, "fsync", failing_fsync)
+    store.set("name", "Chand")
+    with pytest.raises(OSError):
+        store.flush()
+    assert store.flush(timeout=5)          # retried until the disk came back
+    monkeypatch.setattr(jarvis.os, "fsync", real_fsync)
+    store.append("reminders", "next")
+    store.close()
+    with open(path + ".journal", encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    assert len(lines) == 3                 # header + one copy of each record
+    again = open_store(jarvis, path)
+    assert again.data["name"] == "Chand" and again.data["reminders"] == ["next"]
+    again.close()
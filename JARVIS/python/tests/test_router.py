@@ -0,0 +1,67 @@
+import pytest
+
+
+@pytest.mark.parametrize("query, intent", [
+    ("what time is it", "time"),
+    ("what is the date today", "date"),
+    ("independence day", "independence_day"),                 # not "date" for the bare "day"
+    ("when is pakistan independence day", "independence_day"),
+    ("open chrome", "chrome"),
+    ("open visual studio code", "vscode"),
+    ("cancel shutdown", "abort_shutdown"),    # outranks "shutdown"
+    ("remind me to check what time it is at 10:00", "reminder"),    # outranks "time"
+    ("my name is ali", "set_name"),
+    ("what's the weather in islamabad", "weather"),
+    ("today's weather please", "weather"),     # whole words: no "day" inside "today's"
+    ("cmd", "cmd"),
+    ("shutdown", "shutdown"),
+    ("shut down the computer", "shutdown"),
+    ("can you restart my computer", "restart"),
+    ("lock the screen", "lock"),
+    ("go to sleep", "sleep"),
+    ("log off", "logoff"),
+    ("who is alan turing", "wiki"),
+])
+def test_route(jarvis, query, intent):
+    assert jarvis.router.route(query) == intent
+
+
+@pytest.mark.parametrize("query", [
+    "set the clock forward",       # no "lock" inside "clock"
+    "they said my name is bob",    # "^my name is" must start the utterance
+    "the cmd key is stuck",        # "=cmd" must be the whole utterance
+    "",
+    # power and session commands: command phrasing only, never questions or negations
+    "how do i restart my router",
+    "restart my router",
+    "what is sleep",
+    "i need more sleep",
+    "don't shut down",
+    "do not restart the computer",
+    "how do i lock the screen",
+    "is the door lock broken",
+    "why does my pc log off by itself",
+])
+def test_route_rejects(jarvis, query):
+    assert jarvis.router.route(query) not in ("lock", "set_name", "cmd", "shutdown", "restart", "sleep", "logoff")
+
+
+def test_guarded_intents_need_a_guarded_router(jarvis):
+    router = jarvis.IntentRouter([("shutdown", 65, ["shutdown"]), ("wiki", 10, ["what"])])
+    assert router.route("what shutdown") == "shutdown"
+    router = jarvis.IntentRouter([("shutdown", 65, ["shutdown"]), ("wiki", 10, ["what"])], guarded={"shutdown"})
+    assert router.route("what shutdown") == "wiki"
+    assert router.route("shutdown") == "shutdown"
+
+
+def test_route_ties_go_to_the_longest_match(jarvis):
+    router = jarvis.IntentRouter([("short", 50, ["play"]), ("long", 50, ["play some music"]),
+                                  ("both", 50, [("play", "loud")])])
+    assert router.route("please play some music") == "long"
+    assert router.route("play it loud") == "both"
+    assert router.route("play") == "short"
+
+
+def test_route_priority_beats_length(jarvis):
+    router = jarvis.IntentRouter([("low", 10, ["open the red door"]), ("high", 90, ["door"])])
+    assert router.route("open the red door") == "high"
@@ -0,0 +1,128 @@
+import datetime
+
+import pytest
+
+T0 = datetime.datetime(2024, 3, 1, 8, 0)
+
+
+class Clock:
+    def __init__(self, start=T0):
+        self.t = start
+
+    def __call__(self):
+        return self.t
+
+    def advance(self, **kw):
+        self.t += datetime.timedelta(**kw)
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def scheduler(jarvis, clock):
+    return jarvis.ReminderScheduler(now=clock)
+
+
+def at(minutes):
+    return T0 + datetime.timedelta(minutes=minutes)
+
+
+def test_jobs_fire_in_due_order_and_not_before(scheduler, clock):
+    fired = []
+    for name, minutes in (("c", 30), ("a", 10), ("b", 20)):
+        scheduler.schedule(name, at(minutes), lambda job_id, due: fired.append((job_id, due)))
+    assert scheduler.run_pending() == 0
+    clock.advance(minutes=10)
+    assert scheduler.run_pending() == 1
+    clock.advance(minutes=25)
+    assert scheduler.run_pending() == 2
+    assert fired == [("a", at(10)), ("b", at(20)), ("c", at(30))]
+    assert len(scheduler) == 0
+
+
+def test_cancel_and_reschedule(scheduler, clock):
+    fired = []
+    callback = lambda job_id, due: fired.append((job_id, due))
+    scheduler.schedule("x", at(5), callback)
+    scheduler.schedule("y", at(5), callback)
+    assert scheduler.cancel("x")
+    scheduler.schedule("y", at(50), callback)        # same id replaces the old time
+    clock.advance(minutes=10)
+    assert scheduler.run_pending() == 0
+    assert scheduler.due_of("y") == at(50)
+    assert scheduler.due_of("x") is None
+    clock.advance(minutes=40)
+    scheduler.run_pending()
+    assert fired == [("y", at(50))]
+
+
+def test_repeat_catches_up_with_one_call(scheduler, clock):
+    fired = []
+    scheduler.schedule("daily", at(60), lambda job_id, due: fired.append(due), datetime.timedelta(days=1))
+    clock.advance(days=3, hours=2)                    # asleep for three days
+    assert scheduler.run_pending() == 1
+    assert fired == [at(60)]
+    assert scheduler.due_of("daily") == at(60) + datetime.timedelta(days=4)
+    clock.advance(days=1)
+    scheduler.run_pending()
+    assert fired == [at(60), at(60) + datetime.timedelta(days=4)]
+
+
+def test_failing_callback_does_not_stop_the_others(scheduler, clock):
+    fired = []
+
+    def broken(job_id, due):
+        raise RuntimeError("boom")
+
+    scheduler.schedule("bad", at(1), broken)
+    scheduler.schedule("good", at(2), lambda job_id, due: fired.append(job_id))
+    clock.advance(minutes=5)
+    assert scheduler.run_pending() == 2
+    assert fired == ["good"]
+
+
+@pytest.fixture
+def reminders(jarvis, dry_run, clock, monkeypatch):
+    monkeypatch.setattr(jarvis, "reminder_scheduler", jarvis.ReminderScheduler(now=clock))
+    return jarvis
+
+
+def test_one_time_reminder_fires_once_and_is_removed(reminders, dry_run, clock):
+    jarvis = reminders
+    jarvis.add_reminder("stretch", "08:30")
+    assert [r["text"] for r in jarvis.memory["reminders"]] == ["stretch"]
+    clock.advance(minutes=31)
+    assert jarvis.reminder_scheduler.run_pending() == 1
+    assert ["say", "Reminder: stretch"] in dry_run.take()
+    assert jarvis.memory["reminders"] == []
+    clock.advance(days=1)
+    assert jarvis.reminder_scheduler.run_pending() == 0
+
+
+def test_daily_reminder_moves_to_the_next_day(reminders, dry_run, clock):
+    jarvis = reminders
+    jarvis.add_reminder("vitamins", "09:00", repeat="daily")
+    clock.advance(hours=1, minutes=1)
+    jarvis.reminder_scheduler.run_pending()
+    (rem,) = jarvis.memory["reminders"]
+    assert rem["due"] == "2024-03-02T09:00:00"
+    clock.advance(days=2)                             # missed: said once, as missed
+    jarvis.reminder_scheduler.run_pending()
+    assert dry_run.take()[-1] == ["say", "Missed reminder: vitamins"]
+    assert jarvis.memory["reminders"][0]["due"] == "2024-03-04T09:00:00"
+
+
+def test_old_reminders_are_migrated_and_overdue_ones_fire(reminders, dry_run, clock):
+    jarvis = reminders
+    jarvis.memory_store.set("reminders", [{"text": "old style", "time": "07:00"},
+                                          {"id": "r1", "text": "overdue", "time": "07:30", "repeat": None,
+                                           "due": "2024-03-01T07:30:00"}])
+    jarvis.load_reminders()
+    texts = {r["text"]: r for r in jarvis.memory["reminders"]}
+    assert texts["old style"]["due"] == "2024-03-02T07:00:00" and "id" in texts["old style"]
+    assert jarvis.reminder_scheduler.run_pending() == 1
+    assert ["say", "Missed reminder: overdue"] in dry_run.take()
+    assert [r["text"] for r in jarvis.memory["reminders"]] == ["old style"]
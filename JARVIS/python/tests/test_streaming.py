@@ -0,0 +1,23 @@
+from synthetic_audio import RATE, session, silence, voice
+
+
+def test_streaming_decoder_hands_over_each_phrase(jarvis):
+    recognizer = jarvis.ScriptedRecognizer(["what time is it", "open calculator"])
+    decoder = jarvis.StreamingDecoder(recognizer, RATE)
+    s = session(jarvis, silence(1.0) + voice(1.0) + silence(1.0) + voice(1.0) + silence(1.0), decoder)
+    assert decoder.next_text(timeout=5) == ("what time is it", False)
+    assert decoder.next_text(timeout=5) == ("open calculator", False)
+    assert decoder.next_text(timeout=5) is None
+    s.close()
+    assert decoder.partials > 0
+
+
+def test_streaming_decoder_answers_early_once_the_command_is_clear(jarvis):
+    recognizer = jarvis.ScriptedRecognizer(["open calculator and add up my bills"], words_per_second=6.0)
+    decoder = jarvis.StreamingDecoder(recognizer, RATE, early=jarvis.early_intent)
+    s = session(jarvis, silence(1.0) + voice(2.0) + silence(1.0), decoder)
+    text, early = decoder.next_text(timeout=5)
+    assert early and text.startswith("open calculator")
+    assert decoder.next_text(timeout=5) is None       # the rest of the phrase is not handed over again
+    s.close()
+    assert decoder.early_hits == 1
@@ -0,0 +1,12 @@
+from synthetic_audio import CHUNK, RATE, click, session, silence, voice
+
+
+def test_vad_drops_clicks_and_trims_silence(jarvis):
+    chunks = silence(1.0) + click() + silence(1.0) + voice(0.6) + silence(1.5)
+    s = session(jarvis, chunks, vad=jarvis.VoiceActivityDetector(RATE))
+    phrase = s.next_phrase(timeout=5)
+    assert s.next_phrase(timeout=5) is None
+    s.close()
+    assert s.phrases_emitted == 1
+    seconds = len(phrase) / (RATE * 2)
+    assert 0.6 <= seconds <= 0.6 + 2 * 0.25 + 2 * CHUNK / RATE
@@ -0,0 +1,31 @@
+import pytest
+
+
+@pytest.mark.parametrize("query, city", [
+    ("what's the weather in karachi", "karachi"),
+    ("weather in new york please", "new york"),
+    ("how is the weather in dera ismail khan right now", "dera ismail khan"),
+    ("weather in lahore tomorrow", "lahore"),
+    ("weather for today in peshawar", "peshawar"),
+    ("what is the weather at the moment in quetta", "quetta"),
+    ("weather in murree this weekend", "murree"),
+    ("weather in karachi?", "karachi"),
+])
+def test_city_from_the_question(jarvis, query, city):
+    assert jarvis.weather_city(query) == city
+
+
+@pytest.mark.parametrize("query", [
+    "what's the weather",
+    "weather for today",
+    "what is the weather like at the moment",
+    "weather for tomorrow",
+    "how's the weather right now",
+    "what's the weather at home",
+    "is it raining here",
+    "weather in the morning",
+    "weather for this week",
+])
+def test_no_city_means_the_home_city(jarvis, query, monkeypatch):
+    monkeypatch.setattr(jarvis, "WEATHER_CITY", "Islamabad")
+    assert jarvis.weather_city(query) == "Islamabad"